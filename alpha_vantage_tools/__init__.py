@@ -10,4 +10,4 @@ See 'LICENSE' for full license terms & conditions in the projects GitHub reposit
 More information about the Alpha Vantage API: 'https://www.alphavantage.co/'.
 
 """
-from . import av_funcs, db_funcs, tests
\ No newline at end of file
+from . import av_funcs, async_funcs, bar_store, cache, columnar, db_funcs, formats, http_pool, indicators, jobs, metrics, rate_limit, resample, tests
\ No newline at end of file
@@ -0,0 +1,334 @@
+import asyncio
+import ssl
+from time import time, perf_counter
+from datetime import timedelta
+from urllib.parse import urlsplit
+from .av_funcs import LoadAlphaVantage, valid_response
+
+class AsyncHTTPClient(object):
+    """
+    Minimal HTTP/1.1 client reusing keep-alive connections to a single host.
+
+    """
+    def __init__(self, base_url, pool_size = 1, timeout = 30):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.ssl = url.scheme == "https"
+        self.port = url.port or (443 if self.ssl else 80)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connections_opened = 0
+        self.__idle = []
+        self.__slots = None
+
+    async def __connect(self, timings):
+        context = ssl.create_default_context() if self.ssl else None
+        start = perf_counter()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl = context), self.timeout)
+        # includes the DNS lookup
+        timings["connect"] = perf_counter() - start
+        self.connections_opened += 1
+        return reader, writer
+
+    @staticmethod
+    async def __read_body(reader, headers):
+        if(headers.get("transfer-encoding", "").lower() == "chunked"):
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if(size == 0):
+                    await reader.readline()
+                    return b"".join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+        if("content-length" in headers):
+            return await reader.readexactly(int(headers["content-length"]))
+        return await reader.read()
+
+    async def __request(self, conn, path, timings):
+        reader, writer = conn
+        start = perf_counter()
+        writer.write("GET {0} HTTP/1.1\r\nHost: {1}\r\nConnection: keep-alive\r\n\r\n"\
+            .format(path, self.host).encode("ascii"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if(not status_line):
+            raise ConnectionResetError("Connection closed by the server.")
+        timings["ttfb"] = perf_counter() - start
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if(line in (b"\r\n", b"\n", b"")):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+        start = perf_counter()
+        body = await self.__read_body(reader, headers)
+        timings["body"] = perf_counter() - start
+        keep_alive = headers.get("connection", "").lower() != "close" \
+            and ("content-length" in headers or "transfer-encoding" in headers)
+        return status, body, keep_alive
+
+    async def get(self, url, timings = None):
+        """
+        Make HTTP GET request.
+
+        If a dictionary is passed as 'timings', it is filled with the 'connect' (new
+        connections only, including the DNS lookup), 'ttfb' (time to first byte) and
+        'body' durations in seconds.
+
+        Returns a tuple of status code and response body (bytes).
+
+        """
+        timings = {} if timings == None else timings
+        if(self.__slots == None):
+            self.__slots = asyncio.Semaphore(self.pool_size)
+
+        url = urlsplit(url)
+        path = "?".join([url.path or "/", url.query]) if url.query else url.path or "/"
+
+        async with self.__slots:
+            reused = bool(self.__idle)
+            conn = self.__idle.pop() if reused else await self.__connect(timings)
+            while True:
+                try:
+                    status, body, keep_alive = await asyncio.wait_for(
+                        self.__request(conn, path, timings), self.timeout)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn[1].close()
+                    if(not reused):
+                        raise
+                    # stale keep-alive connection, retry once on a fresh one
+                    reused = False
+                    conn = await self.__connect(timings)
+                except BaseException:
+                    conn[1].close()
+                    raise
+
+            if(keep_alive):
+                self.__idle.append(conn)
+            else:
+                conn[1].close()
+
+        return status, body
+
+    async def close(self):
+        """
+        Close all idle connections.
+
+        """
+        while self.__idle:
+            reader, writer = self.__idle.pop()
+            writer.close()
+
+class AsyncLoadAlphaVantage(LoadAlphaVantage):
+    """
+    Asyncio counterpart of LoadAlphaVantage.
+
+    Requests are made without blocking the event loop over up to 'pool_size' shared
+    keep-alive connections. Use as an async context manager or call 'close()'.
+
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = AsyncHTTPClient(self.base_url, self.pool_size, self.timeout)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the HTTP connections.
+
+        """
+        await self.client.close()
+
+    async def __api_request(
+        self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        api_key = None):
+        """
+        Make non-blocking HTTP GET request to Alpha Vantage API.
+
+        Returns the response body as a binary stream of lines or None.
+
+        """
+        self._check_parameters(av_fun, output, interval)
+
+        api_key = api_key or self._next_key(symbol)
+        attempt = 0
+        while api_key != None:
+            url = self._make_url(symbol, api_key, av_fun, output, interval)
+            timings = {}
+            try:
+                status, body = await self.client.get(url, timings)
+            except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError) as e:
+                status, body, reason = None, None, type(e).__name__
+            else:
+                self._record_request(symbol, av_fun, status, body, timings)
+                reason = self._retry_reason(status, body)
+            if(reason == None):
+                break
+            delay, api_key = self._retry_delay(symbol, attempt, reason, api_key)
+            if(delay == None):
+                return None
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if(api_key == None):
+            return None
+        self.key_pool.success(api_key)
+        return self._check_status(symbol, status, body)
+
+    async def alpha_vantage(
+        self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        write_csv = False, directory = ".", as_array = False, api_key = None, 
+        file_format = "csv", incremental = False):
+        """
+        Pull raw data from the Alpha Vantage API.
+
+        See 'help(LoadAlphaVantage.alpha_vantage)' for the arguments and return value.
+        The SQLite cache, parsing and file writes run in the loop's default executor,
+        so they do not block the event loop.
+
+        """
+        self._check_parameters(av_fun, output, interval)
+        loop = asyncio.get_event_loop()
+
+        resp = None
+        if(self.cache != None):
+            resp = await loop.run_in_executor(
+                None, self._cache_get, symbol, av_fun, output, interval)
+        if(resp == None):
+            resp = await self.__api_request(symbol, av_fun, output, interval, api_key)
+            if(resp != None and self.cache != None):
+                await loop.run_in_executor(
+                    None, self.__cache_body, resp.getvalue(), symbol, av_fun, output, interval)
+        body = None if resp == None else resp.getvalue()
+
+        return await loop.run_in_executor(None, self.__collect_body, body, symbol, av_fun,
+            interval, write_csv, directory, as_array, file_format, incremental)
+
+    def __cache_body(self, body, symbol, av_fun, output, interval):
+        if(valid_response(body)):
+            self._cache_put([body], symbol, av_fun, output, interval)
+
+    def __collect_body(
+        self, body, symbol, av_fun, interval, write_csv, directory, as_array, file_format,
+        incremental):
+        start = perf_counter()
+        if(as_array and not write_csv):
+            result = self._body_to_array(symbol, body, av_fun)
+        else:
+            parsed_resp = self._parse_response(symbol, body, self.metrics)
+            rows = self._format_response(parsed_resp, symbol, av_fun, interval)
+            result = self._collect_rows(
+                rows, symbol, write_csv, directory, as_array, file_format, incremental)
+        self._record_parse(symbol, av_fun, result, perf_counter() - start)
+        return result
+
+    async def __fetch(self, symbol, request_limit = True, **kwargs):
+        if(request_limit and not self._cached(
+            symbol, kwargs["av_fun"], kwargs["output"], kwargs["interval"])):
+            api_key, wait = self.key_pool.reserve()
+            if(wait == None):
+                self.metrics.emit("request_limit", 
+                    "Daily request limit reached, skipping '{0}'.".format(symbol), 
+                    symbol = symbol)
+                return symbol, None
+            self.metrics.observe("rate_limit_wait_seconds", wait)
+            await asyncio.sleep(wait)
+            kwargs["api_key"] = api_key
+        return symbol, await self.alpha_vantage(symbol, **kwargs)
+
+    async def stream_symbols(
+        self, symbols, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        request_limit = True, **kwargs):
+        """
+        Download multiple stock time-series as an async generator.
+
+        Yields (symbol, data) tuples in completion order. Symbols that errored are
+        skipped. See 'help(AsyncLoadAlphaVantage.load_symbols)' for the arguments.
+
+        """
+        self._check_parameters(av_fun, output, interval)
+        symbols = symbols if isinstance(symbols, list) else [symbols]
+
+        tasks = [ asyncio.ensure_future(self.__fetch(
+            symbol, request_limit, av_fun = av_fun, output = output, interval = interval,
+            **kwargs)) for symbol in symbols]
+        try:
+            for task in asyncio.as_completed(tasks):
+                symbol, data = await task
+                if(data is not None):
+                    yield symbol, data
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def __download(self, symbols, in_memory = True, **kwargs):
+        """
+        Download interface.
+
+        """
+        download_result = {}
+        symbols = symbols if isinstance(symbols, list) else [symbols]
+        start_time = time()
+
+        completed = 0
+        async for symbol, data in self.stream_symbols(symbols, **kwargs):
+            completed += 1
+            if(in_memory):
+                download_result[symbol] = data
+            self.metrics.emit("download_progress", 
+                "Downloading {0}/{1}... \r".format(completed, len(symbols)), 
+                symbol = symbol, completed = completed, total = len(symbols))
+
+        duration = time() - start_time
+        errors = len(symbols) - completed
+        self.metrics.observe("download_seconds", duration)
+        self.metrics.emit("download_complete", 
+            "Download complete in {0}!".format(timedelta(seconds = duration)),
+            symbols = len(symbols), errors = errors, seconds = round(duration, 6))
+        if errors > 0:
+            self.metrics.emit("download_errors", 
+                "{0} / {1} symbols errored.".format(errors, len(symbols)), 
+                errors = errors, symbols = len(symbols))
+        if(not in_memory):
+            return
+
+        return download_result
+
+    async def load_symbols(
+        self, symbols, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        request_limit = True, as_array = False):
+        """
+        Download multiple stock time-series concurrently.
+
+        See 'help(LoadAlphaVantage.load_symbols)' for the arguments.
+
+        Returns a Python dictionary containing the requested data.
+
+        """
+        return await self.__download(symbols, request_limit = request_limit,
+            av_fun = av_fun, output = output, interval = interval, as_array = as_array)
+
+    async def load_csv(
+        self, symbols, directory = ".", av_fun = "TIME_SERIES_DAILY", output = "compact",
+        interval = None, request_limit = True, file_format = "csv", incremental = False):
+        """
+        Download multiple csv files concurrently.
+
+        See 'help(LoadAlphaVantage.load_csv)' for the arguments.
+
+        """
+        await self.__download(symbols, in_memory = False, request_limit = request_limit,
+            directory = directory, av_fun = av_fun, output = output, interval = interval,
+            write_csv = True, file_format = file_format, incremental = incremental)
@@ -1,23 +1,104 @@
 import csv
+import json
 import os
+import random
 import re
-from time import time, sleep
-from datetime import timedelta
-from urllib.request import urlopen
-from urllib.error import HTTPError
+import socket
+import threading
+from queue import Queue
+from io import BytesIO, StringIO
+from itertools import islice
+from time import time, perf_counter, sleep
+from http.client import HTTPException
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from .helpers import write_csv as write_csv_
-from .helpers import read_csv, get_env
-from .config import api_parameters
+from .helpers import read_csv, get_env, count_bars
+from .config import api_parameters, api_limits
+from .formats import file_formats
+from .rate_limit import KeyPool
+from .http_pool import HTTPConnectionPool
+from .cache import ResponseCache
+from .columnar import rows_to_array, csv_to_array
+from .metrics import registry as default_registry
+from .jobs import JobJournal
+from .db_funcs import SQLiteDB
+
+# Error message line of an invalid API call, or a JSON 'Information' or 'Note' message.
+error_pattern = re.compile(r'\s*"(([E|e]rror)\s([M|m]essage)|Information|Note)"')
+
+# 'Information' messages of throttled requests, eg. premium endpoints are not.
+throttle_pattern = re.compile(r"call frequency|rate limit|per (second|minute)|sparingly", 
+    re.IGNORECASE)
+
+def valid_response(body):
+    """
+    Returns True if a csv response body (bytes) has a data row and no error message.
+
+    """
+    head = body[:4096].split(b"\n", 2)[:2]
+    return len(head) == 2 and head[1].strip() != b"" and \
+        error_pattern.match(head[1].decode("utf-8", "replace")) == None
 
 class LoadAlphaVantage(object):
     """
     Alpha Vantage API wrapper class.
 
     """
-    def __init__(self, api_key = "demo"):
-            self.api_key = get_env() or api_key
+    base_url = "https://www.alphavantage.co/query?"
+
+    def __init__(
+        self, api_key = "demo", requests_per_minute = None, requests_per_day = None, 
+        workers = None, pool_size = None, timeout = 30, cache = None, metrics = None,
+        retries = None, backoff = None):
+        """
+        Arguments:
+        api_key -- Alpha Vantage API key or a list of keys, overridden by the 'SECRET_KEY' 
+        environment variable (comma-separated for several keys). Requests are sharded 
+        across the keys, each with its own rate limits.
+        requests_per_minute -- Request rate limit per API key. (default == config.api_limits())
+        requests_per_day -- Daily request budget per API key, None or 0 for unlimited. 
+        (default == config.api_limits())
+        workers -- Number of concurrent requests. (default == config.api_limits())
+        pool_size -- Number of persistent HTTP connections. (default == workers)
+        timeout -- HTTP connection timeout in seconds. (default == 30)
+        cache -- ResponseCache instance or a path for a new on-disk response cache. 
+        (default == None, no caching)
+        metrics -- MetricsRegistry recording request, parse and rate limiter timings and
+        receiving status events. (default == metrics.registry)
+        retries -- Retries per request after HTTP 429/5xx errors, timeouts, dropped 
+        connections and throttled responses. (default == config.api_limits())
+        backoff -- Base delay of the jittered exponential backoff in seconds. 
+        (default == config.api_limits())
 
-    def __make_url(
+        """
+        limits = api_limits()
+        api_keys = get_env() or api_key
+        self.api_keys = api_keys.split(",") if isinstance(api_keys, str) else list(api_keys)
+        self.api_keys = [ key.strip() for key in self.api_keys if key.strip()]
+        self.api_key = self.api_keys[0]
+        self.requests_per_minute = requests_per_minute or limits["requests_per_minute"]
+        self.requests_per_day = limits["requests_per_day"] \
+            if requests_per_day == None else requests_per_day
+        self.workers = workers or limits["workers"]
+        self.key_pool = KeyPool(self.api_keys, self.requests_per_minute, self.requests_per_day)
+        self.pool_size = pool_size or self.workers
+        self.timeout = timeout
+        self.http = HTTPConnectionPool(self.base_url, self.pool_size, self.timeout)
+        self.cache = ResponseCache(cache) if isinstance(cache, str) else cache
+        self.metrics = metrics or default_registry
+        self.retries = limits["retries"] if retries == None else retries
+        self.backoff = limits["backoff"] if backoff == None else backoff
+        self.max_backoff = limits["max_backoff"]
+
+    def close(self):
+        """
+        Close the persistent HTTP connections.
+
+        """
+        self.http.close()
+
+    def _make_url(
         self, symbol, api_key, av_fun = "TIME_SERIES_DAILY", output = "compact", 
         interval = None):
         """
@@ -25,71 +106,329 @@ class LoadAlphaVantage(object):
         
         """
         try:
-            base_url = "https://www.alphavantage.co/query?"
             params = "function={0}&symbol={1}&outputsize={2}&apikey={3}&datatype=csv"\
             .format(av_fun, symbol, output, api_key)
 
             if (av_fun == "TIME_SERIES_INTRADAY"):
-                return "".join([base_url, params, "&interval={0}".format(interval)])
+                return "".join([self.base_url, params, "&interval={0}".format(interval)])
             
-            return base_url + params
+            return self.base_url + params
 
         except NameError as e:
-            print("Error: {0}".format(e))
+            self.metrics.emit("error", "Error: {0}".format(e), error = str(e))
 
-    def __api_request_delay(self, start_time, request_delay):
+    @staticmethod
+    def _check_parameters(av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None):
         """
-        Delays API requests x seconds.
+        Assert that the API call parameters are supported.
 
         """
-        delta_time = time() - start_time
-        sleep(request_delay - delta_time)
+        error_msg_ = "Invalid api call with parameter '{param}'."
+
+        assert av_fun in api_parameters()["av_fun"], error_msg_.format(param = "av_fun")
+        assert output in api_parameters()["output"], error_msg_.format(param = "output")
+
+        if(av_fun == "TIME_SERIES_INTRADAY"):
+            assert interval in api_parameters()["interval"], error_msg_.format(param = "interval")
 
     def __api_request(
-        self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None):
+        self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        api_key = None):
         """
-        Make HTTP GET request to Alpha Vantage API.
+        Make HTTP GET request to Alpha Vantage API over a persistent connection.
+
+        HTTP 429/5xx errors, timeouts, dropped connections, throttled and invalid key
+        responses are retried up to 'self.retries' times with a jittered exponential 
+        backoff. Without 'api_key', the keys of 'self.key_pool' are used in turn.
 
-        Returns HTTP response object.
+        Returns the response body as a binary stream of lines or None.
 
         """
+        self._check_parameters(av_fun, output, interval)
+
+        api_key = api_key or self._next_key(symbol)
+        attempt = 0
+        while api_key != None:
+            url = self._make_url(symbol, api_key, av_fun, output, interval)
+            timings = {}
+            try:
+                status, body = self.http.get(url, timings)
+            except (socket.timeout, ConnectionError, HTTPException) as e:
+                status, body, reason = None, None, type(e).__name__
+            else:
+                self._record_request(symbol, av_fun, status, body, timings)
+                reason = self._retry_reason(status, body)
+            if(reason == None):
+                break
+            delay, api_key = self._retry_delay(symbol, attempt, reason, api_key)
+            if(delay == None):
+                return None
+            sleep(delay)
+            attempt += 1
+
+        if(api_key == None):
+            return None
+        self.key_pool.success(api_key)
+        return self._check_status(symbol, status, body)
 
-        error_msg_ = "Invalid api call with parameter '{param}'."
+    def _next_key(self, symbol):
+        """
+        Returns the next usable API key without rate limiting or None.
 
-        assert av_fun in api_parameters()["av_fun"], error_msg_.format(param = "av_fun")
-        assert output in api_parameters()["output"], error_msg_.format(param = "output")
+        """
+        api_key = self.key_pool.next_key()
+        if(api_key == None):
+            self.metrics.emit("no_api_key", 
+                "Error: no usable API key left, skipping '{0}'.".format(symbol), 
+                symbol = symbol, error = "no api key")
+        return api_key
 
-        if(av_fun == "TIME_SERIES_INTRADAY"):
-            assert interval in api_parameters()["interval"], error_msg_.format(param = "interval")
+    @staticmethod
+    def _json_message(body):
+        """
+        Returns a JSON response body as a dictionary or None.
 
+        """
+        if(body.lstrip()[:1] != b"{"):
+            return None
         try:
-            url = self.__make_url(symbol, self.api_key, av_fun, output, interval)
-            resp = urlopen(url)
-        except HTTPError as e:
-            print("Error: {0}.".format(e))
-            return
+            message = json.loads(body.decode("utf-8"))
+        except ValueError:
+            return None
+        return message if isinstance(message, dict) else None
+
+    @classmethod
+    def _throttle_message(cls, body):
+        """
+        Returns the message of a rate limit JSON response or None.
+
+        'Note' messages are rate limits, 'Information' messages only if they mention
+        call frequency or rate limits. Other 'Information' messages (eg. premium
+        endpoints) are reported as invalid API calls without retrying.
+
+        """
+        message = cls._json_message(body) or {}
+        information = message.get("Information")
+        if(information and throttle_pattern.search(information) == None):
+            information = None
+        return message.get("Note") or information
+
+    @classmethod
+    def _invalid_key_message(cls, body):
+        """
+        Returns the message of an invalid or missing API key JSON response or None.
+
+        """
+        message = (cls._json_message(body) or {}).get("Error Message")
+        return message if message and "apikey" in message else None
+
+    def _retry_reason(self, status, body):
+        """
+        Returns the reason for retrying a response or None.
+
+        """
+        # HTTP 429 is the API's own rate limit signal
+        if(status == 429):
+            return "throttled"
+        if(status >= 500):
+            return "HTTP Error {0}".format(status)
+        if(status < 400 and self._throttle_message(body) != None):
+            return "throttled"
+        if(status < 400 and self._invalid_key_message(body) != None):
+            return "invalid api key"
+        return None
+
+    def _retry_delay(self, symbol, attempt, reason, api_key):
+        """
+        Returns the delay in seconds before retrying a request and the API key of the 
+        retry, or (None, None) when the retry budget (or the daily request budget of
+        every key) is spent.
+
+        Delays are drawn uniformly between zero and an exponentially growing cap 
+        ('full jitter'). Throttled responses also slow down the key in 
+        'self.key_pool' and invalid keys are evicted, even when the retry budget is
+        spent. Every retry waits for a free request slot on the key that is free the
+        soonest, so retries count against the per-minute and per-day budgets.
 
-        return resp
+        """
+        evicted = False
+        if(reason == "throttled"):
+            rate, evicted = self.key_pool.throttled(api_key)
+            self.metrics.emit("throttled", 
+                "Throttled, slowing down to {0:.2f} requests per minute.".format(rate),
+                symbol = symbol, requests_per_minute = rate)
+        elif(reason == "invalid api key"):
+            evicted = self.key_pool.evict(api_key, reason)
+        # concurrent requests may see the same key evicted, count it once
+        if(evicted):
+            self.metrics.inc("api_keys_evicted_total", reason = reason)
+            self.metrics.emit("key_evicted", 
+                "API key {0}... evicted: {1}.".format(api_key[:4], reason), 
+                reason = reason)
+
+        if(attempt >= self.retries):
+            self.metrics.emit("retries_exhausted", 
+                "Error: '{0}' failed after {1} retries: {2}.".format(symbol, attempt, reason),
+                symbol = symbol, attempts = attempt + 1, error = reason)
+            return None, None
+
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        api_key, wait = self.key_pool.reserve()
+        if(wait == None and not self.key_pool.active):
+            self._next_key(symbol)
+            return None, None
+        if(wait == None):
+            self.metrics.emit("request_limit", 
+                "Daily request limit reached, skipping '{0}'.".format(symbol), 
+                symbol = symbol)
+            return None, None
+        delay = max(delay, wait)
+
+        self.metrics.inc("retries_total", reason = 
+            {"throttled" : "throttled", "invalid api key" : "invalid_key"}.get(reason, "error"))
+        self.metrics.emit("retry", symbol = symbol, attempt = attempt + 1, reason = reason,
+            delay = round(delay, 3))
+        return delay, api_key
+
+    def _check_status(self, symbol, status, body):
+        """
+        Returns the response body as a binary stream of lines or None on HTTP errors.
+
+        """
+        if(status >= 400):
+            self.metrics.emit("http_error", "Error: HTTP Error {0}.".format(status), 
+                symbol = symbol, status = status, error = status)
+            return None
+
+        return BytesIO(body)
+
+    def __response_body(
+        self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        api_key = None):
+        """
+        Returns the response body (bytes) or None. Cached responses are used when 
+        available and valid API responses are cached.
+
+        """
+        self._check_parameters(av_fun, output, interval)
+
+        resp = self._cache_get(symbol, av_fun, output, interval)
+        if(resp != None):
+            return resp.getvalue()
+
+        resp = self.__api_request(symbol, av_fun, output, interval, api_key)
+        if(resp is None):
+            return None
+
+        body = self._join_body(resp)
+        if(self.cache != None and valid_response(body)):
+            self._cache_put([body], symbol, av_fun, output, interval)
+        return body
 
     def __parse_api_request(
-        self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None):
+        self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        api_key = None):
         """
-        Parse HTTP response object.
+        Parse HTTP response object. Cached responses are used when available.
 
-        Returns two-dimensional list or None.
+        Returns an iterator of rows or None.
 
         """
+        body = self.__response_body(symbol, av_fun, output, interval, api_key)
+        return self._parse_response(symbol, body, self.metrics)
 
-        resp = self.__api_request(symbol, av_fun, output, interval)
+    def _record_request(self, symbol, av_fun, status, body, timings):
+        """
+        Record the timings (seconds) and size of an API response.
 
-        parsed_response = [ line.decode("utf-8").strip("\r\n").split(",") for line in resp]
-        
-        # Return None if invalid API call.
-        if(re.match(r'\s*"([E|e]rror)\s([M|m]essage).*"', parsed_response[1][0]) != None):
-            print("Invalid API call for symbol '{0}'".format(symbol))
+        """
+        for phase, duration in timings.items():
+            self.metrics.observe("http_request_seconds", duration, phase = phase)
+        self.metrics.inc("http_requests_total", av_fun = av_fun, status = status)
+        self.metrics.inc("http_response_bytes_total", len(body), av_fun = av_fun)
+        self.metrics.emit("request", symbol = symbol, av_fun = av_fun, status = status, 
+            bytes = len(body), **{ phase + "_seconds" : round(duration, 6) 
+            for phase, duration in timings.items()})
+
+    def _cache_get(self, symbol, av_fun, output, interval):
+        """
+        Returns cached response lines (bytes) or None.
+
+        """
+        if(self.cache == None):
+            return None
+        body = self.cache.get(symbol, av_fun, output, interval)
+        return None if body == None else BytesIO(body)
+
+    def _cached(self, symbol, av_fun, output, interval):
+        """
+        Returns True if a valid response is cached. Requests served from the cache do
+        not wait for a request slot or spend the daily request budget.
+
+        """
+        return self.cache != None and self.cache.contains(symbol, av_fun, output, interval)
+
+    def _cache_put(self, resp, symbol, av_fun, output, interval):
+        """
+        Store valid response lines (bytes) in the cache.
+
+        """
+        if(self.cache != None):
+            self.cache.put(b"".join(resp), symbol, av_fun, output, interval)
+
+    @staticmethod
+    def _join_body(resp):
+        """
+        Returns a response (bytes, a binary stream or an iterable of lines) as bytes.
+
+        """
+        if(isinstance(resp, bytes)):
+            return resp
+        if(isinstance(resp, BytesIO)):
+            return resp.getvalue()
+        return b"".join(resp)
+
+    @staticmethod
+    def _check_response(symbol, body, metrics = None):
+        """
+        Returns True if a response body is valid. Invalid responses are reported to
+        'metrics'. (default == metrics.registry)
+
+        """
+        if(body is None):
+            return False
+        if(not valid_response(body)):
+            information = (LoadAlphaVantage._json_message(body) or {}).get("Information")
+            (metrics or default_registry).emit("invalid_call", 
+                "Invalid API call for symbol '{0}'".format(symbol) + 
+                (": {0}".format(information) if information else ""), symbol = symbol, 
+                error = "invalid api call")
+            return False
+        return True
+
+    @staticmethod
+    def _parse_response(symbol, resp, metrics = None):
+        """
+        Split a response (bytes, a binary stream or an iterable of lines) into rows.
+
+        The body is validated from its first two lines and decoded once. Lines are
+        split while rows are consumed, with the 'csv' module if the body has quoted
+        fields.
+
+        Returns an iterator of rows or None.
+
+        """
+        if(resp is None):
+            return None
+
+        body = LoadAlphaVantage._join_body(resp)
+        if(not LoadAlphaVantage._check_response(symbol, body, metrics)):
             return None
 
-        return parsed_response
+        text = body.decode("utf-8")
+        if('"' in text):
+            return csv.reader(StringIO(text))
+        return ( line.split(",") for line in text.splitlines())
 
     def __parse_interval_overnight(self, row, av_fun):
         """
@@ -105,7 +444,8 @@ class LoadAlphaVantage(object):
 
     def alpha_vantage(
         self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None, 
-        write_csv = False, directory = "."):
+        write_csv = False, directory = ".", as_array = False, api_key = None, 
+        file_format = "csv", incremental = False):
         """
         Pull raw data from the Alpha Vantage API.
 
@@ -119,77 +459,233 @@ class LoadAlphaVantage(object):
         interval -- Intraday data time-interval (default == None)
         write_csv -- If set True, download as a csv file. (default == False)
         directory -- Directory for csv file downloads. (default == current directory)
+        as_array -- If set True, return a typed NumPy structured array. (default == False)
+        api_key -- API key of the request. (default == None, the instance's keys in turn)
+        file_format -- File format of csv downloads: 'csv', 'gzip' (.csv.gz), 'zstd' 
+        (.csv.zst) or 'parquet'. (default == 'csv')
+        incremental -- If set True, add only rows newer than an existing csv file's rows,
+        see 'help(helpers.write_csv)'. (default == False)
 
         Returns a two-dimensional list by default, containing time-series stock price data.
-        If 'write_csv' == True, returns an empty list.
+        If 'write_csv' == True, returns an empty list (also with 'as_array'). If 
+        'as_array' == True, returns a structured array with datetime64 timestamps, 
+        float64 prices and int64 volume (float64 if volumes are missing, see 
+        'columnar.rows_to_array').
         
         """ 
+        if(as_array and not write_csv):
+            # typed arrays are parsed in bulk from the raw body
+            body = self.__response_body(symbol, av_fun, output, interval, api_key)
+            start = perf_counter()
+            result = self._body_to_array(symbol, body, av_fun)
+            self._record_parse(symbol, av_fun, result, perf_counter() - start)
+            return result
+
+        rows = self.iter_alpha_vantage(symbol, av_fun, output, interval, api_key)
+
+        # rows are parsed lazily while collected
+        start = perf_counter()
+        result = self._collect_rows(
+            rows, symbol, write_csv, directory, as_array, file_format, incremental)
+        self._record_parse(symbol, av_fun, result, perf_counter() - start)
+        return result
+
+    def _body_to_array(self, symbol, body, av_fun):
+        """
+        Parse a response body into a typed NumPy structured array or None.
+
+        """
+        if(not self._check_response(symbol, body, self.metrics)):
+            return None
+        return csv_to_array(body, skip = self._skip_rows(av_fun))
+
+    @staticmethod
+    def _skip_rows(av_fun):
+        """
+        Number of latest data rows dropped, see 'help(LoadAlphaVantage.alpha_vantage)'.
+
+        """
+        return 0 if av_fun == "TIME_SERIES_INTRADAY" else 1
+
+    def _record_parse(self, symbol, av_fun, result, duration):
+        """
+        Record the parse time (seconds) and row count of a response.
+
+        """
+        if(result is None):
+            return
+        self.metrics.observe("parse_seconds", duration, av_fun = av_fun)
+        if(len(result) > 0):
+            n = len(result) - (0 if hasattr(result, "dtype") else 1)
+            self.metrics.inc("parsed_rows_total", n, av_fun = av_fun)
+            self.metrics.emit("parse", symbol = symbol, av_fun = av_fun, rows = n, 
+                seconds = round(duration, 6))
+
+    def iter_alpha_vantage(
+        self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        api_key = None):
+        """
+        Pull raw data from the Alpha Vantage API as a lazy iterator of rows.
+
+        Rows are decoded and formatted one at a time, so they can be passed straight
+        to 'SQLiteDB.insert_many' or 'helpers.write_csv'. The header row comes first.
+        See 'help(LoadAlphaVantage.alpha_vantage)' for the arguments.
+
+        Returns an iterator of rows or None.
+
+        """
         # Make request and parse response
-        parsed_resp = self.__parse_api_request(symbol, av_fun, output, interval)
+        parsed_resp = self.__parse_api_request(symbol, av_fun, output, interval, api_key)
+
+        return self._format_response(parsed_resp, symbol, av_fun, interval)
+
+    def _format_response(self, parsed_resp, symbol, av_fun = "TIME_SERIES_DAILY", interval = None):
+        """
+        Add symbol, api and interval columns to parsed response rows.
+
+        Returns an iterator of rows or None.
+
+        """
         # Return None if response == None
         if(parsed_resp == None):
             return None
-        # Remove last row if empty
-        if(parsed_resp[-1] == []):
-            parsed_resp = parsed_resp[:-1]
-
-        # Insert new columns
-        for i, row in enumerate(parsed_resp):
-            x, y, z = ("symbol", "timeseries_api", "interval") if i == 0 else (symbol, av_fun, interval)
-            row.insert(1, z)
-            row.insert(1, y)
-            row.insert(1, x)
-            # parse interval column if necessary
-            if(av_fun != "TIME_SERIES_INTRADAY" and i != 0):
-                self.__parse_interval_overnight(row, av_fun)
 
+        return self.__format_rows(iter(parsed_resp), symbol, av_fun, interval)
+
+    def __format_rows(self, rows, symbol, av_fun, interval):
+        # constant columns are computed once per response
+        constant = [symbol, av_fun, self._stored_interval(av_fun, interval)]
         # Keep only latest datapoint with full period information.
-        if(re.search(r"DAILY|MONTHLY|WEEKLY", av_fun)):
-            del parsed_resp[1]
+        skip = self._skip_rows(av_fun)
+
+        header = next(rows, None)
+        if(header is None):
+            return
+        yield header[:1] + ["symbol", "timeseries_api", "interval"] + header[1:]
+
+        for row in rows:
+            # Skip empty rows
+            if(not row or row == [""]):
+                continue
+            if(skip):
+                skip -= 1
+                continue
+            # rows are fresh lists, insert the constant columns in place
+            row[1:1] = constant
+            yield row
+
+    @staticmethod
+    def _collect_rows(
+        rows, symbol, write_csv = False, directory = ".", as_array = False, file_format = "csv",
+        incremental = False):
+        """
+        Write formatted rows to a csv (or compressed csv, Parquet) file or collect them
+        into a list or typed array.
+
+        """
+        assert file_format in file_formats, "Invalid argument 'file_format'."
+        if(rows == None):
+            return None
 
+        # files are written even when 'as_array' is set
         if (write_csv):
-            path = "/".join([directory, symbol]) + ".csv"
-            write_csv_(path, parsed_resp)
+            path = "/".join([directory, symbol]) + file_formats[file_format]
+            write_csv_(path, rows, incremental = incremental)
             return []
 
-        return parsed_resp
+        if(as_array):
+            return rows_to_array(rows)
+
+        return list(rows)
+
+    def _wait_for_request(self, symbol):
+        """
+        Wait for a free request slot on the API key in 'self.key_pool' that is free the
+        soonest.
+
+        Returns the API key or None if the daily request budget of every key is spent.
+
+        """
+        start = perf_counter()
+        api_key, wait = self.key_pool.acquire()
+        self.metrics.observe("rate_limit_wait_seconds", perf_counter() - start)
+        if(api_key == None):
+            self.metrics.emit("request_limit", 
+                "Daily request limit reached, skipping '{0}'.".format(symbol), 
+                symbol = symbol)
+        return api_key
 
     def __download(
-        self, symbols, request_limit = True, in_memory = True, **kwargs):
+        self, symbols, request_limit = True, in_memory = True, callback = None, **kwargs):
         """
         Download interface.
 
+        Runs up to 'self.workers' requests concurrently. With 'request_limit' set,
+        every request waits for a free slot on one of the keys in 'self.key_pool'.
+
+        'callback(symbol, data, error)' is called in the calling thread as soon as a
+        symbol is done. Symbols skipped after the daily request budget is spent are
+        not passed to the callback. With a callback, exceptions raised by a request
+        are passed as 'error' instead of stopping the download.
+
         """
         download_result = {}
 
         symbols = symbols if isinstance(symbols, list) else [symbols]
 
+        def fetch(symbol):
+            if(not request_limit or self._cached(
+                symbol, kwargs["av_fun"], kwargs["output"], kwargs["interval"])):
+                return self.alpha_vantage(symbol, **kwargs), False
+            api_key = self._wait_for_request(symbol)
+            if(api_key == None):
+                return None, True
+            return self.alpha_vantage(symbol, api_key = api_key, **kwargs), False
+
         # Download starting time
         start_time = time()
 
         # counter for errors
         errors = 0
-        for i, symbol in enumerate(symbols):
-
-            print("Downloading {0}/{1}...".format(i + 1, len(symbols)), "\r", end = "")
-            
-            # API request starting time
-            start_time_request = time()
-            data = self.alpha_vantage(symbol, **kwargs)
-            # Keep only good data
-            if (data == None):
-                errors += 1
-            elif(in_memory):
-                download_result[symbol] = data
-            # delay next request with respect to the limits
-            if request_limit and len(symbols) >= 5 and i < len(symbols) - 1:
-                self.__api_request_delay(start_time_request, request_delay)
-
-        # print relevant statistics
-        print("Download complete in {0}!"\
-            .format(timedelta(seconds = time() - start_time)))
+        executor = ThreadPoolExecutor(max_workers = self.workers)
+        futures = []
+        try:
+            futures = [ executor.submit(fetch, symbol) for symbol in symbols]
+            for i, (symbol, future) in enumerate(zip(symbols, futures)):
+                error = None
+                try:
+                    data, skipped = future.result()
+                except Exception as e:
+                    if(callback == None):
+                        raise
+                    data, skipped, error = None, False, "{0}: {1}".format(type(e).__name__, e)
+                self.metrics.emit("download_progress", 
+                    "Downloading {0}/{1}... \r".format(i + 1, len(symbols)), 
+                    symbol = symbol, completed = i + 1, total = len(symbols))
+                # Keep only good data
+                if (data is None):
+                    errors += 1
+                elif(in_memory):
+                    download_result[symbol] = data
+                if(callback != None and not skipped):
+                    callback(symbol, data, error)
+        finally:
+            # do not spend requests on pending symbols after an error, 
+            # 'shutdown(cancel_futures = True)' requires Python 3.9
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
+
+        # report relevant statistics
+        duration = time() - start_time
+        self.metrics.observe("download_seconds", duration)
+        self.metrics.emit("download_complete", 
+            "Download complete in {0}!".format(timedelta(seconds = duration)),
+            symbols = len(symbols), errors = errors, seconds = round(duration, 6))
         if errors > 0:
-            print("{0} / {1} symbols errored.".format(errors, len(symbols)))
+            self.metrics.emit("download_errors", 
+                "{0} / {1} symbols errored.".format(errors, len(symbols)), 
+                errors = errors, symbols = len(symbols))
         # Return None when writing csv files
         if(not in_memory):
             return
@@ -199,13 +695,13 @@ class LoadAlphaVantage(object):
 
     def load_symbols(
         self, symbols, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None, 
-        request_limit = True):
+        request_limit = True, as_array = False):
         """
         Wrapper for downloading multiple stock time-series.
         
         Arguments:
         symbols: Pass multiple ticker symbols as a Python list (or single symbol as str).
-        request_limit: Set 5 HTTP requests per minute limit. (default == True)
+        request_limit: Respect the instance's request rate limits. (default == True)
         See 'help(LoadAlphaVantage.alpha_vantage)' for the rest of the keyword arguments.
 
         Returns a Python dictionary containing the requested data.
@@ -213,24 +709,266 @@ class LoadAlphaVantage(object):
         """
         # initialize empty dictionary for stocks
         return self.__download(symbols, request_limit = request_limit, 
-        av_fun = av_fun, output = output, interval = interval)
+        av_fun = av_fun, output = output, interval = interval, as_array = as_array)
 
     def load_csv(
         self, symbols, directory = ".", av_fun = "TIME_SERIES_DAILY", output = "compact", 
-        interval = None, request_limit = True):
+        interval = None, request_limit = True, file_format = "csv", incremental = False):
         """
         Wrapper for multiple csv file downloads.
 
         Arguments:
         symbols -- Pass multiple ticker symbols as a Python list (or single symbol as str).
         directory -- Set destination directory for the downloads. (default == current directory)
-        request_limit -- Set 5 HTTP requests per minute limit. (default == True)
+        request_limit -- Respect the instance's request rate limits. (default == True)
+        file_format -- 'csv', streaming compressed 'gzip' (.csv.gz) or 'zstd' (.csv.zst) 
+        csv, or 'parquet' with dictionary encoded constant columns. Every format is read
+        back by 'SQLiteDB.insert_csv'. (default == 'csv')
+        incremental -- If set True, existing files keep their rows and only newer rows are
+        added, eg. refreshing with 'compact' output keeps the full history. (default == False)
         See 'help(LoadAlphaVantage.alpha_vantage)' for other keyword arguments.
         
         """
+        assert file_format in file_formats, "Invalid argument 'file_format'."
         self.__download(symbols, request_limit = request_limit, 
             in_memory = False, directory = directory, av_fun = av_fun, 
-            output = output, interval = interval, write_csv = True)
+            output = output, interval = interval, write_csv = True, file_format = file_format,
+            incremental = incremental)
+
+    def load_to_db(
+        self, symbols, db, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None,
+        table = "stocks", request_limit = True, batch_size = 1000, conflict = "ignore", 
+        queue_size = 16):
+        """
+        Download multiple stock time-series straight into a SQLite database.
+
+        Up to 'self.workers' fetchers parse responses into chunks of 'batch_size' rows
+        and push them into a bounded queue, drained by a single writer thread that 
+        inserts them in batched transactions ('SQLiteDB.insert_many'). Downloads and 
+        inserts overlap, and fetchers block while the queue is full, so at most about
+        'queue_size' chunks are held in memory.
+
+        Arguments:
+        symbols -- Pass multiple ticker symbols as a Python list (or single symbol as str).
+        db -- SQLiteDB instance or database path.
+        table -- SQLite table name. (default == 'stocks')
+        request_limit -- Respect the instance's request rate limits. (default == True)
+        batch_size -- Number of rows per chunk and transaction. (default == 1000)
+        conflict -- Conflict policy, see 'help(SQLiteDB.insert_many)'. (default == 'ignore')
+        queue_size -- Maximum number of queued chunks. (default == 16)
+        See 'help(LoadAlphaVantage.alpha_vantage)' for the rest of the keyword arguments.
+
+        Returns a dictionary of inserted, updated and skipped row counts. The 'symbols'
+        key holds the number of downloaded rows per symbol (None if the symbol errored).
+
+        """
+        assert batch_size > 0 and queue_size > 0, "Invalid argument 'batch_size' or 'queue_size'."
+        self._check_parameters(av_fun, output, interval)
+        symbols = symbols if isinstance(symbols, list) else [symbols]
+        db = db if isinstance(db, SQLiteDB) else SQLiteDB(db)
+
+        chunks = Queue(maxsize = queue_size)
+        counts = {"inserted" : 0, "updated" : 0, "skipped" : 0, "symbols" : {}}
+        writer_error = []
+
+        def rows():
+            while True:
+                chunk = chunks.get()
+                if(chunk is None):
+                    return
+                yield from chunk
+
+        def write():
+            try:
+                counts.update(db.insert_many(
+                    rows(), table, batch_size = batch_size, conflict = conflict, verbose = False))
+            except BaseException as e:
+                writer_error.append(e)
+                # keep draining so the fetchers do not block on a full queue
+                while chunks.get() is not None:
+                    pass
+
+        def fetch(symbol):
+            if(writer_error):
+                return None
+            # cached responses do not spend the request budget
+            wait = request_limit and not self._cached(symbol, av_fun, output, interval)
+            api_key = self._wait_for_request(symbol) if wait else None
+            if(wait and api_key == None):
+                return None
+            data = self.iter_alpha_vantage(symbol, av_fun, output, interval, api_key)
+            if(data is None):
+                return None
+            start = perf_counter()
+            n, chunk = 0, []
+            for row in islice(data, 1, None):
+                chunk.append(row)
+                if(len(chunk) >= batch_size):
+                    chunks.put(chunk)
+                    n, chunk = n + len(chunk), []
+            if(chunk):
+                chunks.put(chunk)
+                n += len(chunk)
+            self.metrics.observe("parse_seconds", perf_counter() - start, av_fun = av_fun)
+            self.metrics.inc("parsed_rows_total", n, av_fun = av_fun)
+            return n
+
+        start_time = time()
+        writer = threading.Thread(target = write, daemon = True)
+        writer.start()
+        executor = ThreadPoolExecutor(max_workers = self.workers)
+        futures = []
+        try:
+            futures = [ executor.submit(fetch, symbol) for symbol in symbols]
+            for i, (symbol, future) in enumerate(zip(symbols, futures)):
+                counts["symbols"][symbol] = future.result()
+                self.metrics.emit("download_progress", 
+                    "Downloading {0}/{1}... \r".format(i + 1, len(symbols)), 
+                    symbol = symbol, completed = i + 1, total = len(symbols))
+        finally:
+            # 'shutdown(cancel_futures = True)' requires Python 3.9
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
+            chunks.put(None)
+            writer.join()
+        if(writer_error):
+            raise writer_error[0]
+
+        duration = time() - start_time
+        errors = sum([ n is None for n in counts["symbols"].values()])
+        self.metrics.observe("download_seconds", duration)
+        self.metrics.emit("download_complete", 
+            "Download complete in {0}! {1} rows inserted, {2} updated, {3} skipped."\
+            .format(timedelta(seconds = duration), counts["inserted"], counts["updated"], 
+            counts["skipped"]), symbols = len(symbols), errors = errors, 
+            seconds = round(duration, 6), inserted = counts["inserted"])
+        if errors > 0:
+            self.metrics.emit("download_errors", 
+                "{0} / {1} symbols errored.".format(errors, len(symbols)), 
+                errors = errors, symbols = len(symbols))
+
+        return counts
+
+    def _stored_interval(self, av_fun, interval = None):
+        """
+        Interval column value stored for an API function.
+
+        """
+        row = [None, None, None, interval]
+        self.__parse_interval_overnight(row, av_fun)
+        return row[3]
+
+    def sync(
+        self, symbols, db, av_fun = "TIME_SERIES_DAILY", interval = None, table = "stocks",
+        request_limit = True, compact_limit = 100, indicators = None):
+        """
+        Download only the data points missing from a SQLite database.
+
+        The latest stored timestamp of each symbol decides the output size: 'compact'
+        when the gap is at most 'compact_limit' bars, 'full' otherwise or when the
+        symbol is not stored yet. Only rows newer than the stored data are inserted.
+
+        Arguments:
+        symbols -- Pass multiple ticker symbols as a Python list (or single symbol as str).
+        db -- SQLiteDB instance.
+        av_fun -- Alpha Vantage API function (default == 'TIME_SERIES_DAILY')
+        interval -- Intraday data time-interval (default == None)
+        table -- SQLite table name. (default == 'stocks')
+        request_limit -- Respect the instance's request rate limits. (default == True)
+        compact_limit -- Number of data points in a 'compact' response. (default == 100)
+        indicators -- IndicatorStore updated with the new rows. (default == None)
+
+        Returns a dictionary of the number of inserted rows per symbol.
+
+        """
+        self._check_parameters(av_fun, "compact", interval)
+        symbols = symbols if isinstance(symbols, list) else [symbols]
+
+        latest = db.latest_timestamps(
+            av_fun, self._stored_interval(av_fun, interval), symbols, table)
+        now = datetime.now()
+        outputs = {"compact" : [], "full" : []}
+        for symbol in symbols:
+            compact = symbol in latest and \
+                count_bars(latest[symbol], now, av_fun, interval) <= compact_limit
+            outputs["compact" if compact else "full"].append(symbol)
+
+        result = {}
+        for output, group in outputs.items():
+            if(not group):
+                continue
+            data = self.load_symbols(group, av_fun, output, interval, request_limit)
+            for symbol, rows in data.items():
+                last = latest.get(symbol, "")
+                new_rows = [ row for row in rows[1:] if row[0] > last]
+                result[symbol] = db.insert_many(new_rows, table, verbose = False)["inserted"]
+
+        if(indicators != None and result):
+            indicators.update(av_fun, self._stored_interval(av_fun, interval), list(result), table)
+
+        return result
+
+    def run_job(
+        self, job, symbols, db, av_fun = "TIME_SERIES_DAILY", output = "compact", 
+        interval = None, table = "stocks", directory = None, request_limit = True, 
+        retry_failed = True, journal_table = "journal"):
+        """
+        Resumable download of many symbols into a SQLite database or csv files.
+
+        Progress is recorded per symbol in a journal table ('jobs.JobJournal') of 'db'. 
+        Each symbol's data is committed as soon as it is downloaded, followed by its 
+        journal entry. Running the same job again only downloads the symbols that are
+        still pending (and failed ones if 'retry_failed' is set), so a crashed or 
+        interrupted job resumes where it stopped. A symbol stored right before a crash 
+        may be downloaded once more, its rows are then skipped as duplicates.
+
+        Arguments:
+        job -- Job name as str, eg. 'daily-2019-12-31'.
+        symbols -- Pass multiple ticker symbols as a Python list (or single symbol as str).
+        New symbols are added to an existing job.
+        db -- SQLiteDB instance or database path holding the journal (and the data).
+        av_fun -- Alpha Vantage API function (default == 'TIME_SERIES_DAILY')
+        output -- Set 'full' or 'compact'. (default == 'compact')
+        interval -- Intraday data time-interval (default == None)
+        table -- SQLite table name for the data. (default == 'stocks')
+        directory -- If set, write csv files to this directory instead of 'table'. 
+        (default == None)
+        request_limit -- Respect the instance's request rate limits. (default == True)
+        retry_failed -- Download failed symbols again. (default == True)
+        journal_table -- SQLite table name for the journal. (default == 'journal')
+
+        Returns a dictionary of the number of pending, completed and failed symbols.
+
+        """
+        self._check_parameters(av_fun, output, interval)
+        symbols = symbols if isinstance(symbols, list) else [symbols]
+        journal = JobJournal(db, journal_table)
+        db = journal.db
+
+        journal.add(job, symbols)
+        todo = journal.symbols(job, "pending")
+        if(retry_failed):
+            todo += journal.symbols(job, "failed")
+
+        def store(symbol, data, error):
+            if(data is None):
+                journal.update(job, symbol, "failed", error = error or "no data")
+                return
+            if(directory != None):
+                journal.update(job, symbol, "completed")
+                return
+            counts = db.insert_many(data, table, verbose = False)
+            journal.update(job, symbol, "completed", rows = counts["inserted"])
+
+        kwargs = {"av_fun" : av_fun, "output" : output, "interval" : interval}
+        if(directory != None):
+            kwargs.update({"write_csv" : True, "directory" : directory})
+        if(todo):
+            self.__download(todo, request_limit = request_limit, in_memory = False, 
+                callback = store, **kwargs)
+
+        return journal.summary(job)
 
     @staticmethod
     def read_symbols(path, column_n = 1, skip_rows = 1, sep = ","):
@@ -0,0 +1,295 @@
+import os
+from time import time
+from datetime import timedelta
+from itertools import groupby
+from .columnar import import_numpy
+from .db_funcs import format_row, parse_csv_file, SQLiteDB
+from .metrics import registry as default_registry
+
+# Stored columns with their index in a 'stocks' table row and dtype.
+bar_columns = [
+                ("timestamp", 0, "int64"),
+                ("open", 4, "float64"),
+                ("high", 5, "float64"),
+                ("low", 6, "float64"),
+                ("close", 7, "float64"),
+                ("adjusted_close", 8, "float64"),
+                ("volume", 9, "int64"),
+                ("dividend_amount", 10, "float64"),
+                ("split_coeff", 11, "float64")
+                ]
+
+class BarStore(object):
+    """
+    Columnar on-disk bar store, an alternative backend to SQLiteDB.
+
+    Each (symbol, timeseries_api, interval) series is stored in its own directory as
+    append-only binary files, one per column, which are read back with numpy.memmap.
+    Timestamps are stored as int64 seconds since epoch. Requires NumPy.
+
+    Series are append-only: rows older than or equal to the latest timestamp stored
+    before an insert are skipped. Rows of one insert may come in any order, eg.
+    newest first over several batches. After a crash, columns are truncated to the
+    shortest column.
+
+    """
+    def __init__(self, directory, metrics = None):
+        """
+        Pass the store directory as str. A new directory is created if not found.
+
+        'metrics' is a MetricsRegistry receiving status events. 
+        (default == metrics.registry)
+
+        """
+        self.directory = directory
+        self.metrics = metrics or default_registry
+        if(not os.path.isdir(directory)):
+            os.makedirs(directory)
+
+    def __path(self, symbol, timeseries_api, interval):
+        return os.path.join(self.directory, symbol, "_".join([timeseries_api, str(interval)]))
+
+    @staticmethod
+    def __length(path):
+        """
+        Number of complete rows stored in a series directory.
+
+        """
+        sizes = [ os.path.getsize(os.path.join(path, col + ".bin")) // 8
+            if os.path.isfile(os.path.join(path, col + ".bin")) else 0 for col, i, dtype in bar_columns]
+        return min(sizes)
+
+    def __last_timestamp(self, path):
+        n = self.__length(path)
+        if(n == 0):
+            return None
+        with open(os.path.join(path, "timestamp.bin"), "rb") as f:
+            f.seek((n - 1) * 8)
+            return int.from_bytes(f.read(8), "little", signed = True)
+
+    def __columns(self, rows, timestamps):
+        """
+        Typed column arrays of 'rows', keyed by column name.
+
+        """
+        np = import_numpy()
+
+        columns = {"timestamp" : timestamps}
+        for col, i, dtype in bar_columns[1:]:
+            values = np.array([ np.nan if row[i] == None else row[i] for row in rows],
+                dtype = "float64")
+            columns[col] = np.nan_to_num(values).astype("int64") if dtype == "int64" else values
+        return columns
+
+    @staticmethod
+    def __write(path, columns, n):
+        """
+        Truncate the column files to 'n' rows, dropping a partially written tail, and
+        append 'columns'.
+
+        """
+        for col, i, dtype in bar_columns:
+            with open(os.path.join(path, col + ".bin"), "ab") as f:
+                f.truncate(n * 8)
+                columns[col].astype("<" + dtype[0] + "8").tofile(f)
+
+    def __append(self, batch, counts, appended):
+        """
+        Append typed rows to their series files, updating 'counts'.
+
+        'appended' maps each series touched by the current insert to its length and
+        latest timestamp before the insert. Only rows older than that stored data are
+        skipped: rows older than rows appended earlier in the same insert (eg. the
+        next batch of a newest-first series) are merged into them.
+
+        """
+        np = import_numpy()
+
+        batch.sort(key = lambda row: (row[1], row[2], str(row[3]), row[0]))
+        for (symbol, api, interval), rows in groupby(batch, key = lambda row: tuple(row[1:4])):
+            rows = list(rows)
+            path = self.__path(symbol, api, interval)
+            if(not os.path.isdir(path)):
+                os.makedirs(path)
+
+            n = self.__length(path)
+            if(path not in appended):
+                appended[path] = (n, self.__last_timestamp(path))
+            start, stored_last = appended[path]
+            last = self.__last_timestamp(path)
+            timestamps = np.array([ row[0] for row in rows], dtype = "datetime64[s]")\
+                .astype("int64")
+            # keep strictly increasing timestamps newer than the data stored before
+            keep = np.ones(len(rows), dtype = bool)
+            keep[1:] = timestamps[1:] > timestamps[:-1]
+            if(stored_last != None):
+                keep &= timestamps > stored_last
+            if(last != None and last != stored_last and keep.any() and 
+                timestamps[keep][0] <= last):
+                # overlaps rows appended by this insert, merge them
+                existing = { col : np.fromfile(os.path.join(path, col + ".bin"), 
+                    dtype = "<" + dtype[0] + "8", count = n - start, offset = start * 8)
+                    for col, i, dtype in bar_columns}
+                keep &= ~np.isin(timestamps, existing["timestamp"])
+                new = self.__columns(rows, timestamps)
+                order = np.argsort(np.concatenate([existing["timestamp"], 
+                    timestamps[keep]]), kind = "stable")
+                columns = { col : np.concatenate([existing[col], new[col][keep]])[order]
+                    for col, i, dtype in bar_columns}
+                n = start
+            else:
+                columns = { col : values[keep] 
+                    for col, values in self.__columns(rows, timestamps).items()}
+            counts["inserted"] += int(keep.sum())
+            counts["skipped"] += int(len(rows) - keep.sum())
+            if(keep.any()):
+                self.__write(path, columns, n)
+
+    def insert_many(self, rows, batch_size = 100000, verbose = True):
+        """
+        Append rows to the store.
+
+        Arguments:
+        rows -- Iterable of one-dimensional Python lists ('stocks' table layout).
+        batch_size -- Number of rows buffered per append. (default == 100000)
+        verbose -- Print insertion statistics. (default == True)
+
+        Returns a dictionary of inserted, updated and skipped row counts.
+
+        """
+        assert batch_size > 0, "Invalid argument 'batch_size'."
+
+        start_time = time()
+        counts = {"inserted" : 0, "updated" : 0, "skipped" : 0}
+        batch, appended = [], {}
+        for row in rows:
+            row = format_row(row, typed = True)
+            if(row == None):
+                continue
+            batch.append(row)
+            if(len(batch) >= batch_size):
+                self.__append(batch, counts, appended)
+                batch = []
+        if(batch):
+            self.__append(batch, counts, appended)
+
+        duration = time() - start_time
+        n = counts["inserted"] + counts["skipped"]
+        message = "Processed {0} rows in {1} ({2:.0f} rows/s): {3} inserted, {4} skipped."\
+            .format(n, timedelta(seconds = duration), n / max(duration, 1e-9),
+            counts["inserted"], counts["skipped"])
+        self.metrics.emit("insert_complete", message if verbose else None, 
+            store = self.directory, seconds = round(duration, 6), **counts)
+
+        return counts
+
+    def insert_timeseries(self, data, batch_size = 100000):
+        """
+        Append multiple rows of stock data to the store.
+
+        Pass data as a two-dimensional Python list.
+
+        """
+        return self.insert_many(data, batch_size = batch_size)
+
+    def insert_dict(self, data, batch_size = 100000):
+        """
+        Append a dictionary containing stock price data to the store.
+
+        """
+        rows = (row for stock in data.keys() for row in data[stock])
+        return self.insert_many(rows, batch_size = batch_size)
+
+    def insert_csv(self, directory = ".", select = "all", batch_size = 100000):
+        """
+        Append csv files to the store.
+
+        Arguments:
+        directory -- Source directory. (Default == current directory)
+        select -- Pass 'all' or a list of files. (default == 'all')
+        batch_size -- Number of rows buffered per append. (default == 100000)
+
+        """
+        if select == "all":
+            file_list = [ file for file in os.listdir(directory)]
+        else:
+            file_list = select if isinstance(select, list) else [select]
+
+        def rows():
+            for file in file_list:
+                path, data, error = parse_csv_file("/".join([directory, file]))
+                if(error != None):
+                    self.metrics.emit("csv_file", "Error: '{0}': {1}".format(file, error), 
+                        file = file, error = error)
+                yield from data
+
+        return self.insert_many(rows(), batch_size = batch_size)
+
+    def series(self):
+        """
+        Returns a list of stored (symbol, timeseries_api, interval) tuples.
+
+        """
+        result = []
+        for symbol in sorted(os.listdir(self.directory)):
+            for name in sorted(os.listdir(os.path.join(self.directory, symbol))):
+                api, interval = name.rsplit("_", 1)
+                result.append((symbol, api, interval))
+        return result
+
+    def load(
+        self, symbol, timeseries_api = "TIME_SERIES_DAILY", interval = "daily", start = None,
+        end = None):
+        """
+        Memory-map a stored series.
+
+        Arguments:
+        symbol -- Stock ticker symbol as a character string.
+        timeseries_api -- Alpha Vantage API function. (default == 'TIME_SERIES_DAILY')
+        interval -- Stored interval value, eg. 'daily' or '5min'. (default == 'daily')
+        start -- First timestamp (inclusive) as ISO string. (default == None)
+        end -- Last timestamp (inclusive) as ISO string. (default == None)
+
+        Returns a dictionary of read-only column arrays (timestamps as datetime64[s])
+        or None if the series is not stored.
+
+        """
+        np = import_numpy()
+
+        path = self.__path(symbol, timeseries_api, interval)
+        if(not os.path.isdir(path)):
+            return None
+
+        n = self.__length(path)
+        result = {}
+        for col, i, dtype in bar_columns:
+            result[col] = np.memmap(os.path.join(path, col + ".bin"), dtype = "<" + dtype[0] + "8",
+                mode = "r", shape = (n,)) if n > 0 else np.empty(0, dtype = dtype)
+        result["timestamp"] = result["timestamp"].view("datetime64[s]")
+
+        timestamps = result["timestamp"]
+        lo = 0 if start == None else np.searchsorted(timestamps, np.datetime64(start, "s"), "left")
+        hi = n if end == None else np.searchsorted(timestamps, np.datetime64(end, "s"), "right")
+        return { col : values[lo:hi] for col, values in result.items()}
+
+    @staticmethod
+    def from_sqlite(db, directory, table = "stocks", chunk_size = 100000, verbose = True):
+        """
+        Convert an existing SQLite 'stocks' table into a new BarStore.
+
+        Arguments:
+        db -- SQLiteDB instance or database path.
+        directory -- Store directory.
+        table -- SQLite table name. (default == 'stocks')
+        chunk_size -- Number of rows read at a time. (default == 100000)
+        verbose -- Print insertion statistics. (default == True)
+
+        Returns the BarStore instance.
+
+        """
+        db = db if isinstance(db, SQLiteDB) else SQLiteDB(db, create = False)
+        store = BarStore(directory, db.metrics)
+        rows = (row for symbol, chunk in db.iter_query(table = table, chunk_size = chunk_size)
+            for row in chunk)
+        store.insert_many(rows, batch_size = chunk_size, verbose = verbose)
+        return store
@@ -0,0 +1,150 @@
+import sqlite3
+import threading
+from time import time
+from datetime import datetime, timedelta, timezone
+try:
+    from zoneinfo import ZoneInfo
+    market_tz = ZoneInfo("America/New_York")
+except Exception:
+    market_tz = timezone(timedelta(hours = -5))
+
+def market_close(day):
+    """
+    Returns the US market close (16:00 New York time) of a date as a datetime.
+
+    """
+    return datetime(day.year, day.month, day.day, 16, tzinfo = market_tz)
+
+def cache_expiry(av_fun, interval = None, now = None):
+    """
+    Returns the expiry time (epoch seconds) of a response downloaded at 'now'.
+
+    Intraday responses expire after one interval, daily responses at the next
+    market close, weekly responses at the next Friday close and monthly responses
+    at the close of the last day of the month.
+
+    """
+    now = time() if now == None else now
+    if(av_fun == "TIME_SERIES_INTRADAY"):
+        return now + int(interval.replace("min", "")) * 60
+
+    local = datetime.fromtimestamp(now, market_tz)
+    if(av_fun.startswith("TIME_SERIES_DAILY")):
+        close = market_close(local)
+        while close <= local or close.weekday() > 4:
+            close = market_close(close + timedelta(days = 1))
+    elif(av_fun.startswith("TIME_SERIES_WEEKLY")):
+        close = market_close(local + timedelta(days = (4 - local.weekday()) % 7))
+        if(close <= local):
+            close = market_close(close + timedelta(days = 7))
+    else:
+        next_month = (local.replace(day = 1) + timedelta(days = 32)).replace(day = 1)
+        close = market_close(next_month - timedelta(days = 1))
+        if(close <= local):
+            following = (next_month + timedelta(days = 32)).replace(day = 1)
+            close = market_close(following - timedelta(days = 1))
+    return close.timestamp()
+
+class ResponseCache(object):
+    """
+    On-disk cache of raw API responses stored in a SQLite database.
+
+    Entries are keyed on (symbol, av_fun, output, interval) and expire according
+    to 'cache_expiry'. The least recently used entries are evicted when the total
+    size exceeds 'max_bytes'.
+
+    """
+    def __init__(self, path, max_bytes = 256 * 1024 ** 2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread = False)
+        self.__conn.execute("""CREATE TABLE IF NOT EXISTS responses (key text PRIMARY KEY,
+                               body blob, size integer, expires real, accessed real);""")
+        self.__conn.commit()
+
+    @staticmethod
+    def key(symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None):
+        return "|".join([symbol, av_fun, output, str(interval)])
+
+    def get(self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None):
+        """
+        Returns the cached response body (bytes) or None.
+
+        """
+        key = self.key(symbol, av_fun, output, interval)
+        now = time()
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT body, expires FROM responses WHERE key = ?;", (key,)).fetchone()
+            if(row == None or row[1] <= now):
+                if(row != None):
+                    self.__conn.execute("DELETE FROM responses WHERE key = ?;", (key,))
+                    self.__conn.commit()
+                self.misses += 1
+                return None
+            self.__conn.execute("UPDATE responses SET accessed = ? WHERE key = ?;", (now, key))
+            self.__conn.commit()
+            self.hits += 1
+        return row[0]
+
+    def contains(self, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None):
+        """
+        Returns True if an unexpired response is cached. Hits and misses are not counted.
+
+        """
+        key = self.key(symbol, av_fun, output, interval)
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT expires FROM responses WHERE key = ?;", (key,)).fetchone()
+        return row != None and row[0] > time()
+
+    def put(
+        self, body, symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", interval = None):
+        """
+        Store a response body (bytes) and evict entries above the size limit.
+
+        """
+        key = self.key(symbol, av_fun, output, interval)
+        now = time()
+        with self.__lock:
+            self.__conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?);",
+                (key, body, len(body), cache_expiry(av_fun, interval, now), now))
+            self.__evict()
+            self.__conn.commit()
+
+    def __evict(self):
+        self.__conn.execute("DELETE FROM responses WHERE expires <= ?;", (time(),))
+        size = self.__conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses;").fetchone()[0]
+        if(size <= self.max_bytes):
+            return
+        for key, entry_size in self.__conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed ASC;").fetchall():
+            self.__conn.execute("DELETE FROM responses WHERE key = ?;", (key,))
+            size -= entry_size
+            if(size <= self.max_bytes):
+                break
+
+    def stats(self):
+        """
+        Returns a dictionary of cache hits, misses, entries and size in bytes.
+
+        """
+        with self.__lock:
+            entries, size = self.__conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses;").fetchone()
+        return {"hits" : self.hits, "misses" : self.misses, "entries" : entries, "bytes" : size}
+
+    def clear(self):
+        """
+        Delete all cached responses.
+
+        """
+        with self.__lock:
+            self.__conn.execute("DELETE FROM responses;")
+            self.__conn.commit()
+
+    def close(self):
+        self.__conn.close()
@@ -0,0 +1,124 @@
+import csv
+from itertools import chain
+
+# Response column names mapped to the 'stocks' table column names.
+column_names = {
+                "adjusted close" : "adjusted_close",
+                "dividend amount" : "dividend_amount",
+                "split coefficient" : "split_coeff",
+                "split_coefficient" : "split_coeff"
+                }
+
+# Columns constant within a single time-series, dropped from the typed arrays.
+constant_columns = {"symbol", "timeseries_api", "interval"}
+
+def import_numpy():
+    """
+    Import NumPy or raise an ImportError with installation instructions.
+
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "Typed columnar results require NumPy: 'pip install alpha-vantage-tools[numpy]'.")
+    return numpy
+
+def column_dtype(name, missing = False):
+    """
+    Returns the NumPy dtype of a column.
+
+    Volume is int64 unless values are 'missing': int64 has no NaN, so the column is
+    float64 with NaN for the missing values.
+
+    """
+    if(name == "timestamp"):
+        return "datetime64[s]"
+    if(name == "volume" and not missing):
+        return "int64"
+    return "float64"
+
+def rows_to_array(rows):
+    """
+    Parse formatted rows (header row first) into a NumPy structured array.
+
+    Values may be strings (API responses, csv files) or numbers (SQLite queries).
+
+    Timestamps are parsed as datetime64[s], volume as int64 and the remaining
+    price columns as float64. Missing values are stored as NaN, a volume column with
+    missing values as float64. The symbol, timeseries_api and interval columns
+    are dropped as they are constant within a time-series.
+
+    Returns a one-dimensional structured array.
+
+    """
+    np = import_numpy()
+
+    rows = iter(rows)
+    header = [ column_names.get(col, col) for col in next(rows, [])]
+    selected = [ (i, col) for i, col in enumerate(header) if col not in constant_columns]
+
+    data = [ row for row in rows if row != [] and row != [""]]
+    dtype = [ (col, column_dtype(col, any([ row[i] == None or row[i] == "" for row in data])))
+        for i, col in selected]
+    result = np.empty(len(data), dtype = dtype)
+    for i, col in selected:
+        values = [ row[i] for row in data]
+        if(col == "timestamp"):
+            result[col] = np.array(values, dtype = "datetime64[s]")
+        else:
+            # missing values (eg. unadjusted rows) are stored as NaN
+            result[col] = np.array(
+                [ "nan" if value == None or value == "" else value for value in values], 
+                dtype = "float64")
+    return result
+
+def csv_to_array(body, skip = 0):
+    """
+    Parse a raw csv response body (bytes, header row first) into a NumPy structured
+    array, like 'rows_to_array'.
+
+    The body is decoded once and parsed by 'numpy.loadtxt'. Bodies with missing
+    values are split once and converted a whole column at a time, without building
+    a list per row. 'skip' data rows after the header are dropped. Bodies with
+    quoted fields or ragged rows are parsed with the 'csv' module instead.
+
+    Returns a one-dimensional structured array.
+
+    """
+    np = import_numpy()
+
+    text = body.decode("utf-8")
+    lines = [ line for line in text.splitlines() if line]
+    if(not lines):
+        return rows_to_array([])
+    header = lines[0].split(",")
+    data = lines[1 + skip:]
+    if(not data or '"' in text):
+        return rows_to_array(chain([header], csv.reader(data)))
+
+    header = [ column_names.get(col, col) for col in header]
+    selected = [ (i, col) for i, col in enumerate(header) if col not in constant_columns]
+    dtype = [ (col, column_dtype(col)) for i, col in selected]
+    try:
+        return np.loadtxt(data, delimiter = ",", dtype = dtype, ndmin = 1,
+            usecols = [ i for i, col in selected])
+    except ValueError:
+        pass
+
+    n = len(header)
+    fields = ",".join(data).split(",")
+    if(len(fields) != n * len(data)):
+        return rows_to_array(chain([lines[0].split(",")], csv.reader(data)))
+
+    dtype = [ (col, column_dtype(col, "" in fields[i::n])) for i, col in selected]
+    result = np.empty(len(data), dtype = dtype)
+    for i, col in selected:
+        values = fields[i::n]
+        if(col == "timestamp"):
+            result[col] = np.array(values, dtype = "datetime64[s]")
+            continue
+        # missing values are stored as NaN
+        result[col] = np.array(
+            [ "nan" if value == "" else value for value in values], dtype = "float64")
+    return result
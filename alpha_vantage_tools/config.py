@@ -26,6 +26,28 @@ def api_parameters():
             }
     return params
 
+def api_limits():
+    """
+    Returns a dictionary of default API request limits (free API key).
+
+    """
+    limits = {
+
+                "requests_per_minute" : 5,
+
+                "requests_per_day" : 500,
+
+                "workers" : 1,
+
+                "retries" : 3,
+
+                "backoff" : 1.0,
+
+                "max_backoff" : 60.0
+
+            }
+    return limits
+
 def db_queries():
     """
     Returns a dictionary of default SQL queries.
@@ -46,9 +68,73 @@ def db_queries():
 
                 "insert" : "INSERT INTO {table} VALUES",
 
+                "on_conflict" : "ON CONFLICT ({key})",
+
+                "create_index" : """CREATE INDEX IF NOT EXISTS {table}_symbol_timestamp 
+                                    ON {table} (symbol, timeseries_api, interval, timestamp);""",
+
+                "select" : "SELECT {columns} FROM {table}{where} ORDER BY symbol, timestamp;",
+
                 "select_top" : """SELECT * FROM {table} ORDER BY 
-                                  symbol {direction}, timestamp {direction} LIMIT {n};"""
+                                  symbol {direction}, timestamp {direction} LIMIT {n};""",
+
+                "select_latest" : """SELECT symbol, MAX(timestamp) FROM {table} 
+                                     WHERE timeseries_api = ? AND interval = ? GROUP BY symbol;""",
+
+                "create_journal" : """CREATE TABLE IF NOT EXISTS {table} (job text, symbol text, 
+                                      status text, rows integer, error text, updated real,
+                                      PRIMARY KEY (job, symbol));""",
+
+                "journal_add" : """INSERT INTO {table} VALUES (?, ?, 'pending', NULL, NULL, ?) 
+                                   ON CONFLICT (job, symbol) DO NOTHING;""",
+
+                "journal_update" : """UPDATE {table} SET status = ?, rows = ?, error = ?, 
+                                      updated = ? WHERE job = ? AND symbol = ?;""",
+
+                "delete_from" : """DELETE FROM {table} WHERE symbol = ? AND timeseries_api = ? 
+                                   AND interval = ? AND timestamp >= ?;""",
+
+                "create_indicators" : """CREATE TABLE IF NOT EXISTS {table} (timestamp text, 
+                                         symbol text, timeseries_api text, interval text, {columns},
+                                         PRIMARY KEY (timestamp, symbol, timeseries_api, interval));""",
+
+                "insert_indicators" : """INSERT INTO {table} VALUES ({values}) ON CONFLICT 
+                                         (timestamp, symbol, timeseries_api, interval) 
+                                         DO UPDATE SET {update};""",
+
+                "create_indicator_state" : """CREATE TABLE IF NOT EXISTS {table} (symbol text, 
+                                              timeseries_api text, interval text, timestamp text, 
+                                              state text, PRIMARY KEY (symbol, timeseries_api, interval));""",
+
+                "upsert_indicator_state" : """INSERT INTO {table} VALUES (?, ?, ?, ?, ?) ON CONFLICT 
+                                              (symbol, timeseries_api, interval) DO UPDATE SET 
+                                              timestamp = excluded.timestamp, state = excluded.state;""",
+
+                "select_indicator_state" : """SELECT symbol, timestamp, state FROM {table} 
+                                              WHERE timeseries_api = ? AND interval = ?;""",
+
+                "journal_select" : """SELECT symbol, status, rows, error FROM {table} 
+                                      WHERE job = ? ORDER BY rowid;"""
 
                 }
     return queries
 
+def db_pragmas():
+    """
+    Returns a dictionary of default PRAGMA statements for SQLite sessions.
+
+    WAL journaling lets readers query the database while a writer is inserting.
+
+    """
+    pragmas = {
+
+                "journal_mode" : "WAL",
+
+                "synchronous" : "NORMAL",
+
+                "cache_size" : -64000,
+
+                "mmap_size" : 268435456
+
+                }
+    return pragmas
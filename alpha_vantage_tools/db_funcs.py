@@ -1,20 +1,151 @@
 import sqlite3
 import os
-from .config import db_queries
+import threading
+import csv
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from .config import db_queries, db_pragmas
 from .helpers import read_csv, header_row
+from .columnar import rows_to_array
+from .metrics import registry as default_registry
+from itertools import groupby
 import re
+from time import time, perf_counter
+from datetime import timedelta
+
+# Active sessions by database path.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def active_session(db):
+    """
+    Returns the open SQLiteSession of a database or None.
+
+    """
+    return _sessions.get(db)
+
+def format_row(row, typed = False):
+    """
+    Pad a row to the full 'stocks' table width.
+
+    With 'typed' set, price columns are converted to float and volume to int.
+
+    Returns a new list or None for header rows.
+
+    """
+    if(header_row(row)):
+        return None
+
+    row = list(row)
+    if(len(row) < 12):
+        row.insert(8, None)
+        row.extend((None, None))
+    if(typed):
+        for i in range(4, 12):
+            value = row[i]
+            if(value == None or value == ""):
+                row[i] = None
+            else:
+                row[i] = int(float(value)) if i == 9 else float(value)
+    return row
+
+def parse_csv_file(path):
+    """
+    Read a csv file into typed, padded rows. Runs in worker processes.
+
+    Returns a tuple of the file path, list of rows and an error message or None.
+
+    """
+    try:
+        data = read_csv(path)
+        if(data == None):
+            return path, [], "File not found."
+        rows = [ format_row(row, typed = True) for row in data]
+        return path, [ row for row in rows if row != None], None
+    except (ValueError, IndexError, OSError, csv.Error, ImportError) as e:
+        return path, [], str(e)
+
+def _bounded_map(executor, fun, items, max_pending, pending):
+    """
+    Yield the results of 'fun(item)' in completion order, with at most 'max_pending'
+    calls submitted to 'executor' at a time. Completed futures are dropped once their
+    result is yielded, so only the results in flight are held in memory.
+
+    'pending' is the set of submitted futures, eg. for cancelling them.
+
+    """
+    items = iter(items)
+    for item in items:
+        pending.add(executor.submit(fun, item))
+        if(len(pending) >= max_pending):
+            break
+    while pending:
+        done, not_done = wait(pending, return_when = FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            for item in items:
+                pending.add(executor.submit(fun, item))
+                break
+        while done:
+            yield done.pop().result()
+
+class SQLiteSession(object):
+    """
+    Long-lived database session.
+
+    Keeps one connection per thread open until the session is closed.
+
+    """
+    def __init__(self, db, pragmas = None):
+        self.db = db
+        self.pragmas = db_pragmas() if pragmas == None else pragmas
+        self.depth = 0
+        self.connections = []
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+
+    def connection(self):
+        """
+        Returns the connection of the calling thread, connecting if necessary.
+
+        """
+        conn = getattr(self.__local, "conn", None)
+        if(conn == None):
+            conn = sqlite3.connect(self.db, check_same_thread = False)
+            for name, value in self.pragmas.items():
+                conn.execute("PRAGMA {0} = {1};".format(name, value))
+            self.__local.conn = conn
+            with self.__lock:
+                self.connections.append(conn)
+        return conn
+
+    def close(self):
+        """
+        Commit and close all connections of the session.
+
+        """
+        with self.__lock:
+            for conn in self.connections:
+                conn.commit()
+                conn.close()
+            self.connections = []
+        self.__local = threading.local()
 
 class SQLiteConn(object):
     """
     Database connection object.
 
+    Reuses the connection of an open SQLiteSession instead of connecting.
+
     """
     def __init__(self, db):
         self.db = db
         self.conn = None
+        self.shared = False
         self.flag = "connection closed"
     def __enter__(self):
-        self.conn = sqlite3.connect(self.db)
+        session = active_session(self.db)
+        self.shared = session != None
+        self.conn = session.connection() if self.shared else sqlite3.connect(self.db)
         self.flag = "connected"
         return self.conn
     def __exit__(self, type, value, traceback):
@@ -22,7 +153,8 @@ class SQLiteConn(object):
             self.conn.commit()
         else:
             self.conn.rollback()
-        self.conn.close()
+        if(not self.shared):
+            self.conn.close()
         self.flag = "connection closed"
 
 class SQLiteDB(object):
@@ -31,17 +163,50 @@ class SQLiteDB(object):
 
     """
     defaults = db_queries()
+    conflict_policies = {"ignore", "replace", "update"}
 
-    def __init__(self, db, create = True):
+    def __init__(self, db, create = True, pragmas = None, metrics = None):
         """
         Pass database path as str. New SQLite database is created by default if 
         an existing database is not found.
+
+        Use the instance as a context manager to reuse connections between queries
+        ('session mode'). 'pragmas' is a dictionary of PRAGMA statements applied to
+        session connections. (default == config.db_pragmas())
+
+        'metrics' is a MetricsRegistry recording batch insert latencies and row counts
+        and receiving status events. (default == metrics.registry)
         
         """
         self.db = db
+        self.pragmas = pragmas
+        self.metrics = metrics or default_registry
+        self.session = None
         if(not os.path.isfile(db) and create):
             self.create(db)
 
+    def __enter__(self):
+        """
+        Open a session. Nested sessions share the outermost connections.
+
+        """
+        with _sessions_lock:
+            session = _sessions.get(self.db)
+            if(session == None):
+                session = SQLiteSession(self.db, self.pragmas)
+                _sessions[self.db] = session
+            session.depth += 1
+        self.session = session
+        return self
+
+    def __exit__(self, type, value, traceback):
+        with _sessions_lock:
+            self.session.depth -= 1
+            if(self.session.depth == 0):
+                del _sessions[self.db]
+                self.session.close()
+        self.session = None
+
     @staticmethod
     def with_open_db(db, fun, *args, **kwargs):
         """
@@ -64,13 +229,12 @@ class SQLiteDB(object):
             try:
                 if(data):
                     c.execute(query, data)
-                elif (fetch):
-                    return c.execute(query).fetchall()
-                else: 
-                    return c.execute(query)
+                else:
+                    c.execute(query)
+                return c.fetchall() if fetch else c
             except(
                 sqlite3.OperationalError, sqlite3.IntegrityError, sqlite3.DatabaseError) as e:
-                print("Error: {0}".format(e))
+                default_registry.emit("db_error", "Error: {0}".format(e), error = str(e))
 
         return SQLiteDB.with_open_db(db, wrapper, query, data, fetch)
 
@@ -84,71 +248,358 @@ class SQLiteDB(object):
         query = SQLiteDB.defaults["create_table"].format(table = table, columns = query_columns)
 
         SQLiteDB.execute_query(db, query)
+        SQLiteDB.create_indexes(db, table)
+
+    @staticmethod
+    def create_indexes(db, table = "stocks"):
+        """
+        Create the (symbol, timeseries_api, interval, timestamp) index used by 'query'.
+
+        Tables created before 'create' added this index need this to be called once.
+
+        """
+        SQLiteDB.execute_query(db, SQLiteDB.defaults["create_index"].format(table = table))
+
+    def __insert_query(self, table = "stocks", conflict = "ignore"):
+        """
+        Parametrized insert query for the given table and conflict policy.
 
-    def insert_row(self, row, table = "stocks"):
+        """
+        assert conflict in self.conflict_policies, "Invalid argument 'conflict'."
+
+        columns = [ col.split()[0] for col in self.defaults["columns_adjusted"].split(",")]
+        values = columns[4:]
+        on_conflict = self.defaults["on_conflict"].format(key = ", ".join(columns[:4]))
+
+        if(conflict == "ignore"):
+            on_conflict += " DO NOTHING"
+        else:
+            on_conflict += " DO UPDATE SET " + ", ".join(
+                [ "{0} = excluded.{0}".format(col) for col in values])
+        if(conflict == "update"):
+            on_conflict += " WHERE " + " OR ".join(
+                [ "{0} IS NOT excluded.{0}".format(col) for col in values])
+
+        query_columns = "({}?)".format("?, " * 11)
+        return " ".join([self.defaults["insert"], query_columns, on_conflict])\
+            .format(table = table) + ";"
+
+    def insert_row(self, row, table = "stocks", conflict = "ignore"):
         """
         Insert row.
 
         Pass the inserted row as a one-dimensional Python list.
+        See 'help(SQLiteDB.insert_many)' for the conflict policies and return value.
 
         """
+        return self.insert_many([row], table, conflict = conflict, verbose = False)
 
-        if(header_row(row)):
-            return
+    def __insert_batches(self, conn, rows, query, table, batch_size, counts):
+        """
+        Insert rows in batches over an open connection, updating 'counts'.
 
-        row = row[:]
-        if(len(row) < 12):
-            row.insert(8, None)
-            row.extend((None, None))
+        """
+        max_rowid = "SELECT COALESCE(MAX(rowid), 0) FROM {table};".format(table = table)
+
+        def insert_batch(batch):
+            start = perf_counter()
+            # new rows are appended after the largest rowid
+            rowid = conn.execute(max_rowid).fetchone()[0]
+            changed = conn.executemany(query, batch).rowcount
+            inserted = conn.execute(max_rowid).fetchone()[0] - rowid
+            conn.commit()
+            batch_counts = {"inserted" : inserted, "updated" : changed - inserted, 
+                "skipped" : len(batch) - changed}
+            self.metrics.observe("db_batch_seconds", perf_counter() - start, table = table)
+            for key, value in batch_counts.items():
+                counts[key] += value
+                self.metrics.inc("db_rows_total", value, table = table, result = key)
+
+        batch = []
+        for row in rows:
+            row = format_row(row)
+            if(row == None):
+                continue
+            batch.append(row)
+            if(len(batch) >= batch_size):
+                insert_batch(batch)
+                batch = []
+        if(batch):
+            insert_batch(batch)
+
+    def insert_many(
+        self, rows, table = "stocks", batch_size = 1000, conflict = "ignore", verbose = True):
+        """
+        Bulk insert rows using a single connection.
+
+        Rows are written with 'executemany' and committed once per batch. Rows
+        conflicting with the primary key are handled with 'INSERT ... ON CONFLICT':
 
-        query_columns = "({}?);".format("?, " * 11)
-        query = " ".join([self.defaults["insert"], query_columns]).format(table = table)
-        self.execute_query(self.db, query, data = row)
+        'ignore' -- keep the stored row.
+        'replace' -- overwrite the stored row.
+        'update' -- overwrite the stored row only if any of its values changed.
+
+        Arguments:
+        rows -- Iterable of one-dimensional Python lists.
+        table -- SQLite table name. (default == 'stocks')
+        batch_size -- Number of rows per transaction. (default == 1000)
+        conflict -- Conflict policy: 'ignore', 'replace' or 'update'. (default == 'ignore')
+        verbose -- Print insertion statistics. (default == True)
 
-    def insert_timeseries(self, data, table = "stocks"):
+        Returns a dictionary of inserted, updated and skipped row counts.
+
+        """
+        assert batch_size > 0, "Invalid argument 'batch_size'."
+
+        query = self.__insert_query(table, conflict)
+        start_time = time()
+        counts = {"inserted" : 0, "updated" : 0, "skipped" : 0}
+
+        with SQLiteConn(self.db) as conn:
+            self.__insert_batches(conn, rows, query, table, batch_size, counts)
+
+        duration = time() - start_time
+        n = sum(counts.values())
+        message = "Processed {0} rows in {1} ({2:.0f} rows/s): {3} inserted, {4} updated, "\
+            "{5} skipped.".format(n, timedelta(seconds = duration), n / max(duration, 1e-9), 
+            counts["inserted"], counts["updated"], counts["skipped"])
+        self.metrics.emit("insert_complete", message if verbose else None, table = table, 
+            seconds = round(duration, 6), **counts)
+
+        return counts
+
+    def insert_timeseries(self, data, table = "stocks", batch_size = 1000, conflict = "ignore"):
         """
         Insert multiple rows of stock data into sqlite database.
 
         Pass data as a two-dimensional Python list.
 
         """ 
-        for row in data:
-            self.insert_row(row, table)
+        return self.insert_many(data, table, batch_size = batch_size, conflict = conflict)
  
-    def insert_csv(self, directory = ".", select = "all", table = "stocks"):
+    def insert_csv(
+        self, directory = ".", select = "all", table = "stocks", batch_size = 1000, 
+        conflict = "ignore", processes = None, verbose = True):
         """
         Insert csv files to SQLite database.
 
+        Files are parsed into typed rows in a pool of worker processes while a single
+        connection writes the parsed files into the database. At most four files per
+        process are parsed ahead of the writer, so memory use does not grow with the
+        number of files.
+
         Arguments:
         directory -- Source directory. (Default == current directory)
         select -- Pass 'all' or a list of files. (default == 'all')
         table -- SQLite table name. (default == 'stocks')
+        batch_size -- Number of rows per transaction. (default == 1000)
+        conflict -- Conflict policy, see 'help(SQLiteDB.insert_many)'. (default == 'ignore')
+        processes -- Number of parser processes, 1 parses in the current process. 
+        (default == None, number of CPUs)
+        verbose -- Print progress for each file. (default == True)
+
+        Returns a dictionary of inserted, updated and skipped row counts. The 'files'
+        key holds the counts or the error message of each file.
 
         """
-        results = []
-        def insert_row(i, row):
-            self.insert_row(row, table = table)
+        assert batch_size > 0, "Invalid argument 'batch_size'."
 
         # handle selection
         if select == "all":
             file_list = [ file for file in os.listdir(directory)]
         else:
             file_list = select if isinstance(select, list) else [select]
-            
-        # go trough each file and insert rows into the database
-        for file in file_list:
-            file_path = "/".join([directory, file])
-            results.append(read_csv(file_path, fun = insert_row))
+        paths = [ "/".join([directory, file]) for file in file_list]
+
+        query = self.__insert_query(table, conflict)
+        start_time = time()
+        counts = {"inserted" : 0, "updated" : 0, "skipped" : 0, "files" : {}}
+
+        if(processes == 1 or len(paths) < 2):
+            executor = None
+            parsed = map(parse_csv_file, paths)
+        else:
+            executor = ProcessPoolExecutor(max_workers = processes)
+            futures = set()
+            parsed = _bounded_map(executor, parse_csv_file, paths, 
+                4 * (processes or os.cpu_count() or 1), futures)
+
+        try:
+            with SQLiteConn(self.db) as conn:
+                for i, (path, rows, error) in enumerate(parsed):
+                    file = os.path.basename(path)
+                    if(error != None):
+                        counts["files"][file] = error
+                        self.metrics.emit("csv_file", "File {0}/{1} '{2}': Error: {3}"\
+                            .format(i + 1, len(paths), file, error) if verbose else None, 
+                            file = file, error = error)
+                        continue
+                    file_counts = {"inserted" : 0, "updated" : 0, "skipped" : 0}
+                    self.__insert_batches(conn, rows, query, table, batch_size, file_counts)
+                    counts["files"][file] = file_counts
+                    for key, value in file_counts.items():
+                        counts[key] += value
+                    self.metrics.emit("csv_file", "File {0}/{1} '{2}': {3} rows."\
+                        .format(i + 1, len(paths), file, len(rows)) if verbose else None,
+                        file = file, rows = len(rows))
+        finally:
+            if(executor != None):
+                # 'shutdown(cancel_futures = True)' requires Python 3.9
+                for future in list(futures):
+                    future.cancel()
+                executor.shutdown()
+
+        duration = time() - start_time
+        n = counts["inserted"] + counts["updated"] + counts["skipped"]
+        self.metrics.emit("insert_csv_complete", "Processed {0} rows from {1} files in {2} "\
+            "({3:.0f} rows/s).".format(n, len(paths), timedelta(seconds = duration), 
+            n / max(duration, 1e-9)) if verbose else None, table = table, files = len(paths), 
+            rows = n, seconds = round(duration, 6))
+
+        return counts
         
-    def insert_dict(self, data, table = "stocks"):
+    def insert_dict(self, data, table = "stocks", batch_size = 1000, conflict = "ignore"):
         """
         Insert a dictionary containing stock price data into SQLite.
 
         """
-        for stock in data.keys():
-            for row in data[stock]:
-                self.insert_row(row, table = table)
+        rows = (row for stock in data.keys() for row in data[stock])
+        return self.insert_many(rows, table, batch_size = batch_size, conflict = conflict)
     
+    def latest_timestamps(self, timeseries_api, interval, symbols = None, table = "stocks"):
+        """
+        Latest stored timestamp per symbol for a time-series api and interval.
+
+        Arguments:
+        timeseries_api -- Alpha Vantage API function, eg. 'TIME_SERIES_DAILY'.
+        interval -- Stored interval value, eg. 'daily' or '5min'.
+        symbols -- Restrict the lookup to a list of symbols. (default == None, all symbols)
+        table -- SQLite table name. (default == 'stocks')
+
+        Returns a dictionary of symbol: timestamp.
+
+        """
+        query = self.defaults["select_latest"].format(table = table)
+        result = self.execute_query(self.db, query, data = (timeseries_api, interval), fetch = True)
+        latest = dict(result or [])
+        if(symbols != None):
+            symbols = symbols if isinstance(symbols, list) else [symbols]
+            latest = { symbol : latest[symbol] for symbol in symbols if symbol in latest}
+        return latest
+
+    def query(
+        self, symbols = None, start = None, end = None, av_fun = None, interval = None, 
+        columns = None, table = "stocks", as_array = False):
+        """
+        Select stock price data, sorted by symbol and timestamp.
+
+        Arguments:
+        symbols -- Ticker symbol or a list of symbols. (default == None, all symbols)
+        start -- First timestamp (inclusive) as ISO string, eg. '2019-01-01'. (default == None)
+        end -- Last timestamp (inclusive) as ISO string. Intraday timestamps of the last
+        day are greater than a plain date, eg. use '2019-12-31 23:59:59'. (default == None)
+        av_fun -- Alpha Vantage API function. (default == None, all functions)
+        interval -- Stored interval value, eg. 'daily' or '5min'. (default == None)
+        columns -- List of column names. (default == None, all columns)
+        table -- SQLite table name. (default == 'stocks')
+        as_array -- If set True, return typed NumPy arrays. (default == False)
+
+        Returns a list of row tuples or, if 'as_array' == True, a dictionary of 
+        structured arrays keyed by symbol (see 'columnar.rows_to_array').
+
+        """
+        if(as_array):
+            # symbol is needed for grouping the rows
+            columns = ["symbol"] + [ col for col in columns if col != "symbol"] \
+                if columns else None
+        query, params, columns = self.__select_query(
+            symbols, start, end, av_fun, interval, columns, table)
+        result = self.execute_query(self.db, query, data = params, fetch = True)
+
+        if(not as_array):
+            return result
+        return { symbol : rows_to_array([columns] + list(rows)) 
+            for symbol, rows in groupby(result or [], key = lambda row: row[columns.index("symbol")])}
+
+    def iter_query(
+        self, symbols = None, start = None, end = None, av_fun = None, interval = None, 
+        columns = None, table = "stocks", chunk_size = 10000, as_array = False):
+        """
+        Stream stock price data in chunks, sorted by symbol and timestamp.
+
+        Rows are fetched from an open cursor 'chunk_size' rows at a time, so memory use
+        is bounded by the chunk size instead of the result size. A chunk never spans
+        two symbols. See 'help(SQLiteDB.query)' for the rest of the arguments.
+
+        Yields (symbol, chunk) tuples. Chunks are lists of row tuples or, if
+        'as_array' == True, NumPy structured arrays.
+
+        """
+        assert chunk_size > 0, "Invalid argument 'chunk_size'."
+
+        # symbol is needed for splitting the chunks
+        strip = columns != None and "symbol" not in columns
+        columns = ["symbol"] + columns if strip else columns
+        query, params, columns = self.__select_query(
+            symbols, start, end, av_fun, interval, columns, table)
+        i = columns.index("symbol")
+
+        def chunk(rows):
+            if(as_array):
+                return rows_to_array([columns] + rows)
+            return [ row[1:] for row in rows] if strip else rows
+
+        with SQLiteConn(self.db) as conn:
+            cursor = conn.cursor()
+            cursor.arraysize = chunk_size
+            cursor.execute(query, params)
+            symbol, pending = None, []
+            while True:
+                rows = cursor.fetchmany()
+                if(not rows):
+                    break
+                for key, group in groupby(rows, key = lambda row: row[i]):
+                    if(key != symbol and pending):
+                        yield symbol, chunk(pending)
+                        pending = []
+                    symbol = key
+                    pending.extend(group)
+                    while len(pending) >= chunk_size:
+                        yield symbol, chunk(pending[:chunk_size])
+                        pending = pending[chunk_size:]
+            if(pending):
+                yield symbol, chunk(pending)
+
+    def __select_query(
+        self, symbols = None, start = None, end = None, av_fun = None, interval = None, 
+        columns = None, table = "stocks"):
+        """
+        Build a parametrized select query.
+
+        Returns a tuple of the query, parameters and selected columns.
+
+        """
+        all_columns = [ col.split()[0] for col in self.defaults["columns_adjusted"].split(",")]
+        columns = columns or all_columns
+        assert set(columns) <= set(all_columns), "Invalid argument 'columns'."
+
+        conditions, params = [], []
+        if(symbols != None):
+            symbols = symbols if isinstance(symbols, list) else [symbols]
+            conditions.append("symbol IN ({0})".format(", ".join(["?"] * len(symbols))))
+            params.extend(symbols)
+        for condition, value in [
+            ("timeseries_api = ?", av_fun), ("interval = ?", interval), 
+            ("timestamp >= ?", start), ("timestamp <= ?", end)]:
+            if(value != None):
+                conditions.append(condition)
+                params.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+        query = self.defaults["select"].format(
+            columns = ", ".join(columns), table = table, where = where)
+        return query, params, columns
+
     def __select_top(self, table = "stocks", n = 10, direction = "ASC"):
         """
         Print the top/bottom n rows of a database table.
@@ -0,0 +1,102 @@
+import gzip
+from .columnar import column_names, constant_columns
+
+# Output file formats and their file extensions.
+file_formats = {
+                "csv" : ".csv",
+                "gzip" : ".csv.gz",
+                "zstd" : ".csv.zst",
+                "parquet" : ".parquet"
+                }
+
+def path_format(path):
+    """
+    Returns the file format of a path from its extension. (default == 'csv')
+
+    """
+    for name, extension in sorted(file_formats.items(), key = lambda item: -len(item[1])):
+        if(path.endswith(extension)):
+            return name
+    return "csv"
+
+def import_zstandard():
+    """
+    Import zstandard or raise an ImportError with installation instructions.
+
+    """
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "Zstandard compressed files require zstandard: 'pip install alpha-vantage-tools[zstd]'.")
+    return zstandard
+
+def import_pyarrow():
+    """
+    Import pyarrow.parquet or raise an ImportError with installation instructions.
+
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "Parquet files require pyarrow: 'pip install alpha-vantage-tools[parquet]'.")
+    return pyarrow
+
+def open_text(path, mode = "rt", file_format = None):
+    """
+    Open a csv file in text mode, compressed streams are (de)compressed on the fly.
+
+    The format is taken from the file extension unless 'file_format' is given.
+
+    """
+    file_format = file_format or path_format(path)
+    if(file_format == "gzip"):
+        return gzip.open(path, mode, newline = "")
+    if(file_format == "zstd"):
+        return import_zstandard().open(path, mode, newline = "")
+    return open(path, mode, newline = "")
+
+def write_parquet(path, rows):
+    """
+    Write formatted rows (header row first) to a Parquet file.
+
+    Price columns are stored as float64 and volume as int64, missing values as nulls.
+    The symbol, timeseries_api and interval columns are dictionary encoded, so the
+    values repeated on every row are stored once per row group.
+
+    """
+    pa = import_pyarrow()
+
+    rows = iter(rows)
+    header = list(next(rows, []))
+    columns = list(zip(*rows)) or [()] * len(header)
+    arrays = []
+    for name, values in zip(header, columns):
+        name = column_names.get(name, name)
+        if(name == "timestamp" or name in constant_columns):
+            array = pa.array(values, type = pa.string())
+            arrays.append(array.dictionary_encode() if name in constant_columns else array)
+            continue
+        values = [ None if value == None or value == "" else value for value in values]
+        if(name == "volume"):
+            arrays.append(pa.array([ None if value == None else int(float(value))
+                for value in values], type = pa.int64()))
+        else:
+            arrays.append(pa.array([ None if value == None else float(value)
+                for value in values], type = pa.float64()))
+
+    table = pa.Table.from_arrays(arrays, names = header)
+    pa.parquet.write_table(table, path, compression = "zstd")
+
+def read_parquet(path):
+    """
+    Read a Parquet file into rows, header row first.
+
+    """
+    pa = import_pyarrow()
+
+    table = pa.parquet.read_table(path)
+    columns = [ column.to_pylist() for column in table.columns]
+    return [list(table.column_names)] + [ list(row) for row in zip(*columns)]
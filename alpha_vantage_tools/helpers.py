@@ -1,7 +1,10 @@
 import csv
+import uuid
+from datetime import datetime, timedelta
 from os import mkdir, getenv
 import os.path
 from dotenv import load_dotenv
+from .formats import path_format, open_text, read_parquet, write_parquet
 
 def get_env():
     """
@@ -16,20 +19,27 @@ def read_csv(path, sep = ",", fun = lambda i, x: x):
     """
     Generic function for reading tabular data. 
 
-    Returns a list of rows. Row values are formatted as strings. 
+    Gzip (.csv.gz) and Zstandard (.csv.zst) compressed files are decompressed on the
+    fly and Parquet (.parquet) files are read with pyarrow.
+
+    Returns a list of rows. Row values are formatted as strings, except for Parquet
+    files which keep their column types.
 
     """ 
     try:
-        with open(path, "rt") as csv_file:
+        if(path_format(path) == "parquet"):
+            rows = read_parquet(path)
+            return [ x for x in (fun(i, row) for i, row in enumerate(rows)) if x != None]
+        with open_text(path, "rt") as csv_file:
             csv_r = csv.reader(csv_file, delimiter = sep)
             # read and process each row
-            result = [ fun(i, row) for i, row in enumerate(csv_r) if fun(i, row) != None]
+            result = [ x for x in (fun(i, row) for i, row in enumerate(csv_r)) if x != None]
     except (FileNotFoundError) as e:
         print("Error: {0}".format(e))
         return
     return result
 
-def write_csv(path, data, sep = ","):
+def write_csv(path, data, sep = ",", incremental = False):
     """
     Generic function for writing csv files:
 
@@ -37,6 +47,21 @@ def write_csv(path, data, sep = ","):
 
     -Creates new directory if non-existing directory given.
 
+    -Compresses the rows on the fly for '.csv.gz' (gzip) and '.csv.zst' (Zstandard)
+    paths, writes a Parquet file for '.parquet' paths.
+
+    -Writes a temporary file renamed over the target, so a crash never leaves a
+    partially written file behind.
+
+    With 'incremental' set, only rows newer than the latest timestamp (first column)
+    of an existing file are added and older rows are kept. Pass rows with the header
+    row first. New files are written in ascending time order, so later updates of an
+    uncompressed csv file append in place, found by reading the first and last lines
+    only. Other files (eg. descending files written without 'incremental') are 
+    rewritten with the new rows in the order of the stored rows.
+
+    Returns the number of added rows when incremental.
+
     """
     directory = os.path.split(path)[0]
 
@@ -47,12 +72,134 @@ def write_csv(path, data, sep = ","):
         mkdir(directory)
 
     try:
-        with open(path, "wt") as text_file:
-            csv_w = csv.writer(text_file, delimiter = sep)
-            csv_w.writerows(data)
+        if(incremental and os.path.isfile(path)):
+            return _update_csv(path, data, sep)
+        if(incremental):
+            data = _ascending(data)
+        _replace_file(path, lambda tmp: _write_rows(tmp, data, sep, path_format(path)))
+        if(incremental):
+            return max(0, len(data) - 1)
     except IsADirectoryError as e:
         print("Error: {0}".format(e))
 
+def _write_rows(path, rows, sep, file_format):
+    """
+    Write rows to 'path' in the given format.
+
+    """
+    if(file_format == "parquet"):
+        write_parquet(path, rows)
+        return
+    with open_text(path, "wt", file_format) as text_file:
+        csv.writer(text_file, delimiter = sep).writerows(rows)
+
+def _replace_file(path, write):
+    """
+    Call 'write(temporary_path)' and atomically rename the synced temporary file to
+    'path'. The temporary file is removed on errors.
+
+    """
+    directory, name = os.path.split(path)
+    tmp = os.path.join(directory, ".{0}.{1}.tmp".format(name, uuid.uuid4().hex[:8]))
+    try:
+        write(tmp)
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if(os.path.isfile(tmp)):
+            os.remove(tmp)
+        raise
+
+def _ascending(data):
+    """
+    Returns a list of the header row followed by the data rows sorted by timestamp.
+
+    """
+    data = iter(data)
+    header = next(data, None)
+    rows = sorted([ row for row in data if row], key = lambda row: row[0])
+    return [] if header == None else [header] + rows
+
+def _edge_lines(path, block_size = 4096):
+    """
+    Returns the first and the last data rows (after the header row) of an 
+    uncompressed text file, reading only the head and the tail. Empty strings are
+    returned if there are no data rows.
+
+    """
+    with open(path, "rb") as f:
+        head = [f.readline(), f.readline()]
+        if(not head[1].strip()):
+            return ["", ""]
+        size = f.seek(0, os.SEEK_END)
+        tail, position = b"", size
+        while position > 0:
+            position = max(0, position - block_size)
+            f.seek(position)
+            tail = f.read(size - position)
+            lines = [ line for line in tail.splitlines() if line.strip()]
+            if(len(lines) > 1 or position == 0):
+                break
+    return [ line.decode("utf-8") for line in (head[1], lines[-1])]
+
+def _update_csv(path, data, sep):
+    """
+    Add the rows of 'data' newer than the rows stored in 'path'.
+
+    """
+    file_format = path_format(path)
+    data = iter(data)
+    header = next(data, None)
+
+    if(file_format == "csv"):
+        first, last = [ next(csv.reader([line], delimiter = sep), None) or [""]
+            for line in _edge_lines(path)]
+    else:
+        stored = read_csv(path, sep)
+        first, last = (stored[1], stored[-1]) if len(stored) > 1 else ([""], [""])
+    latest = max(first[0], last[0])
+    ascending = last[0] >= first[0]
+
+    new_rows = [ row for row in data if row and row[0] > latest]
+    if(not new_rows):
+        return 0
+    if(latest == ""):
+        rows = _ascending([header] + new_rows)
+        _replace_file(path, lambda tmp: _write_rows(tmp, rows, sep, file_format))
+        return len(new_rows)
+    new_rows.sort(key = lambda row: row[0], reverse = not ascending)
+
+    if(file_format == "csv" and ascending):
+        size = os.path.getsize(path)
+        try:
+            with open(path, "rb") as f:
+                f.seek(max(0, size - 1))
+                newline = f.read(1) in (b"\n", b"")
+            with open(path, "a", newline = "") as text_file:
+                if(not newline):
+                    text_file.write("\r\n")
+                csv.writer(text_file, delimiter = sep).writerows(new_rows)
+        except BaseException:
+            # drop a partially appended tail
+            os.truncate(path, size)
+            raise
+        return len(new_rows)
+
+    if(file_format == "csv"):
+        def write(tmp):
+            # copy the stored rows as is, after the header and the new rows
+            with open(path, "rt", newline = "") as source, open(tmp, "wt", newline = "") as target:
+                target.write(source.readline())
+                csv.writer(target, delimiter = sep).writerows(new_rows)
+                for line in source:
+                    target.write(line)
+    else:
+        rows = stored + new_rows if ascending else stored[:1] + new_rows + stored[1:]
+        write = lambda tmp: _write_rows(tmp, rows, sep, file_format)
+    _replace_file(path, write)
+    return len(new_rows)
+
 def header_row(row):
     """
     Check if table row is a header row.
@@ -66,4 +213,27 @@ def header_row(row):
         except ValueError:
             return True
     return False
-    
\ No newline at end of file
+
+def count_bars(timestamp, now, av_fun, interval = None):
+    """
+    Estimate the number of bars between a stored timestamp and 'now'.
+
+    Weekends are skipped, holidays are not, so the estimate errs on the high side.
+
+    """
+    start = datetime.strptime(timestamp[:10], "%Y-%m-%d").date()
+    end = now.date()
+    days = (end - start).days
+
+    if(av_fun.startswith("TIME_SERIES_WEEKLY")):
+        return -(-days // 7)
+    if(av_fun.startswith("TIME_SERIES_MONTHLY")):
+        return (end.year - start.year) * 12 + end.month - start.month
+
+    weeks, rest = divmod(days, 7)
+    weekdays = weeks * 5 + sum(
+        [ (start + timedelta(days = i)).weekday() < 5 for i in range(1, rest + 1)])
+    if(av_fun == "TIME_SERIES_INTRADAY"):
+        # 390 trading minutes per session, including the stored day
+        return (weekdays + 1) * 390 // int(interval.replace("min", ""))
+    return weekdays
@@ -0,0 +1,152 @@
+import base64
+import socket
+import threading
+from time import perf_counter
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+from urllib.parse import urlsplit, unquote
+from urllib.request import getproxies, proxy_bypass
+
+class HTTPConnectionPool(object):
+    """
+    Thread-safe pool of persistent HTTP(S) connections to a single host.
+
+    Connections are opened lazily and kept alive between requests, so the TCP and
+    TLS handshakes are paid once per connection instead of once per request.
+
+    Proxies are taken from the environment like 'urllib.request.urlopen' does
+    ('HTTP_PROXY', 'HTTPS_PROXY' and 'NO_PROXY'): HTTPS requests are tunnelled
+    through the proxy with CONNECT, HTTP requests are sent to the proxy.
+
+    """
+    def __init__(self, base_url, pool_size = 1, timeout = 30):
+        url = urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.connection_class = HTTPSConnection if url.scheme == "https" else HTTPConnection
+        proxy = None if proxy_bypass(url.netloc) else getproxies().get(url.scheme)
+        if(proxy != None and "://" not in proxy):
+            proxy = "http://" + proxy
+        self.proxy = urlsplit(proxy) if proxy else None
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connections_opened = 0
+        self.__idle = []
+        self.__lock = threading.Lock()
+        self.__slots = threading.BoundedSemaphore(pool_size)
+
+    def __proxy_headers(self):
+        """
+        Basic authentication headers for the proxy credentials, if any.
+
+        """
+        if(self.proxy == None or self.proxy.username == None):
+            return {}
+        credentials = "{0}:{1}".format(
+            unquote(self.proxy.username), unquote(self.proxy.password or ""))
+        return {"Proxy-Authorization" : 
+            "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")}
+
+    def __connect(self):
+        with self.__lock:
+            self.connections_opened += 1
+        if(self.proxy == None):
+            return self.connection_class(self.host, self.port, timeout = self.timeout)
+        conn = self.connection_class(
+            self.proxy.hostname, self.proxy.port or 80, timeout = self.timeout)
+        if(self.scheme == "https"):
+            conn.set_tunnel(self.host, self.port, headers = self.__proxy_headers())
+        return conn
+
+    @staticmethod
+    def __open(conn, timings):
+        """
+        Open a connection, timing the DNS lookup and the TCP (and TLS) handshakes.
+
+        """
+        def create_connection(address, timeout, source_address = None):
+            start = perf_counter()
+            host, port = address
+            addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            timings["dns"] = perf_counter() - start
+            # try every address in turn, like 'socket.create_connection'
+            error = None
+            for family, type_, proto, name, sockaddr in addresses:
+                try:
+                    return socket.create_connection(sockaddr[:2], timeout, source_address)
+                except OSError as e:
+                    error = e
+            raise error
+
+        conn._create_connection = create_connection
+        start = perf_counter()
+        conn.connect()
+        timings["connect"] = perf_counter() - start - timings.get("dns", 0.0)
+
+    def __checkout(self):
+        with self.__lock:
+            if(self.__idle):
+                return self.__idle.pop(), True
+        return self.__connect(), False
+
+    def get(self, url, timings = None):
+        """
+        Make HTTP GET request.
+
+        If a dictionary is passed as 'timings', it is filled with the 'dns', 'connect'
+        (new connections only), 'ttfb' (time to first byte) and 'body' durations in
+        seconds.
+
+        Returns a tuple of status code and response body (bytes).
+
+        """
+        timings = {} if timings == None else timings
+        url = urlsplit(url)
+        path = "?".join([url.path or "/", url.query]) if url.query else url.path or "/"
+        headers = {}
+        if(self.proxy != None and self.scheme != "https"):
+            # plain HTTP proxies take the absolute URL
+            path = "{0}://{1}{2}".format(url.scheme, url.netloc, path)
+            headers = self.__proxy_headers()
+
+        with self.__slots:
+            conn, reused = self.__checkout()
+            while True:
+                try:
+                    if(conn.sock == None):
+                        self.__open(conn, timings)
+                    start = perf_counter()
+                    conn.request("GET", path, headers = headers)
+                    resp = conn.getresponse()
+                    timings["ttfb"] = perf_counter() - start
+                    start = perf_counter()
+                    body = resp.read()
+                    timings["body"] = perf_counter() - start
+                    break
+                except (RemoteDisconnected, ConnectionError):
+                    conn.close()
+                    if(not reused):
+                        raise
+                    # stale keep-alive connection, retry once on a fresh one
+                    conn, reused = self.__connect(), False
+                except BaseException:
+                    conn.close()
+                    raise
+
+            if(resp.will_close):
+                conn.close()
+            else:
+                with self.__lock:
+                    self.__idle.append(conn)
+
+        return resp.status, body
+
+    def close(self):
+        """
+        Close all idle connections.
+
+        """
+        with self.__lock:
+            for conn in self.__idle:
+                conn.close()
+            self.__idle = []
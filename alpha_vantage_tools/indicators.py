@@ -0,0 +1,250 @@
+import json
+from .columnar import import_numpy
+from .db_funcs import SQLiteDB, SQLiteConn
+
+# Supported indicators, specified as '<name>_<period>', eg. 'sma_20'.
+indicator_names = {"sma", "ema", "rsi", "atr"}
+
+def parse_indicator(spec):
+    """
+    Split an indicator spec, eg. 'rsi_14', into the name and period.
+
+    """
+    name, sep, period = spec.partition("_")
+    assert name in indicator_names and period.isdigit() and int(period) >= 2, \
+        "Invalid indicator '{0}'.".format(spec)
+    return name, int(period)
+
+def _recursive_mean(np, values, alpha, last):
+    """
+    Vectorised recursion y[t] = alpha * values[t] + (1 - alpha) * y[t - 1], with
+    y[-1] = last.
+
+    Uses the closed form y[t] = beta^(t + 1) * (last + sum(alpha * values[k] / beta^(k + 1)))
+    in blocks short enough to keep beta^-k below 1e8.
+
+    """
+    beta = 1 - alpha
+    size = max(1, int(np.log(1e8) / -np.log(beta)))
+    result = np.empty(len(values))
+    for start in range(0, len(values), size):
+        block = values[start:start + size]
+        powers = beta ** np.arange(1, len(block) + 1)
+        result[start:start + len(block)] = powers * (last + np.cumsum(alpha * block / powers))
+        last = result[start + len(block) - 1]
+    return result
+
+def _seeded_mean(np, values, period, alpha, state):
+    """
+    Exponential moving average seeded with the mean of the first 'period' values.
+
+    Returns the averages (NaN until seeded) and the new state.
+
+    """
+    state = state or {"count" : 0, "sum" : 0.0, "mean" : None}
+    count, total, mean = state["count"], state["sum"], state["mean"]
+    result = np.full(len(values), np.nan)
+    i = 0
+    if(mean == None):
+        i = min(len(values), period - count)
+        count += i
+        total += float(values[:i].sum())
+        if(count < period):
+            return result, {"count" : count, "sum" : total, "mean" : None}
+        mean = total / period
+        result[i - 1] = mean
+    if(i < len(values)):
+        result[i:] = _recursive_mean(np, values[i:], alpha, mean)
+        mean = float(result[-1])
+    return result, {"count" : count, "sum" : total, "mean" : mean}
+
+def _sma(np, close, period, state):
+    window = np.concatenate([(state or {}).get("window", []), close])
+    k = len(window) - len(close)
+    result = np.full(len(close), np.nan)
+    sums = np.cumsum(window)
+    sums[period:] = sums[period:] - sums[:-period]
+    start = max(period - 1, k)
+    result[start - k:] = sums[start:] / period
+    return result, {"window" : window[max(0, len(window) - period + 1):].tolist()}
+
+def _ema(np, close, period, state):
+    return _seeded_mean(np, close, period, 2 / (period + 1), state)
+
+def _rsi(np, close, period, state):
+    """
+    Wilder's relative strength index.
+
+    """
+    state = state or {"close" : None, "gain" : None, "loss" : None}
+    previous = [] if state["close"] == None else [state["close"]]
+    changes = np.diff(np.concatenate([previous, close]))
+    offset = len(close) - len(changes)
+    gain, gain_state = _seeded_mean(np, np.maximum(changes, 0), period, 1 / period, state["gain"])
+    loss, loss_state = _seeded_mean(np, np.maximum(-changes, 0), period, 1 / period, state["loss"])
+    result = np.full(len(close), np.nan)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        result[offset:] = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+    result[offset:][np.isnan(gain)] = np.nan
+    last = float(close[-1]) if len(close) else state["close"]
+    return result, {"close" : last, "gain" : gain_state, "loss" : loss_state}
+
+def _atr(np, high, low, close, period, state):
+    """
+    Wilder's average true range.
+
+    """
+    state = state or {"close" : None, "range" : None}
+    previous = np.concatenate([[np.nan if state["close"] == None else state["close"]], close[:-1]])
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+    result, range_state = _seeded_mean(np, true_range, period, 1 / period, state["range"])
+    last = float(close[-1]) if len(close) else state["close"]
+    return result, {"close" : last, "range" : range_state}
+
+def compute_indicators(indicators, high, low, close, state = None):
+    """
+    Compute indicators for new bars of a single time-series, continuing from 'state'.
+
+    Arguments:
+    indicators -- List of indicator specs, eg. ['sma_20', 'ema_20', 'rsi_14', 'atr_14'].
+    high, low, close -- Price sequences of the new bars, oldest first.
+    state -- Rolling state returned by the previous call. (default == None, first bars)
+
+    Values are NaN until an indicator has seen enough bars. EMA, RSI and ATR are
+    seeded with the simple mean of their first 'period' values, RSI and ATR use
+    Wilder's smoothing.
+
+    Returns a dictionary of value arrays keyed by spec and the new state, a
+    JSON-serialisable dictionary.
+
+    """
+    np = import_numpy()
+
+    high, low, close = [ np.asarray(values, dtype = "float64") for values in (high, low, close)]
+    state = state or {}
+    values, new_state = {}, {}
+    for spec in indicators:
+        name, period = parse_indicator(spec)
+        if(name == "atr"):
+            values[spec], new_state[spec] = _atr(np, high, low, close, period, state.get(spec))
+        else:
+            fun = {"sma" : _sma, "ema" : _ema, "rsi" : _rsi}[name]
+            values[spec], new_state[spec] = fun(np, close, period, state.get(spec))
+    return values, new_state
+
+class IndicatorStore(object):
+    """
+    Technical indicators materialised in a companion table of a SQLite 'stocks' table.
+
+    Indicator rows are keyed like the 'stocks' table on (timestamp, symbol,
+    timeseries_api, interval), with one column per indicator. The rolling state of
+    each series is kept in a '<table>_state' table, so an update only computes the
+    bars appended since the last update: O(new bars) instead of O(history).
+
+    """
+    def __init__(self, db, indicators = ("sma_20", "ema_20", "rsi_14", "atr_14"),
+        table = "indicators"):
+        """
+        Pass a SQLiteDB instance or a database path as 'db'. The indicator and state
+        tables are created if not found. An existing table must have the same
+        indicators.
+
+        """
+        self.db = db if isinstance(db, SQLiteDB) else SQLiteDB(db)
+        self.indicators = list(indicators)
+        for spec in self.indicators:
+            parse_indicator(spec)
+        self.table = table
+        self.state_table = table + "_state"
+        self.queries = SQLiteDB.defaults
+
+        self.db.execute_query(self.db.db, self.queries["create_indicators"].format(
+            table = table, columns = ", ".join([ spec + " real" for spec in self.indicators])))
+        self.db.execute_query(self.db.db,
+            self.queries["create_indicator_state"].format(table = self.state_table))
+        columns = [ row[1] for row in self.db.execute_query(
+            self.db.db, "PRAGMA table_info({0});".format(table), fetch = True)]
+        assert columns[4:] == self.indicators, \
+            "Table '{0}' stores the indicators {1}.".format(table, columns[4:])
+
+    def __states(self, av_fun, interval):
+        query = self.queries["select_indicator_state"].format(table = self.state_table)
+        result = self.db.execute_query(self.db.db, query, data = (av_fun, interval), fetch = True)
+        return { symbol : (timestamp, json.loads(state)) for symbol, timestamp, state in result or []}
+
+    def update(
+        self, av_fun = "TIME_SERIES_DAILY", interval = "daily", symbols = None, table = "stocks"):
+        """
+        Compute the indicators of the bars stored since the last update.
+
+        Arguments:
+        av_fun -- Alpha Vantage API function. (default == 'TIME_SERIES_DAILY')
+        interval -- Stored interval value, eg. 'daily' or '5min'. (default == 'daily')
+        symbols -- Ticker symbol or a list of symbols. (default == None, all symbols)
+        table -- Source SQLite table name. (default == 'stocks')
+
+        Each symbol is committed with its new state in a single transaction. Bars
+        inserted before the latest processed bar are not picked up.
+
+        Returns a dictionary of the number of new bars per symbol.
+
+        """
+        np = import_numpy()
+
+        states = self.__states(av_fun, interval)
+        latest = self.db.latest_timestamps(av_fun, interval, symbols, table)
+        insert = self.queries["insert_indicators"].format(table = self.table,
+            values = ", ".join(["?"] * (4 + len(self.indicators))),
+            update = ", ".join([ "{0} = excluded.{0}".format(spec) for spec in self.indicators]))
+        upsert_state = self.queries["upsert_indicator_state"].format(table = self.state_table)
+
+        result = {}
+        for symbol in sorted(latest):
+            last, state = states.get(symbol, (None, None))
+            if(last != None and latest[symbol] <= last):
+                result[symbol] = 0
+                continue
+            rows = [ row for row in self.db.query(symbol, last, None, av_fun, interval,
+                ["timestamp", "high", "low", "close"], table) if last == None or row[0] > last]
+            timestamps, high, low, close = zip(*rows)
+            values, state = compute_indicators(self.indicators, high, low, close, state)
+
+            columns = []
+            for spec in self.indicators:
+                column = values[spec].tolist()
+                for i in np.flatnonzero(np.isnan(values[spec])).tolist():
+                    column[i] = None
+                columns.append(column)
+            constant = (symbol, av_fun, interval)
+            with SQLiteConn(self.db.db) as conn:
+                conn.executemany(insert, [ (timestamp,) + constant + tuple(row)
+                    for timestamp, row in zip(timestamps, zip(*columns))])
+                conn.execute(upsert_state,
+                    (symbol, av_fun, interval, timestamps[-1], json.dumps(state)))
+            result[symbol] = len(rows)
+        return result
+
+    def query(self, symbols = None, av_fun = "TIME_SERIES_DAILY", interval = "daily", start = None):
+        """
+        Select indicator rows, sorted by symbol and timestamp.
+
+        Arguments:
+        symbols -- Ticker symbol or a list of symbols. (default == None, all symbols)
+        av_fun -- Alpha Vantage API function. (default == 'TIME_SERIES_DAILY')
+        interval -- Stored interval value. (default == 'daily')
+        start -- First timestamp (inclusive) as ISO string. (default == None)
+
+        Returns a list of (timestamp, symbol, timeseries_api, interval, *indicators) tuples.
+
+        """
+        conditions, params = ["timeseries_api = ?", "interval = ?"], [av_fun, interval]
+        if(symbols != None):
+            symbols = symbols if isinstance(symbols, list) else [symbols]
+            conditions.append("symbol IN ({0})".format(", ".join(["?"] * len(symbols))))
+            params.extend(symbols)
+        if(start != None):
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        query = self.queries["select"].format(columns = "*", table = self.table,
+            where = " WHERE " + " AND ".join(conditions))
+        return self.db.execute_query(self.db.db, query, data = params, fetch = True)
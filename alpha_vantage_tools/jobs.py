@@ -0,0 +1,72 @@
+from time import time
+from .db_funcs import SQLiteDB
+
+class JobJournal(object):
+    """
+    Persistent progress journal of batch download jobs.
+
+    Each (job, symbol) pair is stored in a SQLite table with a 'pending', 'completed'
+    or 'failed' status, the number of stored rows and the last error message. Every
+    status change is committed immediately, so a restarted job can skip the symbols
+    that are already done.
+
+    """
+    statuses = ("pending", "completed", "failed")
+
+    def __init__(self, db, table = "journal"):
+        """
+        Pass a SQLiteDB instance or a database path as 'db'. The journal table is
+        created if not found.
+
+        """
+        self.db = db if isinstance(db, SQLiteDB) else SQLiteDB(db)
+        self.table = table
+        self.queries = SQLiteDB.defaults
+        self.db.execute_query(self.db.db, self.queries["create_journal"].format(table = table))
+
+    def add(self, job, symbols):
+        """
+        Register symbols as 'pending'. Symbols already in the job are kept as is.
+
+        """
+        query = self.queries["journal_add"].format(table = self.table)
+        now = time()
+        self.db.with_open_db(self.db.db,
+            lambda conn: conn.executemany(query, [ (job, symbol, now) for symbol in symbols]))
+
+    def update(self, job, symbol, status, rows = None, error = None):
+        """
+        Set the status of a symbol, with the number of stored rows or an error message.
+
+        """
+        assert status in self.statuses, "Invalid argument 'status'."
+        query = self.queries["journal_update"].format(table = self.table)
+        self.db.execute_query(
+            self.db.db, query, data = (status, rows, error, time(), job, symbol))
+
+    def entries(self, job, status = None):
+        """
+        Returns a list of (symbol, status, rows, error) tuples in insertion order,
+        optionally only with the given status.
+
+        """
+        query = self.queries["journal_select"].format(table = self.table)
+        result = self.db.execute_query(self.db.db, query, data = (job,), fetch = True) or []
+        return [ entry for entry in result if status == None or entry[1] == status]
+
+    def symbols(self, job, status = "pending"):
+        """
+        Returns the list of symbols with the given status.
+
+        """
+        return [ entry[0] for entry in self.entries(job, status)]
+
+    def summary(self, job):
+        """
+        Returns a dictionary of the number of symbols per status.
+
+        """
+        result = { status : 0 for status in self.statuses}
+        for entry in self.entries(job):
+            result[entry[1]] += 1
+        return result
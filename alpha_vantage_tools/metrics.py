@@ -0,0 +1,156 @@
+import logging
+import threading
+
+class MetricsRegistry(object):
+    """
+    Thread-safe registry of counters and summaries with event hooks.
+
+    Counters accumulate a total, summaries accumulate the count, sum and maximum of
+    observed values (eg. durations in seconds). Metrics are keyed on a name and an
+    optional set of labels.
+
+    Hooks are callables 'hook(event, message, fields)' called on every emitted
+    event, eg. 'ConsoleSink' or 'LoggingSink'. 'message' is a human readable status
+    line or None.
+
+    """
+    def __init__(self, prefix = "alpha_vantage_"):
+        self.prefix = prefix
+        self.counters = {}
+        self.summaries = {}
+        self.hooks = []
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __key(name, labels):
+        return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+    def inc(self, name, value = 1, **labels):
+        """
+        Increment a counter.
+
+        """
+        key = self.__key(name, labels)
+        with self.__lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Record a value (eg. a duration in seconds) in a summary.
+
+        """
+        key = self.__key(name, labels)
+        with self.__lock:
+            summary = self.summaries.get(key)
+            if(summary == None):
+                summary = self.summaries[key] = {"count" : 0, "sum" : 0.0, "max" : value}
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def add_hook(self, hook):
+        """
+        Register an event hook. Returns the hook.
+
+        """
+        with self.__lock:
+            self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        with self.__lock:
+            self.hooks.remove(hook)
+
+    def emit(self, event, message = None, **fields):
+        """
+        Pass an event to the registered hooks.
+
+        """
+        for hook in list(self.hooks):
+            hook(event, message, fields)
+
+    def snapshot(self):
+        """
+        Returns a dictionary of counters and summaries keyed on (name, labels).
+
+        """
+        with self.__lock:
+            return {
+                    "counters" : dict(self.counters),
+                    "summaries" : { key : dict(value) for key, value in self.summaries.items()}
+                    }
+
+    def reset(self):
+        """
+        Delete all recorded metrics. Hooks are kept.
+
+        """
+        with self.__lock:
+            self.counters = {}
+            self.summaries = {}
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+
+        """
+        def labels_str(labels):
+            if(not labels):
+                return ""
+            return "{" + ",".join([ '{0}="{1}"'.format(key, value.replace("\\", "\\\\")\
+                .replace('"', '\\"')) for key, value in labels]) + "}"
+
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted(set(name for name, labels in snapshot["counters"])):
+            lines.append("# TYPE {0}{1} counter".format(self.prefix, name))
+            for (key, labels), value in sorted(snapshot["counters"].items()):
+                if(key == name):
+                    lines.append("{0}{1}{2} {3}".format(self.prefix, name, labels_str(labels), value))
+        for name in sorted(set(name for name, labels in snapshot["summaries"])):
+            lines.append("# TYPE {0}{1} summary".format(self.prefix, name))
+            for (key, labels), value in sorted(snapshot["summaries"].items()):
+                if(key == name):
+                    for stat in ("count", "sum"):
+                        lines.append("{0}{1}_{2}{3} {4}".format(
+                            self.prefix, name, stat, labels_str(labels), value[stat]))
+        return "\n".join(lines) + "\n"
+
+class ConsoleSink(object):
+    """
+    Print event messages to the standard output.
+
+    Messages ending with a carriage return (progress lines) are printed in place.
+
+    """
+    def __call__(self, event, message, fields):
+        if(message == None):
+            return
+        if(message.endswith("\r")):
+            print(message, end = "")
+        else:
+            print(message)
+
+class LoggingSink(object):
+    """
+    Log every event as a structured record.
+
+    Records are logged to 'logger' (default == 'alpha_vantage_tools') with the
+    event name and fields as 'record.event' and 'record.fields'.
+
+    """
+    def __init__(self, logger = None, level = logging.INFO):
+        self.logger = logger or logging.getLogger("alpha_vantage_tools")
+        self.level = level
+
+    def __call__(self, event, message, fields):
+        text = " ".join([event] + [ "{0}={1}".format(key, value)
+            for key, value in sorted(fields.items())])
+        level = logging.WARNING if fields.get("error") != None else self.level
+        self.logger.log(level, text, extra = {"event" : event, "fields" : fields})
+
+# Default registry used when no registry is passed. Status messages are printed
+# by default: replace the console sink with a LoggingSink for structured logs.
+console = ConsoleSink()
+registry = MetricsRegistry()
+registry.add_hook(console)
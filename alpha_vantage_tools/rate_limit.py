@@ -0,0 +1,309 @@
+import threading
+from time import monotonic, sleep
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket.
+
+    Tokens are refilled continuously at 'rate' tokens per second up to 'capacity'.
+    The rate can be slowed down ('throttle') and restored up to 'max_rate', the
+    initial rate ('recover').
+
+    """
+    def __init__(self, rate, capacity):
+        assert rate > 0 and capacity > 0, "Invalid token bucket parameters."
+        self.rate = rate
+        self.max_rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.timestamp = monotonic()
+        self.throttled_at = None
+        self.__lock = threading.Lock()
+
+    def __refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def reserve(self, n = 1):
+        """
+        Take n tokens, borrowing from the future if the bucket is empty.
+
+        Returns the number of seconds the caller has to wait before proceeding.
+
+        """
+        with self.__lock:
+            self.__refill()
+            self.tokens -= n
+            return max(0, -self.tokens / self.rate)
+
+    def wait_time(self, n = 1):
+        """
+        Returns the number of seconds until n tokens are available, without taking them.
+
+        """
+        with self.__lock:
+            self.__refill()
+            return max(0, (n - self.tokens) / self.rate)
+
+    def try_acquire(self, n = 1):
+        """
+        Take n tokens only if available right now. Returns True on success.
+
+        """
+        with self.__lock:
+            self.__refill()
+            if(self.tokens < n):
+                return False
+            self.tokens -= n
+            return True
+
+    def acquire(self, n = 1):
+        """
+        Block until n tokens are available. Returns the time waited in seconds.
+
+        """
+        wait = self.reserve(n)
+        if(wait > 0):
+            sleep(wait)
+        return wait
+
+    def cooling_down(self, cooldown):
+        """
+        Returns True within 'cooldown' seconds of the last slowdown.
+
+        """
+        return self.throttled_at != None and monotonic() - self.throttled_at < cooldown
+
+    def throttle(self, factor = 0.5, min_rate = None, cooldown = 0):
+        """
+        Empty the bucket and multiply the refill rate by 'factor', down to 'min_rate'.
+
+        The rate is slowed down once per 'cooldown' seconds: calls within 'cooldown'
+        seconds of the last slowdown only empty the bucket.
+
+        Returns the new rate in tokens per second.
+
+        """
+        with self.__lock:
+            self.__refill()
+            self.tokens = min(self.tokens, 0)
+            if(not self.cooling_down(cooldown)):
+                self.rate = max(min_rate or 0, self.rate * factor)
+                self.throttled_at = self.timestamp
+            return self.rate
+
+    def recover(self, factor = 1.25, cooldown = 0):
+        """
+        Multiply the refill rate by 'factor', up to 'max_rate'. The rate is left
+        unchanged within 'cooldown' seconds of the last slowdown.
+
+        Returns the new rate in tokens per second.
+
+        """
+        with self.__lock:
+            if(self.rate < self.max_rate and not self.cooling_down(cooldown)):
+                self.__refill()
+                self.rate = min(self.max_rate, self.rate * factor)
+            return self.rate
+
+class RateLimiter(object):
+    """
+    Requests-per-minute and requests-per-day budget for API calls.
+
+    Throttled responses slow down the per-minute rate at most once per 'cooldown'
+    seconds, so requests throttled together count once. Good responses after the
+    cooldown restore the rate step by step.
+
+    """
+    def __init__(self, requests_per_minute = 5, requests_per_day = 500, cooldown = 60):
+        self.minute = TokenBucket(requests_per_minute / 60, requests_per_minute)
+        self.day = TokenBucket(requests_per_day / 86400, requests_per_day) \
+            if requests_per_day else None
+        self.cooldown = cooldown
+
+    def reserve(self):
+        """
+        Reserve a request slot without blocking.
+
+        Returns the number of seconds to wait before the request or None if the
+        daily budget is spent.
+
+        """
+        if(self.day != None and not self.day.try_acquire()):
+            return None
+        return self.minute.reserve()
+
+    def wait_time(self):
+        """
+        Returns the number of seconds until a request slot is free, without taking it,
+        or None if the daily budget is spent.
+
+        """
+        if(self.day != None and self.day.wait_time() > 0):
+            return None
+        return self.minute.wait_time()
+
+    def throttle(self, factor = 0.5):
+        """
+        Slow down after a throttled response.
+
+        The per-minute budget is emptied and its rate multiplied by 'factor', down to
+        one request per minute, unless it was slowed down within 'self.cooldown' seconds.
+
+        Returns the new rate in requests per minute.
+
+        """
+        return self.minute.throttle(factor, 1 / 60, self.cooldown) * 60
+
+    def recover(self, factor = 1.25):
+        """
+        Speed up after a good response.
+
+        The per-minute rate is multiplied by 'factor', up to 'requests_per_minute',
+        unless it was slowed down within 'self.cooldown' seconds.
+
+        Returns the new rate in requests per minute.
+
+        """
+        return self.minute.recover(factor, self.cooldown) * 60
+
+    def cooling_down(self):
+        """
+        Returns True within 'self.cooldown' seconds of the last slowdown.
+
+        """
+        return self.minute.cooling_down(self.cooldown)
+
+    def acquire(self):
+        """
+        Wait for a free request slot.
+
+        Returns the time waited in seconds or None if the daily budget is spent.
+
+        """
+        wait = self.reserve()
+        if(wait != None and wait > 0):
+            sleep(wait)
+        return wait
+
+class KeyPool(object):
+    """
+    Pool of API keys, each with its own RateLimiter (per-minute and per-day budgets).
+
+    Requests go to the key with the earliest free request slot, so symbols are
+    sharded across the keys and the request rate grows with the number of keys.
+    Keys are evicted after an invalid-key response or after 'max_strikes' throttled
+    responses in a row, except for the last key left after throttling. Responses
+    throttled within 'cooldown' seconds of each other count as one strike, see
+    'help(RateLimiter)'.
+
+    """
+    def __init__(
+        self, keys, requests_per_minute = 5, requests_per_day = 500, max_strikes = 3, 
+        cooldown = 60):
+        keys = list(dict.fromkeys(keys))
+        assert keys, "No API keys given."
+        self.keys = keys
+        self.limiters = { key : RateLimiter(requests_per_minute, requests_per_day, cooldown) 
+            for key in keys}
+        self.active = list(keys)
+        self.evicted = {}
+        self.max_strikes = max_strikes
+        self.__strikes = { key : 0 for key in keys}
+        self.__next = 0
+        self.__lock = threading.Lock()
+
+    def next_key(self):
+        """
+        Returns the next active key in round-robin order, without rate limiting, or
+        None if all keys are evicted.
+
+        """
+        with self.__lock:
+            if(not self.active):
+                return None
+            key = self.active[self.__next % len(self.active)]
+            self.__next = (self.__next + 1) % len(self.active)
+            return key
+
+    def reserve(self):
+        """
+        Reserve a request slot on the key that is free the soonest.
+
+        Returns a tuple of the key and the number of seconds to wait before the
+        request, or (None, None) if every key is evicted or out of its daily budget.
+
+        """
+        with self.__lock:
+            n = len(self.active)
+            waits = []
+            for i in range(n):
+                # rotate the starting key so ties are shared out evenly
+                key = self.active[(self.__next + i) % n]
+                wait = self.limiters[key].wait_time()
+                if(wait != None):
+                    waits.append((wait, i, key))
+            if(not waits):
+                return None, None
+            wait, i, key = min(waits)
+            self.__next = (self.active.index(key) + 1) % n
+            return key, self.limiters[key].reserve()
+
+    def acquire(self):
+        """
+        Wait for a free request slot on any key.
+
+        Returns a tuple of the key and the time waited in seconds, or (None, None) if 
+        no key is usable.
+
+        """
+        key, wait = self.reserve()
+        if(wait != None and wait > 0):
+            sleep(wait)
+        return key, wait
+
+    def success(self, key):
+        """
+        Reset the throttling strikes of a key and restore its rate step by step after
+        a good response.
+
+        Returns the rate of the key in requests per minute.
+
+        """
+        with self.__lock:
+            self.__strikes[key] = 0
+        return self.limiters[key].recover()
+
+    def throttled(self, key):
+        """
+        Slow down a throttled key and evict it after 'max_strikes' throttled responses 
+        in a row.
+
+        Returns a tuple of the new rate of the key in requests per minute and whether
+        the key was evicted by this call.
+
+        """
+        with self.__lock:
+            # concurrent requests throttled together count as one strike
+            if(not self.limiters[key].cooling_down()):
+                self.__strikes[key] += 1
+            rate = self.limiters[key].throttle()
+            evict = self.__strikes[key] >= self.max_strikes and len(self.active) > 1
+        return rate, evict and self.evict(key, "throttled")
+
+    def evict(self, key, reason):
+        """
+        Stop using a key.
+
+        Returns True if the key was evicted by this call, False if it was already
+        evicted (eg. by a concurrent request).
+
+        """
+        with self.__lock:
+            if(key not in self.active):
+                return False
+            self.active.remove(key)
+            self.evicted[key] = reason
+            self.__next = 0
+            return True
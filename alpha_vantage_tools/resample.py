@@ -0,0 +1,247 @@
+from datetime import datetime, timedelta
+from .config import api_parameters
+from .columnar import import_numpy, rows_to_array, column_names
+from .db_funcs import SQLiteDB
+
+# 'stocks' table columns following the constant columns, in table order.
+value_columns = ["open", "high", "low", "close", "adjusted_close", "volume",
+                 "dividend_amount", "split_coeff"]
+
+def intraday_minutes(interval):
+    """
+    Returns the length of an intraday interval (eg. '5min') in minutes or None.
+
+    """
+    if(interval in api_parameters()["interval"]):
+        return int(interval.replace("min", ""))
+    return None
+
+def resampled_api(timeseries_api, interval):
+    """
+    Returns the timeseries_api value of bars resampled to 'interval'.
+
+    Eg. 'TIME_SERIES_DAILY_ADJUSTED' resampled to 'weekly' is tagged as
+    'TIME_SERIES_WEEKLY_ADJUSTED'.
+
+    """
+    if(intraday_minutes(interval) != None):
+        return "TIME_SERIES_INTRADAY"
+    suffix = "_ADJUSTED" if timeseries_api.endswith("_ADJUSTED") else ""
+    return "TIME_SERIES_" + interval.upper() + suffix
+
+def _check_intervals(source, interval):
+    """
+    Assert that bars of the 'source' interval can be resampled to 'interval'.
+
+    """
+    params = api_parameters()
+    order = ["daily", "weekly", "monthly"]
+    assert interval in params["interval"] | params["interval_overnight"], \
+        "Invalid argument 'interval'."
+    if(source == None):
+        return
+
+    minutes, source_minutes = intraday_minutes(interval), intraday_minutes(source)
+    if(minutes != None):
+        assert source_minutes != None and minutes > source_minutes and \
+            minutes % source_minutes == 0, "Cannot resample '{0}' bars to '{1}'."\
+            .format(source, interval)
+    elif(source_minutes == None):
+        assert order.index(interval) > order.index(source), \
+            "Cannot resample '{0}' bars to '{1}'.".format(source, interval)
+
+def _bucket_keys(np, timestamps, interval):
+    """
+    Returns an integer bucket key per timestamp (datetime64[s], ascending).
+
+    """
+    minutes = intraday_minutes(interval)
+    if(minutes != None):
+        # intraday bars are labelled with the end of the bar
+        step = minutes * 60
+        return -(-timestamps.astype("int64") // step)
+    days = timestamps.astype("datetime64[D]").astype("int64")
+    if(interval == "daily"):
+        return days
+    if(interval == "weekly"):
+        # 1970-01-01 was a Thursday, weeks start on Monday
+        return (days + 3) // 7
+    return timestamps.astype("datetime64[M]").astype("int64")
+
+def resample_array(array, interval):
+    """
+    Aggregate bars into coarser bars.
+
+    Pass a structured array of a single time-series (see 'columnar.rows_to_array'),
+    eg. 5min bars resampled to '15min', '30min' or '60min', or daily bars resampled to
+    'weekly' or 'monthly'. Intraday bars are labelled with the end of the bar on a
+    grid aligned to midnight, daily, weekly and monthly bars with the date of their
+    last source bar. The last bar is partial until its period has ended.
+
+    Open is the first value, high the maximum, low the minimum, close and adjusted
+    close the last value, volume and dividend amount the sum and split coefficient
+    the product of the source bars. Missing (NaN) values are skipped.
+
+    Returns a structured array with the same columns as 'array'.
+
+    """
+    np = import_numpy()
+    _check_intervals(None, interval)
+
+    if(len(array) == 0):
+        return array.copy()
+    array = array[np.argsort(array["timestamp"], kind = "stable")]
+    timestamps = array["timestamp"].astype("datetime64[s]")
+    keys = _bucket_keys(np, timestamps, interval)
+
+    starts = np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+    ends = np.concatenate([starts[1:], [len(array)]]) - 1
+
+    result = np.empty(len(starts), dtype = array.dtype)
+    for col in array.dtype.names:
+        values = array[col]
+        if(col == "timestamp"):
+            minutes = intraday_minutes(interval)
+            result[col] = (keys[starts] * minutes * 60).astype("datetime64[s]") \
+                if minutes != None else timestamps[ends].astype("datetime64[D]")
+        elif(col == "open"):
+            result[col] = values[starts]
+        elif(col == "high"):
+            result[col] = np.fmax.reduceat(values, starts)
+        elif(col == "low"):
+            result[col] = np.fmin.reduceat(values, starts)
+        elif(col in ("volume", "dividend_amount")):
+            result[col] = np.add.reduceat(np.nan_to_num(values), starts)
+        elif(col == "split_coeff"):
+            result[col] = np.multiply.reduceat(np.where(np.isnan(values), 1, values), starts)
+        else:
+            result[col] = values[ends]
+    # all-missing columns (eg. unadjusted data) stay missing
+    for col in ("dividend_amount", "split_coeff"):
+        if(col in result.dtype.names and np.isnan(array[col]).all()):
+            result[col] = np.nan
+    return result
+
+def array_to_rows(array, symbol, timeseries_api, interval):
+    """
+    Convert a structured array of bars into 'stocks' table rows.
+
+    Columns missing from 'array' and NaN values are stored as None.
+
+    Returns a list of rows.
+
+    """
+    np = import_numpy()
+
+    unit = "s" if intraday_minutes(interval) != None else "D"
+    columns = [ np.char.replace(np.datetime_as_string(array["timestamp"], unit = unit), "T", " ")
+        .tolist()]
+    for col in value_columns:
+        if(col not in array.dtype.names):
+            columns.append([None] * len(array))
+            continue
+        values = array[col]
+        missing = np.isnan(values) if values.dtype.kind == "f" else np.zeros(len(values), bool)
+        values = values.tolist()
+        for i in np.flatnonzero(missing).tolist():
+            values[i] = None
+        columns.append(values)
+
+    constant = [symbol, timeseries_api, interval]
+    return [ [row[0]] + constant + list(row[1:]) for row in zip(*columns)]
+
+def resample_rows(rows, interval):
+    """
+    Resample formatted rows of a single time-series into coarser bars.
+
+    Pass the rows returned by 'LoadAlphaVantage.alpha_vantage' (header row first).
+    The bars are tagged with the resampled timeseries_api and 'interval' values, see
+    'help(resample_array)'.
+
+    Returns a list of 'stocks' table rows, header row first.
+
+    """
+    rows = list(rows)
+    header = [ column_names.get(col, col) for col in rows[0]] if rows else []
+    data = [ row for row in rows[1:] if row != [] and row != [""]]
+    result = [header[:4] + value_columns]
+    if(not data):
+        return result
+
+    symbol, timeseries_api, source = [ data[0][header.index(col)]
+        for col in ("symbol", "timeseries_api", "interval")]
+    _check_intervals(source, interval)
+    bars = resample_array(rows_to_array([header] + data), interval)
+    return result + array_to_rows(bars, symbol, resampled_api(timeseries_api, interval), interval)
+
+def _window_start(latest, interval):
+    """
+    First source timestamp of the bucket of the latest stored resampled bar.
+
+    """
+    if(latest == None):
+        return None
+    minutes = intraday_minutes(interval)
+    if(minutes != None):
+        start = datetime.strptime(latest, "%Y-%m-%d %H:%M:%S") - timedelta(minutes = minutes)
+        return (start + timedelta(seconds = 1)).strftime("%Y-%m-%d %H:%M:%S")
+    if(interval == "weekly"):
+        start = datetime.strptime(latest[:10], "%Y-%m-%d") - timedelta(days = 6)
+        return start.strftime("%Y-%m-%d")
+    if(interval == "monthly"):
+        return latest[:8] + "01"
+    return latest[:10]
+
+def resample_db(
+    db, interval, av_fun = "TIME_SERIES_DAILY", source_interval = "daily", symbols = None,
+    table = "stocks", batch_size = 1000, verbose = True):
+    """
+    Derive coarser bars from stored bars and write them back to the same table.
+
+    Only the finest granularity has to be downloaded: eg. weekly and monthly bars
+    are built from the stored daily bars instead of separate API calls. Resampling
+    is incremental: the latest stored resampled bar of each symbol, which may have
+    been partial, is deleted and rebuilt with the bars after it.
+
+    Arguments:
+    db -- SQLiteDB instance or database path.
+    interval -- Target interval, eg. '15min', 'weekly' or 'monthly'.
+    av_fun -- Alpha Vantage API function of the source bars. (default == 'TIME_SERIES_DAILY')
+    source_interval -- Stored interval of the source bars, eg. '5min'. (default == 'daily')
+    symbols -- Ticker symbol or a list of symbols. (default == None, all symbols)
+    table -- SQLite table name. (default == 'stocks')
+    batch_size -- Number of rows per transaction. (default == 1000)
+    verbose -- Print insertion statistics. (default == True)
+
+    Returns a dictionary of inserted, updated and skipped row counts.
+
+    """
+    np = import_numpy()
+    _check_intervals(source_interval, interval)
+
+    db = db if isinstance(db, SQLiteDB) else SQLiteDB(db, create = False)
+    target_api = resampled_api(av_fun, interval)
+    stored = db.latest_timestamps(av_fun, source_interval, symbols, table)
+    latest = db.latest_timestamps(target_api, interval, symbols, table)
+
+    # the latest bar is relabelled when its period gets new source bars, bars of
+    # symbols without source bars (eg. downloaded from the API) are kept
+    query = db.defaults["delete_from"].format(table = table)
+    db.with_open_db(db.db, lambda conn: conn.executemany(query, [ 
+        (symbol, target_api, interval, latest[symbol]) 
+        for symbol in sorted(latest.keys() & stored.keys())]))
+
+    def rows():
+        for symbol in sorted(stored):
+            data = db.query(symbol, _window_start(latest.get(symbol), interval), None, av_fun,
+                source_interval, table = table, as_array = True).get(symbol)
+            if(data is None):
+                continue
+            bars = resample_array(data, interval)
+            if(symbol in latest):
+                # the first bucket of the window may be partial
+                bars = bars[bars["timestamp"] >= np.datetime64(latest[symbol])]
+            yield from array_to_rows(bars, symbol, target_api, interval)
+
+    return db.insert_many(rows(), table, batch_size = batch_size, conflict = "update",
+        verbose = verbose)
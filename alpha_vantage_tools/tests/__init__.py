@@ -3,4 +3,4 @@ Unit tests for the 'av_funcs' and 'db_funcs' modules'.
 
 """
 
-from . import test_av_funcs, test_db_funcs
\ No newline at end of file
+from . import test_av_funcs, test_db_funcs, test_rate_limit, test_async_funcs, test_http_pool, test_cache, test_columnar, test_bar_store, test_benchmarks, test_metrics, test_jobs, test_resample, test_indicators, test_formats
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the download, parse and ingest paths of 'alpha_vantage_tools'.
+
+Run 'python -m alpha_vantage_tools.tests.benchmarks.run --output results.json'.
+
+"""
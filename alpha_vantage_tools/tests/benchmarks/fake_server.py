@@ -0,0 +1,88 @@
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+def synthetic_csv(av_fun = "TIME_SERIES_DAILY", n = 100, interval = None):
+    """
+    Returns a synthetic Alpha Vantage csv response (bytes), newest row first.
+
+    """
+    adjusted = av_fun.endswith("ADJUSTED")
+    header = "timestamp,open,high,low,close,volume"
+    if(adjusted):
+        header = "timestamp,open,high,low,close,adjusted_close,volume,dividend_amount,split_coefficient"
+
+    if(av_fun == "TIME_SERIES_INTRADAY"):
+        step, fmt = timedelta(minutes = int(interval.replace("min", ""))), "%Y-%m-%d %H:%M:%S"
+    elif("WEEKLY" in av_fun):
+        step, fmt = timedelta(days = 7), "%Y-%m-%d"
+    elif("MONTHLY" in av_fun):
+        step, fmt = timedelta(days = 30), "%Y-%m-%d"
+    else:
+        step, fmt = timedelta(days = 1), "%Y-%m-%d"
+
+    end = datetime(2019, 12, 31, 16)
+    lines = [header]
+    for i in range(n):
+        price = 100 + (i % 50) * 0.25
+        values = [(end - i * step).strftime(fmt), price, price + 1, price - 1, price + 0.5]
+        if(adjusted):
+            values += [price + 0.4, 1000 + i, 0.0, 1.0]
+        else:
+            values += [1000 + i]
+        lines.append(",".join(map(str, values)))
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+class FakeAlphaVantageHandler(BaseHTTPRequestHandler):
+    """
+    Serves synthetic csv responses for 'compact' and 'full' output sizes.
+
+    """
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, avoid delayed ACK stalls
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        params = { key : values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        av_fun = params.get("function", "TIME_SERIES_DAILY")
+        interval = params.get("interval")
+        n = 100 if params.get("outputsize") == "compact" else self.server.full_size[
+            "intraday" if av_fun == "TIME_SERIES_INTRADAY" else "daily"]
+
+        key = (av_fun, n, interval)
+        body = self.server.bodies.get(key)
+        if(body == None):
+            body = self.server.bodies[key] = synthetic_csv(av_fun, n, interval)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-download")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class FakeAlphaVantageServer(object):
+    """
+    Local stand-in for the Alpha Vantage API running in a background thread.
+
+    Use as a context manager. 'base_url' points to the running server.
+
+    """
+    def __init__(self, daily_full_size = 5000, intraday_full_size = 20000):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAlphaVantageHandler)
+        self.server.daemon_threads = True
+        self.server.bodies = {}
+        self.server.full_size = {"daily" : daily_full_size, "intraday" : intraday_full_size}
+        self.base_url = "http://127.0.0.1:{0}/query?".format(self.server.server_port)
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,154 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+from time import perf_counter
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from alpha_vantage_tools.db_funcs import SQLiteDB
+from .fake_server import FakeAlphaVantageServer, synthetic_csv
+
+def loader(base_url, **kwargs):
+    """
+    Returns a LoadAlphaVantage instance pointed to the fake server.
+
+    """
+    fake_class = type("FakeLoadAlphaVantage", (LoadAlphaVantage,), {"base_url" : base_url})
+    return fake_class(api_key = "benchmark", requests_per_day = 0, **kwargs)
+
+def measure(fun, repeat = 3):
+    """
+    Returns the best wall-clock time of 'repeat' calls in seconds and the last result.
+
+    """
+    best, result = None, None
+    for i in range(repeat):
+        start = perf_counter()
+        with redirect_stdout(io.StringIO()):
+            result = fun()
+        duration = perf_counter() - start
+        best = duration if best == None else min(best, duration)
+    return best, result
+
+def record(results, name, size, seconds, rows):
+    results.append({
+        "name" : name, "size" : size, "seconds" : round(seconds, 6), "rows" : rows,
+        "rows_per_second" : round(rows / seconds, 1) if seconds > 0 else None})
+
+def bench_parse(results, server, repeat):
+    av = loader(server.base_url)
+    cases = [
+            ("compact", "TIME_SERIES_DAILY", "compact", None),
+            ("full", "TIME_SERIES_DAILY_ADJUSTED", "full", None),
+            ("intraday_full", "TIME_SERIES_INTRADAY", "full", "1min")
+            ]
+    for case, av_fun, output, interval in cases:
+        seconds, data = measure(
+            lambda: av.alpha_vantage("KO", av_fun, output, interval), repeat)
+        record(results, "alpha_vantage_parse_" + case, len(data) - 1, seconds, len(data) - 1)
+    av.close()
+
+def bench_parse_body(results, repeat, n):
+    """
+    Parse an n-row intraday response body without HTTP, into rows and typed arrays.
+
+    """
+    body = synthetic_csv("TIME_SERIES_INTRADAY", n, "1min")
+    av = LoadAlphaVantage(api_key = "benchmark")
+    seconds, rows = measure(lambda: list(av._format_response(
+        av._parse_response("KO", body), "KO", "TIME_SERIES_INTRADAY", "1min")), repeat)
+    record(results, "parse_body_rows", n, seconds, len(rows) - 1)
+    try:
+        seconds, array = measure(
+            lambda: av._body_to_array("KO", body, "TIME_SERIES_INTRADAY"), repeat)
+        record(results, "parse_body_array", n, seconds, len(array))
+    except ImportError:
+        pass
+    av.close()
+
+def bench_load_symbols(results, server, repeat, n_symbols):
+    symbols = [ "SYM{0}".format(i) for i in range(n_symbols)]
+    for workers in (1, 4):
+        av = loader(server.base_url, workers = workers)
+        seconds, data = measure(
+            lambda: av.load_symbols(symbols, request_limit = False), repeat)
+        record(results, "load_symbols_workers_{0}".format(workers), n_symbols, seconds,
+            sum([ len(rows) - 1 for rows in data.values()]))
+        av.close()
+
+def bench_db(results, directory, repeat, sizes):
+    for n in sizes:
+        rows = [ ["2019-01-01 {0:02d}:{1:02d}:{2:02d}".format(i // 3600 % 24, i // 60 % 60, i % 60),
+            "SYM{0}".format(i // 86400), "TIME_SERIES_INTRADAY", "1min",
+            1.0, 2.0, 0.5, 1.5, 100 + i] for i in range(n)]
+
+        def insert():
+            path = os.path.join(directory, "bench_{0}.db".format(n))
+            if(os.path.isfile(path)):
+                os.remove(path)
+            db = SQLiteDB(path)
+            db.insert_many(rows, batch_size = 10000, verbose = False)
+            return db
+
+        seconds, db = measure(insert, repeat)
+        record(results, "sqlite_insert_many", n, seconds, n)
+
+        seconds, data = measure(lambda: db.query(["SYM0"]), repeat)
+        record(results, "sqlite_query", n, seconds, len(data))
+
+        seconds, n_rows = measure(
+            lambda: sum([ len(chunk) for symbol, chunk in db.iter_query(chunk_size = 10000)]),
+            repeat)
+        record(results, "sqlite_iter_query", n, seconds, n_rows)
+
+def run(quick = False, repeat = 3):
+    """
+    Run all benchmarks.
+
+    Returns a dictionary of environment information and a list of results.
+
+    """
+    results = []
+    daily_size, intraday_size = (500, 2000) if quick else (5000, 20000)
+    n_symbols = 5 if quick else 50
+    db_sizes = [1000] if quick else [1000, 10000, 100000]
+    parse_size = 10000 if quick else 100000
+
+    with FakeAlphaVantageServer(daily_size, intraday_size) as server:
+        bench_parse(results, server, repeat)
+        bench_load_symbols(results, server, repeat, n_symbols)
+    bench_parse_body(results, repeat, parse_size)
+    with tempfile.TemporaryDirectory() as directory:
+        bench_db(results, directory, repeat, db_sizes)
+
+    return {
+            "created" : datetime.now().isoformat(timespec = "seconds"),
+            "python" : platform.python_version(),
+            "sqlite" : sqlite3.sqlite_version,
+            "platform" : platform.platform(),
+            "quick" : quick,
+            "results" : results
+            }
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Benchmark alpha_vantage_tools.")
+    parser.add_argument("--output", help = "Write results as JSON to this path.")
+    parser.add_argument("--quick", action = "store_true", help = "Use small data sizes.")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Repeats per benchmark.")
+    args = parser.parse_args(args)
+
+    report = run(args.quick, args.repeat)
+    for result in report["results"]:
+        print("{name:<32} {size!s:>8} {seconds:>10.4f}s {rows_per_second!s:>12} rows/s"\
+            .format(**result))
+    if(args.output):
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
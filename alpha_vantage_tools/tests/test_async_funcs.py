@@ -0,0 +1,98 @@
+import unittest
+import asyncio
+import threading
+from unittest.mock import patch
+from alpha_vantage_tools.async_funcs import AsyncLoadAlphaVantage
+from .helpers import basic_test_data
+
+test_data = basic_test_data()
+
+def csv_body():
+    rows = [["timestamp", "open", "high", "low", "close", "volume"]] + test_data["test_data"]
+    return "".join([",".join(row) + "\r\n" for row in rows]).encode("utf-8")
+
+async def start_server(counter):
+    """
+    Local stand-in for the Alpha Vantage API counting new connections.
+
+    """
+    body = csv_body()
+
+    async def handle(reader, writer):
+        counter["connections"] += 1
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                counter["requests"] += 1
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/csv\r\n")
+                writer.write("Content-Length: {0}\r\n\r\n".format(len(body)).encode("ascii"))
+                writer.write(body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+class TestAsyncLoadAlphaVantage(unittest.TestCase):
+    def run_client(self, fun, workers = 1):
+        counter = {"connections" : 0, "requests" : 0}
+
+        async def main():
+            server, port = await start_server(counter)
+            base_url = "http://127.0.0.1:{0}/query?".format(port)
+            try:
+                with patch.object(AsyncLoadAlphaVantage, "base_url", base_url):
+                    av = AsyncLoadAlphaVantage(requests_per_minute = 600, workers = workers)
+                async with av:
+                    return await fun(av)
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        return asyncio.run(main()), counter
+
+    def test_alpha_vantage_parses_response(self):
+        result, counter = self.run_client(lambda av: av.alpha_vantage("AAPL"))
+        self.assertEqual(result[0][:4], ["timestamp", "symbol", "timeseries_api", "interval"])
+        self.assertEqual(result[1][:4], ["2018-01-04", "AAPL", "TIME_SERIES_DAILY", "daily"])
+        self.assertEqual(len(result), 4)
+
+    def test_load_symbols_reuses_connection(self):
+        result, counter = self.run_client(
+            lambda av: av.load_symbols(test_data["symbols"]))
+        self.assertEqual(set(result.keys()), set(test_data["symbols"]))
+        self.assertEqual(counter["requests"], len(test_data["symbols"]))
+        self.assertEqual(counter["connections"], 1)
+
+    def test_stream_symbols(self):
+        async def consume(av):
+            return [ symbol async for symbol, data in av.stream_symbols(["KO", "PG"])]
+        result, counter = self.run_client(consume, workers = 2)
+        self.assertEqual(sorted(result), ["KO", "PG"])
+        self.assertTrue(counter["connections"] <= 2)
+
+    def test_blocking_steps_off_event_loop(self):
+        threads = []
+        record = lambda *args, **kwargs: threads.append(threading.get_ident())
+
+        async def fetch(av):
+            threads.append(threading.get_ident())
+            with patch("alpha_vantage_tools.av_funcs.write_csv_", side_effect = record), \
+                patch.object(av, "cache", True), \
+                patch.object(av, "_cache_get", side_effect = record), \
+                patch.object(av, "_cache_put", side_effect = record):
+                return await av.alpha_vantage("AAPL", write_csv = True)
+        result, counter = self.run_client(fetch)
+        self.assertEqual(result, [])
+        # loop thread, cache lookup, cache store and file write
+        self.assertEqual(len(threads), 4)
+        self.assertNotIn(threads[0], threads[1:])
+
+    def test_bad_argument_output(self):
+        with self.assertRaises(AssertionError):
+            asyncio.run(AsyncLoadAlphaVantage().alpha_vantage("TSLA", output = "CYBER_TRUCK"))
+
+if __name__ == "__main__":
+    unittest.main()
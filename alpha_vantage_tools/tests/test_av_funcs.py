@@ -7,8 +7,14 @@ from unittest.mock import patch, call
 from os.path import isfile
 from os import remove
 from alpha_vantage_tools.config import api_parameters
-from alpha_vantage_tools.helpers import get_env
+from alpha_vantage_tools.helpers import get_env, count_bars
+from alpha_vantage_tools.db_funcs import SQLiteDB
+from datetime import datetime
+import sqlite3
+import tempfile
 from .helpers import basic_test_data, create_test_csv_generic
+from .benchmarks.fake_server import FakeAlphaVantageServer
+from alpha_vantage_tools.metrics import MetricsRegistry
 
 # Load testing data
 test_data = basic_test_data()
@@ -70,7 +76,8 @@ class TestBasicFunctionality(unittest.TestCase):
         mock_request.return_value = [[],[]]
         result = av.load_symbols(test_data["symbols"], request_limit = False)
         mock_request.assert_called_with(
-            'INTC', av_fun = 'TIME_SERIES_DAILY', interval = None, output = 'compact')
+            'INTC', av_fun = 'TIME_SERIES_DAILY', interval = None, output = 'compact', 
+            as_array = False)
         self.assertIsInstance(result, dict)
 
     @patch(load_av_path + "._LoadAlphaVantage__parse_api_request")
@@ -87,6 +94,18 @@ class TestBasicFunctionality(unittest.TestCase):
         self.assertTrue(isfile("./" + filename))
         remove("./" + filename)
 
+    @patch(load_av_path + "._LoadAlphaVantage__api_request")
+    def test_iter_alpha_vantage_lazy_rows(self, mock_request):
+        header = [b"timestamp,open,high,low,close,volume\r\n"]
+        mock_request.return_value = iter(header + 
+            [ ",".join(row).encode("utf-8") + b"\r\n" for row in test_data["test_data"]])
+        rows = av.iter_alpha_vantage("KO")
+        self.assertFalse(isinstance(rows, list))
+        self.assertEqual(next(rows)[:5], ["timestamp", "symbol", "timeseries_api", "interval", "open"])
+        self.assertEqual(next(rows), ["2018-01-04", "KO", "TIME_SERIES_DAILY", "daily"] + 
+            test_data["test_data"][1][1:])
+        self.assertEqual(len(list(rows)), 2)
+
     def test_read_symbols_returns_unique(self):
         cols = [["AAPL"],["KO"],["AAPL"],["AAPL"],["PEP"]]
         create_test_csv_generic("test_symbols.csv", cols)
@@ -127,6 +146,60 @@ class TestApiParameters(unittest.TestCase):
             av.alpha_vantage(
                 "KO", av_fun = "TIME_SERIES_INTRADAY", interval = None)
 
+class TestSync(unittest.TestCase):
+    def test_count_bars(self):
+        now = datetime(2019, 7, 15, 12)
+        self.assertEqual(count_bars("2019-07-12", now, "TIME_SERIES_DAILY"), 1)
+        self.assertEqual(count_bars("2019-07-01", now, "TIME_SERIES_WEEKLY"), 2)
+        self.assertEqual(count_bars("2019-01-31", now, "TIME_SERIES_MONTHLY"), 6)
+        self.assertEqual(
+            count_bars("2019-07-12 16:00:00", now, "TIME_SERIES_INTRADAY", "60min"), 13)
+
+    @patch(load_av_path + ".load_symbols")
+    def test_sync_inserts_only_new_rows(self, mock_load):
+        # fresh copy, other tests modify the shared test data
+        test_dict = basic_test_data()["test_dict"]
+        db = SQLiteDB("temp.db")
+        db.insert_timeseries(test_dict["AAPL"][:2])
+        header = ["timestamp", "symbol", "timeseries_api", "interval"]
+        mock_load.return_value = {
+            "AAPL" : [header] + test_dict["AAPL"], "INTC" : [header] + test_dict["INTC"]}
+        result = av.sync(["AAPL", "INTC"], db, request_limit = False)
+        mock_load.assert_called_once_with(
+            ["AAPL", "INTC"], "TIME_SERIES_DAILY", "full", None, False)
+        self.assertEqual(result, {"AAPL" : 2, "INTC" : 4})
+        remove("temp.db")
+
+class TestLoadToDB(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = SQLiteDB("/".join([self.tmp.name, "test.db"]))
+        self.server = FakeAlphaVantageServer(daily_full_size = 500).__enter__()
+        with patch.object(LoadAlphaVantage, "base_url", self.server.base_url):
+            self.av = LoadAlphaVantage(requests_per_day = 0, workers = 3, 
+                metrics = MetricsRegistry())
+
+    def tearDown(self):
+        self.av.close()
+        self.server.__exit__(None, None, None)
+        self.tmp.cleanup()
+
+    def test_load_to_db(self):
+        symbols = ["KO", "MSFT", "JNJ", "AAPL"]
+        result = self.av.load_to_db(symbols, self.db, output = "full", request_limit = False,
+            batch_size = 64, queue_size = 1)
+        self.assertEqual(result["inserted"], 4 * 499)
+        self.assertEqual(result["symbols"], { symbol : 499 for symbol in symbols})
+        self.assertEqual(len(self.db.query(["MSFT"])), 499)
+        result = self.av.load_to_db(symbols, self.db.db, request_limit = False)
+        self.assertEqual(result["inserted"], 0)
+        self.assertEqual(result["skipped"], 4 * 99)
+
+    def test_load_to_db_writer_error(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.av.load_to_db(["KO", "MSFT"], self.db, table = "missing", 
+                request_limit = False, batch_size = 10, queue_size = 1)
+
 if __name__ == "__main__":
     unittest.main()
 
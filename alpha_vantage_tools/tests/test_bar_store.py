@@ -0,0 +1,84 @@
+import unittest
+import tempfile
+from os import path
+from alpha_vantage_tools.bar_store import BarStore
+from alpha_vantage_tools.db_funcs import SQLiteDB
+from alpha_vantage_tools.metrics import MetricsRegistry
+from .helpers import basic_test_data, create_test_csv_generic
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+@unittest.skipIf(np == None, "NumPy not installed.")
+class TestBarStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BarStore(path.join(self.tmp.name, "bars"))
+        self.test_dict = basic_test_data()["test_dict"]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_insert_and_load(self):
+        # responses are sorted newest first
+        counts = self.store.insert_timeseries(self.test_dict["AAPL"][::-1])
+        self.assertEqual(counts["inserted"], 4)
+        bars = self.store.load("AAPL")
+        self.assertIsInstance(bars["close"], np.memmap)
+        self.assertEqual(bars["timestamp"][0], np.datetime64("2018-01-03"))
+        self.assertEqual(list(bars["volume"]), [999] * 4)
+        self.assertTrue(np.isnan(bars["adjusted_close"]).all())
+        self.assertEqual(self.store.load("AAPL", interval = "weekly"), None)
+
+    def test_append_only(self):
+        self.store.insert_timeseries(self.test_dict["AAPL"][:2])
+        counts = self.store.insert_dict(self.test_dict)
+        self.assertEqual((counts["inserted"], counts["skipped"]), (6, 2))
+        self.assertEqual(len(self.store.load("AAPL")["close"]), 4)
+        self.assertEqual(self.store.series(), [
+            ("AAPL", "TIME_SERIES_DAILY", "daily"), ("INTC", "TIME_SERIES_DAILY", "daily")])
+
+    def test_descending_series_over_batches(self):
+        row = self.test_dict["AAPL"][0]
+        rows = [ [str(np.datetime64("2019-01-01") + day)] + row[1:8] + [day]
+            for day in range(30)][::-1]
+        counts = self.store.insert_many(rows, batch_size = 10, verbose = False)
+        self.assertEqual((counts["inserted"], counts["skipped"]), (30, 0))
+        bars = self.store.load("AAPL")
+        self.assertEqual(list(bars["volume"]), list(range(30)))
+        self.assertTrue((np.diff(bars["timestamp"]) > np.timedelta64(0)).all())
+        counts = self.store.insert_many(rows, batch_size = 10, verbose = False)
+        self.assertEqual((counts["inserted"], counts["skipped"]), (0, 30))
+
+    def test_load_range(self):
+        self.store.insert_timeseries(self.test_dict["INTC"])
+        bars = self.store.load("INTC", start = "2018-01-04", end = "2018-01-05")
+        self.assertEqual(len(bars["timestamp"]), 2)
+
+    def test_insert_csv(self):
+        file_path = path.join(self.tmp.name, "INTC.csv")
+        create_test_csv_generic(file_path, self.test_dict["INTC"])
+        counts = self.store.insert_csv(self.tmp.name, select = "INTC.csv")
+        self.assertEqual(counts["inserted"], 4)
+
+    def test_status_events(self):
+        events = []
+        metrics = MetricsRegistry()
+        metrics.add_hook(lambda event, message, fields: events.append((event, fields)))
+        store = BarStore(path.join(self.tmp.name, "events"), metrics = metrics)
+        store.insert_csv(self.tmp.name, select = "MISSING.csv")
+        self.assertEqual([ event for event, fields in events], ["csv_file", "insert_complete"])
+        self.assertEqual(events[0][1]["file"], "MISSING.csv")
+        self.assertEqual(events[1][1]["inserted"], 0)
+
+    def test_from_sqlite(self):
+        db = SQLiteDB(path.join(self.tmp.name, "temp.db"))
+        db.insert_dict(self.test_dict)
+        store = BarStore.from_sqlite(db, path.join(self.tmp.name, "converted"))
+        self.assertEqual(len(store.series()), 2)
+        self.assertEqual(store.load("INTC")["close"].sum(), 4.2 * 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+from alpha_vantage_tools.tests.benchmarks.fake_server import synthetic_csv
+
+class TestBenchmarks(unittest.TestCase):
+    def test_synthetic_csv(self):
+        lines = synthetic_csv("TIME_SERIES_INTRADAY", 3, "5min").decode("utf-8").split("\r\n")
+        self.assertEqual(lines[0], "timestamp,open,high,low,close,volume")
+        self.assertEqual(lines[1][:19], "2019-12-31 16:00:00")
+        self.assertEqual(lines[2][:19], "2019-12-31 15:55:00")
+        self.assertEqual(len(lines), 5)
+
+    def test_run_quick(self):
+        # imported here, the runner is also executed with 'python -m'
+        from alpha_vantage_tools.tests.benchmarks.run import run
+        report = run(quick = True, repeat = 1)
+        names = [ result["name"] for result in report["results"]]
+        self.assertIn("alpha_vantage_parse_intraday_full", names)
+        self.assertIn("load_symbols_workers_4", names)
+        self.assertIn("sqlite_insert_many", names)
+        self.assertIn("parse_body_rows", names)
+        for result in report["results"]:
+            self.assertGreater(result["rows"], 0)
+            self.assertGreater(result["rows_per_second"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
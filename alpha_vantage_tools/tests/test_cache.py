@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+from os import remove
+from datetime import datetime
+from alpha_vantage_tools.cache import ResponseCache, cache_expiry, market_tz
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from .helpers import basic_test_data
+
+test_data = basic_test_data()
+load_av_path = "alpha_vantage_tools.av_funcs.LoadAlphaVantage"
+response = [b"timestamp,open,high,low,close,volume\r\n"] + \
+    [ ",".join(row).encode("utf-8") + b"\r\n" for row in test_data["test_data"]]
+
+def local_time(*args):
+    return datetime(*args, tzinfo = market_tz).timestamp()
+
+class TestCacheExpiry(unittest.TestCase):
+    # Wednesday 2019-07-10 12:00 New York time
+    now = local_time(2019, 7, 10, 12)
+
+    def test_intraday(self):
+        self.assertEqual(cache_expiry("TIME_SERIES_INTRADAY", "5min", self.now), self.now + 300)
+
+    def test_daily_next_close(self):
+        self.assertEqual(cache_expiry("TIME_SERIES_DAILY", now = self.now),
+            local_time(2019, 7, 10, 16))
+        friday_evening = local_time(2019, 7, 12, 18)
+        self.assertEqual(cache_expiry("TIME_SERIES_DAILY_ADJUSTED", now = friday_evening),
+            local_time(2019, 7, 15, 16))
+
+    def test_weekly_and_monthly(self):
+        self.assertEqual(cache_expiry("TIME_SERIES_WEEKLY", now = self.now),
+            local_time(2019, 7, 12, 16))
+        self.assertEqual(cache_expiry("TIME_SERIES_MONTHLY", now = self.now),
+            local_time(2019, 7, 31, 16))
+
+class TestResponseCache(unittest.TestCase):
+    def tearDown(self):
+        remove("temp_cache.db")
+
+    def test_hit_and_miss(self):
+        cache = ResponseCache("temp_cache.db")
+        self.assertEqual(cache.get("KO"), None)
+        cache.put(b"data", "KO")
+        self.assertEqual(cache.get("KO"), b"data")
+        self.assertEqual(cache.get("KO", output = "full"), None)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 2, 1))
+        cache.close()
+
+    @patch("alpha_vantage_tools.cache.time")
+    def test_expired_entry_missed(self, mock_time):
+        cache = ResponseCache("temp_cache.db")
+        mock_time.return_value = 1000
+        cache.put(b"data", "KO", "TIME_SERIES_INTRADAY", interval = "1min")
+        mock_time.return_value = 1061
+        self.assertEqual(cache.get("KO", "TIME_SERIES_INTRADAY", interval = "1min"), None)
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = ResponseCache("temp_cache.db", max_bytes = 8)
+        cache.put(b"1234", "KO")
+        cache.put(b"1234", "PG")
+        cache.get("KO")
+        cache.put(b"1234", "PEP")
+        self.assertEqual(cache.get("PG"), None)
+        self.assertEqual(cache.get("KO"), b"1234")
+        self.assertEqual(cache.get("PEP"), b"1234")
+        cache.close()
+
+    @patch(load_av_path + "._LoadAlphaVantage__api_request")
+    def test_cache_hit_skips_api_request(self, mock_request):
+        mock_request.return_value = response
+        av = LoadAlphaVantage(cache = "temp_cache.db")
+        first = av.alpha_vantage("KO")
+        second = av.alpha_vantage("KO")
+        mock_request.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual(av.cache.hits, 1)
+        av.cache.close()
+
+    @patch(load_av_path + "._LoadAlphaVantage__api_request")
+    def test_cache_hits_skip_request_budget(self, mock_request):
+        mock_request.return_value = response
+        av = LoadAlphaVantage(cache = "temp_cache.db", requests_per_day = 1)
+        av.cache.put(b"".join(response), "KO")
+        av.cache.put(b"".join(response), "MSFT")
+        result = av.load_symbols(["KO", "MSFT", "PG"])
+        self.assertEqual(sorted(result), ["KO", "MSFT", "PG"])
+        mock_request.assert_called_once()
+        self.assertEqual((av.cache.hits, av.cache.misses), (2, 1))
+        self.assertTrue(av.cache.contains("PG"))
+        self.assertFalse(av.cache.contains("PEP"))
+        av.cache.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from alpha_vantage_tools.columnar import rows_to_array, csv_to_array
+from .benchmarks.fake_server import synthetic_csv
+from .helpers import basic_test_data
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+test_data = basic_test_data()
+load_av_path = "alpha_vantage_tools.av_funcs.LoadAlphaVantage"
+header = ["timestamp", "symbol", "timeseries_api", "interval", "open", "high", "low", "close", 
+    "adjusted close", "volume", "dividend amount", "split coefficient"]
+
+@unittest.skipIf(np == None, "NumPy not installed.")
+class TestRowsToArray(unittest.TestCase):
+    def test_typed_columns(self):
+        rows = [header] + [ row[:8] + ["4.1"] + row[8:] + ["0.0", "1.0"] 
+            for row in test_data["test_dict"]["AAPL"]]
+        result = rows_to_array(rows)
+        self.assertEqual(len(result), 4)
+        self.assertEqual(result.dtype.names, ("timestamp", "open", "high", "low", "close", 
+            "adjusted_close", "volume", "dividend_amount", "split_coeff"))
+        self.assertEqual(result["timestamp"][0], np.datetime64("2018-01-03"))
+        self.assertEqual(result["volume"].dtype, np.dtype("int64"))
+        self.assertEqual(result["adjusted_close"][0], 4.1)
+
+    def test_missing_volume(self):
+        rows = [["timestamp", "close", "volume"], ["2018-01-04", "1.5", ""], 
+            ["2018-01-03", "1.5", "20"]]
+        result = rows_to_array(rows)
+        self.assertEqual(result["volume"].dtype, np.dtype("float64"))
+        self.assertTrue(np.isnan(result["volume"][0]))
+        self.assertEqual(result["volume"][1], 20)
+        # numbers from SQLite queries, NULL volume
+        result = rows_to_array([rows[0], ("2018-01-04", 1.5, None)])
+        self.assertTrue(np.isnan(result["volume"][0]))
+
+    @patch(load_av_path + "._LoadAlphaVantage__api_request")
+    def test_write_csv_as_array(self, mock_request):
+        mock_request.return_value = [b"timestamp,open,high,low,close,volume\r\n"] + \
+            [ ",".join(row).encode("utf-8") + b"\r\n" for row in test_data["test_data"]]
+        with tempfile.TemporaryDirectory() as directory:
+            result = LoadAlphaVantage().alpha_vantage("KO", write_csv = True, 
+                directory = directory, as_array = True)
+            self.assertEqual(result, [])
+            self.assertEqual(os.listdir(directory), ["KO.csv"])
+
+    @patch(load_av_path + "._LoadAlphaVantage__api_request")
+    def test_alpha_vantage_as_array(self, mock_request):
+        mock_request.return_value = [b"timestamp,open,high,low,close,volume\r\n"] + \
+            [ ",".join(row).encode("utf-8") + b"\r\n" for row in test_data["test_data"]]
+        result = LoadAlphaVantage().alpha_vantage("KO", as_array = True)
+        self.assertEqual(result.dtype.names, ("timestamp", "open", "high", "low", "close", "volume"))
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result["close"].sum(), 4.2 * 3)
+
+@unittest.skipIf(np == None, "NumPy not installed.")
+class TestCsvToArray(unittest.TestCase):
+    def test_matches_rows_to_array(self):
+        body = synthetic_csv("TIME_SERIES_DAILY_ADJUSTED", 50)
+        rows = [ line.split(",") for line in body.decode("utf-8").splitlines()]
+        result = csv_to_array(body, skip = 1)
+        expected = rows_to_array([rows[0]] + rows[2:])
+        self.assertEqual(result.dtype.names, expected.dtype.names)
+        self.assertEqual(result.dtype.names[-1], "split_coeff")
+        self.assertEqual(len(result), 49)
+        self.assertTrue((result == expected).all())
+
+    def test_missing_and_quoted_values(self):
+        for body in [b'timestamp,open,volume\r\n2018-01-04,,10\r\n2018-01-03,1.5,20\r\n',
+            b'timestamp,open,volume\r\n2018-01-04,,10\r\n"2018-01-03",1.5,20\r\n']:
+            result = csv_to_array(body)
+            self.assertTrue(np.isnan(result["open"][0]))
+            self.assertEqual(result["timestamp"][1], np.datetime64("2018-01-03"))
+            self.assertEqual(list(result["volume"]), [10, 20])
+
+    def test_missing_volume(self):
+        result = csv_to_array(b'timestamp,open,volume\r\n2018-01-04,1.0,\r\n2018-01-03,1.5,20\r\n')
+        self.assertEqual(result["volume"].dtype, np.dtype("float64"))
+        self.assertTrue(np.isnan(result["volume"][0]))
+        self.assertEqual(result["volume"][1], 20)
+
+if __name__ == "__main__":
+    unittest.main()
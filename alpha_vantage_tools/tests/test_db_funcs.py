@@ -1,12 +1,18 @@
 import unittest
 from unittest.mock import patch
-from alpha_vantage_tools.db_funcs import SQLiteConn, SQLiteDB
+from concurrent.futures import ThreadPoolExecutor
+from alpha_vantage_tools.db_funcs import SQLiteConn, SQLiteDB, _bounded_map
 from .helpers import basic_test_data, create_test_csv_generic
-from os import remove, mkdir, chdir
+from os import remove, mkdir, rmdir, chdir
 from os.path import isfile
 import sqlite3
 import json
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 test_data = basic_test_data()
 
 class TestConn(unittest.TestCase):
@@ -23,6 +29,25 @@ class TestConn(unittest.TestCase):
 			mocked_connection.assert_called_once()
 		self.assertEqual(db_connection_object.flag, "connection closed")
 
+class TestSession(unittest.TestCase):
+	def test_session_reuses_connection(self):
+		with SQLiteDB("temp.db") as db:
+			SQLiteDB.execute_query(db.db, "SELECT * FROM STOCKS;", fetch = True)
+			db.insert_row(test_data["test_dict"]["AAPL"][1])
+			self.assertEqual(len(db.session.connections), 1)
+			result = SQLiteDB.execute_query(db.db, "PRAGMA journal_mode;", fetch = True)
+			self.assertEqual(result[0][0], "wal")
+		self.assertEqual(db.session, None)
+		result = SQLiteDB.execute_query(db.db, "SELECT * FROM STOCKS;", fetch = True)
+		self.assertEqual(len(result), 1)
+		remove("temp.db")
+
+	def test_session_custom_pragmas(self):
+		with SQLiteDB("temp.db", pragmas = {"cache_size" : -1000}) as db:
+			result = SQLiteDB.execute_query(db.db, "PRAGMA cache_size;", fetch = True)
+			self.assertEqual(result[0][0], -1000)
+		remove("temp.db")
+
 class TestDB(unittest.TestCase):
 	symbol = "AAPL"
 	row = test_data["test_dict"]["AAPL"][1]
@@ -82,6 +107,43 @@ class TestDB(unittest.TestCase):
 		self.assertEqual(len(result), 8)
 		remove("temp.db")
 
+	def test_insert_many_batches(self):
+		db = SQLiteDB("temp.db")
+		rows = self.test_dict["AAPL"] + self.test_dict["INTC"]
+		counts = db.insert_many(rows, batch_size = 3, verbose = False)
+		result = SQLiteDB.execute_query(db.db, "SELECT * FROM STOCKS;", fetch = True)
+		self.assertEqual(counts["inserted"], 8)
+		self.assertEqual(len(result), 8)
+		remove("temp.db")
+
+	def test_insert_many_duplicate_rows(self):
+		db = SQLiteDB("temp.db")
+		rows = self.test_dict["AAPL"] + self.test_dict["AAPL"][:2]
+		counts = db.insert_many(rows, verbose = False)
+		result = SQLiteDB.execute_query(db.db, "SELECT * FROM STOCKS;", fetch = True)
+		self.assertEqual(counts, {"inserted" : 4, "updated" : 0, "skipped" : 2})
+		self.assertEqual(len(result), 4)
+		remove("temp.db")
+
+	def test_insert_conflict_policies(self):
+		db = SQLiteDB("temp.db")
+		rows = self.test_dict["AAPL"]
+		changed = [ row[:4] + [5.0] + row[5:] for row in rows[:2]]
+		db.insert_many(rows, verbose = False)
+		counts = db.insert_many(rows + changed, conflict = "update", verbose = False)
+		self.assertEqual(counts, {"inserted" : 0, "updated" : 2, "skipped" : 4})
+		counts = db.insert_many(rows, conflict = "replace", verbose = False)
+		self.assertEqual(counts, {"inserted" : 0, "updated" : 4, "skipped" : 0})
+		result = SQLiteDB.execute_query(db.db, "SELECT open FROM STOCKS;", fetch = True)
+		self.assertEqual(result, [(4.2,)] * 4)
+		remove("temp.db")
+
+	def test_insert_bad_conflict_policy(self):
+		db = SQLiteDB("temp.db")
+		with self.assertRaises(AssertionError):
+			db.insert_row(self.row, conflict = "abort")
+		remove("temp.db")
+
 	def test_insert_csv(self):
 		create_test_csv_generic("test_csv.csv", self.test_dict["AAPL"])
 		db, result = self.basic_insertion("insert_csv", select = "test_csv.csv")
@@ -90,5 +152,78 @@ class TestDB(unittest.TestCase):
 		remove("temp.db")
 		remove("test_csv.csv")
 		
+	def test_insert_csv_directory_parallel(self):
+		mkdir("test_csv_dir")
+		create_test_csv_generic("test_csv_dir/AAPL.csv", self.test_dict["AAPL"])
+		create_test_csv_generic("test_csv_dir/INTC.csv", self.test_dict["INTC"])
+		create_test_csv_generic("test_csv_dir/BAD.csv", [["2018-01-03", "BAD", "X", "daily", "4.2", "x"]])
+		db = SQLiteDB("temp.db")
+		counts = db.insert_csv("test_csv_dir", processes = 2, verbose = False)
+		result = SQLiteDB.execute_query(db.db, "SELECT volume FROM STOCKS;", fetch = True)
+		self.assertEqual(counts["inserted"], 8)
+		self.assertEqual(counts["files"]["AAPL.csv"]["inserted"], 4)
+		self.assertIsInstance(counts["files"]["BAD.csv"], str)
+		self.assertEqual(result[0], (999,))
+		for file in ["AAPL.csv", "INTC.csv", "BAD.csv"]:
+			remove("test_csv_dir/" + file)
+		rmdir("test_csv_dir")
+		remove("temp.db")
+
+	def test_bounded_map_limits_pending(self):
+		pending, sizes = set(), []
+		with ThreadPoolExecutor(max_workers = 2) as executor:
+			result = []
+			for value in _bounded_map(executor, lambda x: x * 2, range(20), 3, pending):
+				sizes.append(len(pending))
+				result.append(value)
+		self.assertEqual(sorted(result), list(range(0, 40, 2)))
+		self.assertTrue(max(sizes) <= 3)
+		self.assertEqual(pending, set())
+
+class TestQuery(unittest.TestCase):
+	def setUp(self):
+		self.db = SQLiteDB("temp.db")
+		self.db.insert_dict(basic_test_data()["test_dict"])
+
+	def tearDown(self):
+		remove("temp.db")
+
+	def test_query_filters(self):
+		result = self.db.query("INTC", start = "2018-01-04", end = "2018-01-05", 
+			columns = ["timestamp", "symbol", "close"])
+		self.assertEqual(result, [("2018-01-04", "INTC", 4.2), ("2018-01-05", "INTC", 4.2)])
+		result = self.db.query(["AAPL", "INTC"], av_fun = "TIME_SERIES_DAILY", interval = "daily")
+		self.assertEqual(len(result), 8)
+		self.assertEqual(len(self.db.query(interval = "weekly")), 0)
+
+	def test_query_bad_column(self):
+		with self.assertRaises(AssertionError):
+			self.db.query(columns = ["timestamp; DROP TABLE stocks"])
+
+	def test_query_uses_index(self):
+		plan = SQLiteDB.execute_query(self.db.db, """EXPLAIN QUERY PLAN SELECT * FROM stocks 
+			WHERE symbol IN (?) AND timestamp >= ? ORDER BY symbol, timestamp;""", 
+			data = ["AAPL", "2018-01-04"], fetch = True)
+		self.assertIn("stocks_symbol_timestamp", " ".join([ row[-1] for row in plan]))
+
+	def test_iter_query_chunks(self):
+		chunks = list(self.db.iter_query(columns = ["timestamp"], chunk_size = 3))
+		self.assertEqual([ (symbol, len(rows)) for symbol, rows in chunks], 
+			[("AAPL", 3), ("AAPL", 1), ("INTC", 3), ("INTC", 1)])
+		self.assertEqual(chunks[1][1], [("2018-01-06",)])
+
+	@unittest.skipIf(np == None, "NumPy not installed.")
+	def test_iter_query_as_array(self):
+		chunks = list(self.db.iter_query("INTC", chunk_size = 2, as_array = True))
+		self.assertEqual(len(chunks), 2)
+		self.assertEqual(chunks[0][1]["timestamp"][0], np.datetime64("2018-01-03"))
+
+	@unittest.skipIf(np == None, "NumPy not installed.")
+	def test_query_as_array(self):
+		result = self.db.query(columns = ["timestamp", "close", "volume"], as_array = True)
+		self.assertEqual(set(result.keys()), {"AAPL", "INTC"})
+		self.assertEqual(result["AAPL"].dtype.names, ("timestamp", "close", "volume"))
+		self.assertEqual(result["AAPL"]["volume"].sum(), 999 * 4)
+
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file
@@ -0,0 +1,174 @@
+import gzip
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from alpha_vantage_tools.db_funcs import SQLiteDB
+from alpha_vantage_tools.formats import path_format
+from alpha_vantage_tools.helpers import read_csv, write_csv
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+load_av_path = "alpha_vantage_tools.av_funcs.LoadAlphaVantage"
+header = ["timestamp", "open", "high", "low", "close", "volume"]
+response = [header] + [ ["2018-01-0{0}".format(day), "1.0", "2.0", "0.5", "1.5", "100"] 
+    for day in (5, 4, 3, 2)]
+
+class TestFileFormats(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.av = LoadAlphaVantage()
+
+    def tearDown(self):
+        self.av.close()
+        self.tmp.cleanup()
+
+    def load_and_insert(self, file_format):
+        with patch(load_av_path + "._LoadAlphaVantage__parse_api_request", 
+            side_effect = lambda *args: [ list(row) for row in response]):
+            self.av.load_csv(["KO", "PG"], self.tmp.name, request_limit = False, 
+                file_format = file_format)
+        db = SQLiteDB(os.path.join(self.tmp.name, "temp.db"))
+        files = sorted([ file for file in os.listdir(self.tmp.name) if file != "temp.db"])
+        result = db.insert_csv(self.tmp.name, files, processes = 1, verbose = False)
+        return files, result, db.query("KO")
+
+    def test_path_format(self):
+        self.assertEqual([ path_format(path) for path in ("a.csv", "a.csv.gz", "a.csv.zst", 
+            "a.parquet", "a.txt")], ["csv", "gzip", "zstd", "parquet", "csv"])
+
+    def test_gzip_round_trip(self):
+        files, result, rows = self.load_and_insert("gzip")
+        self.assertEqual(files, ["KO.csv.gz", "PG.csv.gz"])
+        with gzip.open(os.path.join(self.tmp.name, "KO.csv.gz"), "rt") as f:
+            self.assertTrue(f.readline().startswith("timestamp,symbol"))
+        self.assertEqual(result["inserted"], 6)
+        self.assertEqual(rows[0], 
+            ("2018-01-02", "KO", "TIME_SERIES_DAILY", "daily", 1.0, 2.0, 0.5, 1.5, None, 100, 
+            None, None))
+
+    @unittest.skipIf(zstandard == None, "zstandard not installed.")
+    def test_zstd_round_trip(self):
+        files, result, rows = self.load_and_insert("zstd")
+        self.assertEqual(files, ["KO.csv.zst", "PG.csv.zst"])
+        self.assertEqual(result["inserted"], 6)
+
+    @unittest.skipIf(pyarrow == None, "pyarrow not installed.")
+    def test_parquet_round_trip(self):
+        files, result, rows = self.load_and_insert("parquet")
+        self.assertEqual(files, ["KO.parquet", "PG.parquet"])
+        self.assertEqual(result["inserted"], 6)
+        self.assertEqual(rows[0][4:], (1.0, 2.0, 0.5, 1.5, None, 100, None, None))
+        schema = pyarrow.parquet.read_schema(os.path.join(self.tmp.name, "KO.parquet"))
+        self.assertTrue(pyarrow.types.is_dictionary(schema.field("symbol").type))
+
+    def test_missing_dependency_reported_per_file(self):
+        path = os.path.join(self.tmp.name, "KO.parquet")
+        write_csv(path.replace(".parquet", ".csv"), response)
+        with patch("alpha_vantage_tools.formats.import_pyarrow", side_effect = ImportError("no")):
+            db = SQLiteDB(os.path.join(self.tmp.name, "temp.db"))
+            open(path, "wb").close()
+            result = db.insert_csv(self.tmp.name, ["KO.parquet", "KO.csv"], processes = 1, 
+                verbose = False)
+        self.assertEqual(result["files"]["KO.parquet"], "no")
+
+    def test_invalid_format(self):
+        with self.assertRaises(AssertionError):
+            self.av.load_csv("KO", self.tmp.name, file_format = "xz")
+
+    def test_read_csv_compressed(self):
+        path = os.path.join(self.tmp.name, "rows.csv.gz")
+        write_csv(path, response)
+        self.assertEqual(read_csv(path), response)
+
+class TestIncrementalWrite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "KO.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def timestamps(self, path = None):
+        return [ row[0] for row in read_csv(path or self.path)[1:]]
+
+    def test_append_ascending(self):
+        write_csv(self.path, response[:1] + response[:0:-1][:2])
+        with open(self.path, "rb") as f:
+            stored = f.read()
+        self.assertEqual(write_csv(self.path, response, incremental = True), 2)
+        self.assertEqual(self.timestamps(), 
+            ["2018-01-02", "2018-01-03", "2018-01-04", "2018-01-05"])
+        # the stored rows are left in place
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(len(stored)), stored)
+
+    def test_rewrite_descending(self):
+        write_csv(self.path, response[:1] + response[3:])
+        self.assertEqual(write_csv(self.path, response[:3], incremental = True), 2)
+        self.assertEqual(self.timestamps(), 
+            ["2018-01-05", "2018-01-04", "2018-01-03", "2018-01-02"])
+        self.assertEqual(write_csv(self.path, response, incremental = True), 0)
+        self.assertEqual(os.listdir(self.tmp.name), ["KO.csv"])
+
+    def test_rewrite_compressed(self):
+        path = self.path + ".gz"
+        write_csv(path, response[:1] + response[2:])
+        self.assertEqual(write_csv(path, response, incremental = True), 1)
+        self.assertEqual(self.timestamps(path), 
+            ["2018-01-05", "2018-01-04", "2018-01-03", "2018-01-02"])
+
+    def test_failed_write_keeps_file(self):
+        write_csv(self.path, response)
+        def rows():
+            yield header
+            raise OSError("disk full")
+        with self.assertRaises(OSError):
+            write_csv(self.path, rows())
+        self.assertEqual(read_csv(self.path), response)
+        self.assertEqual(os.listdir(self.tmp.name), ["KO.csv"])
+
+    @patch(load_av_path + "._LoadAlphaVantage__parse_api_request")
+    def test_load_csv_incremental_keeps_history(self, mock_request):
+        mock_request.return_value = [ list(row) for row in response]
+        av = LoadAlphaVantage()
+        av.load_csv("KO", self.tmp.name, request_limit = False)
+        # a later compact response overlapping the stored rows, the latest (partial)
+        # daily bar of each response is skipped
+        mock_request.return_value = [header, ["2018-01-07"] + response[1][1:], 
+            ["2018-01-06"] + response[1][1:], list(response[1])]
+        av.load_csv("KO", self.tmp.name, request_limit = False, incremental = True)
+        self.assertEqual(self.timestamps(), 
+            ["2018-01-06", "2018-01-05", "2018-01-04", "2018-01-03", "2018-01-02"])
+
+    @patch(load_av_path + "._LoadAlphaVantage__parse_api_request")
+    def test_load_csv_incremental_appends(self, mock_request):
+        mock_request.return_value = [ list(row) for row in response]
+        av = LoadAlphaVantage()
+        av.load_csv("KO", self.tmp.name, request_limit = False, incremental = True)
+        self.assertEqual(self.timestamps(), ["2018-01-02", "2018-01-03", "2018-01-04"])
+        with open(self.path, "rb") as f:
+            stored = f.read()
+        inode = os.stat(self.path).st_ino
+
+        mock_request.return_value = [header, ["2018-01-07"] + response[1][1:], 
+            ["2018-01-06"] + response[1][1:], list(response[1])]
+        av.load_csv("KO", self.tmp.name, request_limit = False, incremental = True)
+        self.assertEqual(self.timestamps(), 
+            ["2018-01-02", "2018-01-03", "2018-01-04", "2018-01-05", "2018-01-06"])
+        # appended in place, not rewritten
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(len(stored)), stored)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import socket
+import unittest
+import threading
+from unittest.mock import patch
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from alpha_vantage_tools.http_pool import HTTPConnectionPool
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from .helpers import basic_test_data
+
+test_data = basic_test_data()
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Alpha Vantage API counting new connections.
+
+    """
+    protocol_version = "HTTP/1.1"
+    counter = {"connections" : 0, "requests" : 0}
+    paths = []
+
+    def setup(self):
+        super().setup()
+        self.counter["connections"] += 1
+
+    def do_GET(self):
+        self.counter["requests"] += 1
+        self.paths.append(self.path)
+        rows = [["timestamp", "open", "high", "low", "close", "volume"]] + test_data["test_data"]
+        body = "".join([",".join(row) + "\r\n" for row in rows]).encode("utf-8")
+        status = 404 if self.path.startswith("/missing") else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestHTTPConnectionPool(unittest.TestCase):
+    def setUp(self):
+        StandInHandler.counter.update({"connections" : 0, "requests" : 0})
+        StandInHandler.paths = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+        self.base_url = "http://127.0.0.1:{0}/query?".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused(self):
+        pool = HTTPConnectionPool(self.base_url)
+        for i in range(3):
+            status, body = pool.get(self.base_url + "symbol=KO")
+            self.assertEqual(status, 200)
+        pool.close()
+        self.assertEqual(pool.connections_opened, 1)
+        self.assertEqual(StandInHandler.counter["connections"], 1)
+        self.assertEqual(StandInHandler.counter["requests"], 3)
+
+    def test_error_status(self):
+        pool = HTTPConnectionPool(self.base_url)
+        status, body = pool.get(self.base_url.replace("/query", "/missing"))
+        pool.close()
+        self.assertEqual(status, 404)
+
+    def test_http_proxy(self):
+        proxy = "127.0.0.1:{0}".format(self.server.server_port)
+        with patch.dict("os.environ", {"http_proxy" : proxy, "no_proxy" : ""}):
+            pool = HTTPConnectionPool("http://alpha.invalid/query?")
+        status, body = pool.get("http://alpha.invalid/query?symbol=KO")
+        pool.close()
+        self.assertEqual(status, 200)
+        self.assertEqual(StandInHandler.paths, ["http://alpha.invalid/query?symbol=KO"])
+
+    def test_next_address_tried(self):
+        unused = socket.socket()
+        unused.bind(("127.0.0.1", 0))
+        closed_port = unused.getsockname()[1]
+        unused.close()
+        addresses = [ (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))
+            for port in (closed_port, self.server.server_port)]
+        pool = HTTPConnectionPool(self.base_url)
+        with patch("socket.getaddrinfo", return_value = addresses):
+            status, body = pool.get(self.base_url + "symbol=KO")
+        pool.close()
+        self.assertEqual(status, 200)
+
+    def test_load_symbols_single_connection(self):
+        with patch.object(LoadAlphaVantage, "base_url", self.base_url):
+            av = LoadAlphaVantage(requests_per_minute = 600)
+        result = av.load_symbols(test_data["symbols"])
+        av.close()
+        self.assertEqual(set(result.keys()), set(test_data["symbols"]))
+        self.assertEqual(StandInHandler.counter["connections"], 1)
+        self.assertEqual(StandInHandler.counter["requests"], len(test_data["symbols"]))
+
+if __name__ == "__main__":
+    unittest.main()
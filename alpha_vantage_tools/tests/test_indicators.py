@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from alpha_vantage_tools.db_funcs import SQLiteDB
+from alpha_vantage_tools.indicators import IndicatorStore, compute_indicators
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+load_av_path = "alpha_vantage_tools.av_funcs.LoadAlphaVantage"
+
+def daily_rows(closes, start = 0):
+    return [ ["2019-{0:02d}-{1:02d}".format(1 + i // 28, 1 + i % 28), "KO", "TIME_SERIES_DAILY", 
+        "daily", close, close + 1, close - 1, close, None, 100, None, None] 
+        for i, close in enumerate(closes, start)]
+
+@unittest.skipIf(np == None, "NumPy not installed.")
+class TestComputeIndicators(unittest.TestCase):
+    def setUp(self):
+        self.close = 100 + np.cumsum(np.random.default_rng(0).normal(size = 300))
+        self.indicators = ["sma_5", "ema_10", "rsi_14", "atr_14"]
+
+    def test_reference_values(self):
+        values, state = compute_indicators(["sma_3", "ema_3", "rsi_2", "atr_2"], 
+            [3, 4, 5, 6], [1, 2, 3, 4], [2, 3, 4, 3])
+        np.testing.assert_allclose(values["sma_3"], [np.nan, np.nan, 3, 10 / 3])
+        np.testing.assert_allclose(values["ema_3"], [np.nan, np.nan, 3, 3])
+        np.testing.assert_allclose(values["rsi_2"], [np.nan, np.nan, 100, 50])
+        np.testing.assert_allclose(values["atr_2"], [np.nan, 2, 2, 2])
+
+    def test_incremental_equals_full(self):
+        full, state = compute_indicators(self.indicators, self.close + 1, self.close - 1, 
+            self.close)
+        state, parts = None, []
+        for start, end in [(0, 3), (3, 4), (4, 20), (20, 21), (21, 300)]:
+            close = self.close[start:end]
+            values, state = compute_indicators(self.indicators, close + 1, close - 1, close, 
+                state)
+            parts.append(values)
+        for spec in self.indicators:
+            np.testing.assert_allclose(
+                np.concatenate([ values[spec] for values in parts]), full[spec])
+
+    def test_invalid_indicator(self):
+        with self.assertRaises(AssertionError):
+            compute_indicators(["macd_12"], [1], [1], [1])
+
+@unittest.skipIf(np == None, "NumPy not installed.")
+class TestIndicatorStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = SQLiteDB(os.path.join(self.tmp.name, "temp.db"))
+        self.store = IndicatorStore(self.db, ["sma_3", "rsi_2"])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_update_only_new_bars(self):
+        self.db.insert_many(daily_rows([2, 3, 4]), verbose = False)
+        self.assertEqual(self.store.update(), {"KO" : 3})
+        self.assertEqual(self.store.update(), {"KO" : 0})
+        self.db.insert_many(daily_rows([3], start = 3), verbose = False)
+        self.assertEqual(self.store.update(), {"KO" : 1})
+        result = self.store.query("KO")
+        self.assertEqual([ row[4:] for row in result], 
+            [(None, None), (None, None), (3.0, 100.0), (10 / 3, 50.0)])
+        self.assertEqual(result[-1][:4], ("2019-01-04", "KO", "TIME_SERIES_DAILY", "daily"))
+
+    def test_indicator_mismatch(self):
+        with self.assertRaises(AssertionError):
+            IndicatorStore(self.db, ["sma_20"])
+
+    @patch(load_av_path + ".load_symbols")
+    def test_sync_updates_indicators(self, mock_load):
+        header = ["timestamp", "symbol", "timeseries_api", "interval"]
+        mock_load.return_value = {"KO" : [header] + daily_rows([2, 3, 4])}
+        av = LoadAlphaVantage()
+        av.sync(["KO"], self.db, request_limit = False, indicators = self.store)
+        self.assertEqual(self.store.query("KO")[-1][4:], (3.0, 100.0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import tempfile
+from os import path, listdir, makedirs
+from unittest.mock import patch
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from alpha_vantage_tools.db_funcs import SQLiteDB
+from alpha_vantage_tools.jobs import JobJournal
+from alpha_vantage_tools.metrics import MetricsRegistry
+from .helpers import basic_test_data
+
+load_av_path = "alpha_vantage_tools.av_funcs.LoadAlphaVantage"
+
+def fake_alpha_vantage(symbol, av_fun = "TIME_SERIES_DAILY", output = "compact", 
+    interval = None, write_csv = False, directory = "."):
+    if(symbol == "BAD"):
+        return None
+    if(symbol == "CRASH"):
+        raise KeyboardInterrupt
+    rows = [ [row[0], symbol] + row[2:] for row in basic_test_data()["test_dict"]["AAPL"]]
+    if(write_csv):
+        makedirs(directory, exist_ok = True)
+        with open(path.join(directory, symbol + ".csv"), "w") as f:
+            f.write("\n".join([ ",".join(map(str, row)) for row in rows]))
+        return []
+    return rows
+
+class TestJobJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = JobJournal(path.join(self.tmp.name, "test.db"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_and_update(self):
+        self.journal.add("job", ["KO", "MSFT"])
+        self.journal.update("job", "KO", "completed", rows = 4)
+        self.journal.add("job", ["KO", "JNJ"])
+        self.assertEqual(self.journal.entries("job"), 
+            [("KO", "completed", 4, None), ("MSFT", "pending", None, None), 
+            ("JNJ", "pending", None, None)])
+        self.assertEqual(self.journal.symbols("job"), ["MSFT", "JNJ"])
+        self.assertEqual(self.journal.summary("job"), 
+            {"pending" : 2, "completed" : 1, "failed" : 0})
+        self.assertEqual(self.journal.entries("other"), [])
+
+class TestRunJob(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = SQLiteDB(path.join(self.tmp.name, "test.db"))
+        self.av = LoadAlphaVantage(requests_per_day = 0, metrics = MetricsRegistry())
+
+    def tearDown(self):
+        self.av.close()
+        self.tmp.cleanup()
+
+    @patch(load_av_path + ".alpha_vantage")
+    def test_resume_after_crash(self, mock_request):
+        mock_request.side_effect = fake_alpha_vantage
+        with self.assertRaises(KeyboardInterrupt):
+            self.av.run_job("job", ["KO", "BAD", "CRASH", "MSFT"], self.db, 
+                request_limit = False)
+        self.assertEqual(self.db.latest_timestamps("TIME_SERIES_DAILY", "daily"), 
+            {"KO" : "2018-01-06"})
+
+        mock_request.reset_mock()
+        mock_request.side_effect = lambda symbol, **kwargs: fake_alpha_vantage(
+            "KO" if symbol == "CRASH" else symbol, **kwargs)
+        summary = self.av.run_job("job", ["KO", "BAD", "CRASH", "MSFT"], self.db, 
+            request_limit = False, retry_failed = False)
+        self.assertEqual([ call[0][0] for call in mock_request.call_args_list], 
+            ["CRASH", "MSFT"])
+        self.assertEqual(summary, {"pending" : 0, "completed" : 3, "failed" : 1})
+        journal = JobJournal(self.db)
+        self.assertEqual(journal.entries("job", "failed"), [("BAD", "failed", None, "no data")])
+        self.assertEqual(journal.entries("job", "completed")[-1], ("MSFT", "completed", 4, None))
+
+    @patch(load_av_path + ".alpha_vantage")
+    def test_csv_job(self, mock_request):
+        mock_request.side_effect = fake_alpha_vantage
+        directory = path.join(self.tmp.name, "csv")
+        summary = self.av.run_job("job", ["KO", "MSFT"], self.db.db, directory = directory,
+            request_limit = False)
+        self.assertEqual(summary, {"pending" : 0, "completed" : 2, "failed" : 0})
+        self.assertEqual(sorted(listdir(directory)), ["KO.csv", "MSFT.csv"])
+        self.av.run_job("job", ["KO", "MSFT"], self.db.db, directory = directory)
+        self.assertEqual(mock_request.call_count, 2)
+
+if __name__ == "__main__":
+    unittest.main()
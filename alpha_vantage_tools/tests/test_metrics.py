@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+from os import path
+from alpha_vantage_tools.metrics import MetricsRegistry, LoggingSink
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from alpha_vantage_tools.db_funcs import SQLiteDB
+from .benchmarks.fake_server import FakeAlphaVantageServer
+from .helpers import basic_test_data
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+
+    def test_counters_and_summaries(self):
+        self.metrics.inc("requests_total", status = 200)
+        self.metrics.inc("requests_total", 2, status = 200)
+        self.metrics.observe("seconds", 0.5)
+        self.metrics.observe("seconds", 1.5)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["counters"][("requests_total", (("status", "200"),))], 3)
+        self.assertEqual(snapshot["summaries"][("seconds", ())], 
+            {"count" : 2, "sum" : 2.0, "max" : 1.5})
+
+    def test_to_prometheus(self):
+        self.metrics.inc("requests_total", status = 200)
+        self.metrics.observe("seconds", 0.5, phase = "ttfb")
+        text = self.metrics.to_prometheus()
+        self.assertIn("# TYPE alpha_vantage_requests_total counter", text)
+        self.assertIn('alpha_vantage_requests_total{status="200"} 1', text)
+        self.assertIn("# TYPE alpha_vantage_seconds summary", text)
+        self.assertIn('alpha_vantage_seconds_count{phase="ttfb"} 1', text)
+        self.assertIn('alpha_vantage_seconds_sum{phase="ttfb"} 0.5', text)
+
+    def test_hooks(self):
+        events = []
+        hook = self.metrics.add_hook(lambda *args: events.append(args))
+        self.metrics.emit("test", "Message", n = 1)
+        self.metrics.remove_hook(hook)
+        self.metrics.emit("test")
+        self.assertEqual(events, [("test", "Message", {"n" : 1})])
+
+    def test_logging_sink(self):
+        self.metrics.add_hook(LoggingSink())
+        with self.assertLogs("alpha_vantage_tools", level = "INFO") as logs:
+            self.metrics.emit("request", symbol = "KO", status = 200)
+            self.metrics.emit("http_error", "Error", error = 404)
+        self.assertEqual(logs.records[0].getMessage(), "request status=200 symbol=KO")
+        self.assertEqual(logs.records[0].fields, {"symbol" : "KO", "status" : 200})
+        self.assertEqual(logs.records[1].levelname, "WARNING")
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+        self.events = []
+        self.metrics.add_hook(lambda event, message, fields: self.events.append(event))
+
+    def test_request_metrics(self):
+        with FakeAlphaVantageServer() as server:
+            fake_class = type("FakeLoadAlphaVantage", (LoadAlphaVantage,), 
+                {"base_url" : server.base_url})
+            av = fake_class(requests_per_day = 0, workers = 2, metrics = self.metrics)
+            av.load_symbols(["KO", "MSFT"])
+            av.close()
+
+        snapshot = self.metrics.snapshot()
+        phases = [ dict(labels)["phase"] for name, labels in snapshot["summaries"]
+            if name == "http_request_seconds"]
+        self.assertEqual(sorted(phases), ["body", "connect", "dns", "ttfb"])
+        self.assertEqual(snapshot["summaries"][("rate_limit_wait_seconds", ())]["count"], 2)
+        self.assertEqual(snapshot["counters"][("parsed_rows_total", 
+            (("av_fun", "TIME_SERIES_DAILY"),))], 198)
+        self.assertEqual(snapshot["counters"][("http_requests_total", 
+            (("av_fun", "TIME_SERIES_DAILY"), ("status", "200")))], 2)
+        self.assertEqual(self.events.count("request"), 2)
+        self.assertIn("download_complete", self.events)
+
+    def test_db_metrics(self):
+        with tempfile.TemporaryDirectory() as directory:
+            db = SQLiteDB(path.join(directory, "test.db"), metrics = self.metrics)
+            rows = basic_test_data()["test_dict"]["AAPL"]
+            db.insert_many(rows, batch_size = 2, verbose = False)
+            db.insert_many(rows, batch_size = 2, verbose = False)
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["summaries"][("db_batch_seconds", 
+            (("table", "stocks"),))]["count"], 4)
+        self.assertEqual(snapshot["counters"][("db_rows_total", 
+            (("result", "inserted"), ("table", "stocks")))], 4)
+        self.assertEqual(snapshot["counters"][("db_rows_total", 
+            (("result", "skipped"), ("table", "stocks")))], 4)
+        self.assertEqual(self.events, ["insert_complete", "insert_complete"])
+
+if __name__ == "__main__":
+    unittest.main()
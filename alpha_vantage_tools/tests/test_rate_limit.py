@@ -0,0 +1,263 @@
+import unittest
+import threading
+from unittest.mock import patch
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from alpha_vantage_tools.rate_limit import TokenBucket, RateLimiter, KeyPool
+from alpha_vantage_tools.av_funcs import LoadAlphaVantage
+from alpha_vantage_tools.metrics import MetricsRegistry
+
+load_av_path = "alpha_vantage_tools.av_funcs.LoadAlphaVantage"
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_up_to_capacity(self):
+        bucket = TokenBucket(rate = 1, capacity = 3)
+        self.assertEqual([bucket.try_acquire() for i in range(4)], [True, True, True, False])
+
+    def test_reserve_returns_wait_time(self):
+        bucket = TokenBucket(rate = 2, capacity = 1)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.5, places = 2)
+        self.assertAlmostEqual(bucket.reserve(), 1.0, places = 2)
+
+    def test_throttle(self):
+        bucket = TokenBucket(rate = 2, capacity = 3)
+        self.assertEqual(bucket.throttle(), 1)
+        self.assertFalse(bucket.try_acquire())
+        self.assertEqual(bucket.throttle(0.1, min_rate = 0.5), 0.5)
+
+    def test_recover_up_to_initial_rate(self):
+        bucket = TokenBucket(rate = 2, capacity = 3)
+        bucket.throttle(0.25)
+        self.assertEqual(bucket.recover(2), 1)
+        self.assertEqual(bucket.recover(4), 2)
+
+    def test_cooldown(self):
+        bucket = TokenBucket(rate = 2, capacity = 3)
+        self.assertEqual(bucket.throttle(cooldown = 60), 1)
+        self.assertEqual(bucket.throttle(cooldown = 60), 1)
+        self.assertEqual(bucket.recover(cooldown = 60), 1)
+        self.assertEqual(bucket.recover(), 1.25)
+
+class TestRateLimiter(unittest.TestCase):
+    def test_daily_budget_exhausted(self):
+        limiter = RateLimiter(requests_per_minute = 60, requests_per_day = 2)
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertEqual(limiter.acquire(), None)
+
+    @patch(load_av_path + ".alpha_vantage")
+    def test_download_concurrent_within_budget(self, mock_request):
+        mock_request.return_value = [[], []]
+        av = LoadAlphaVantage(requests_per_minute = 600, requests_per_day = 3, workers = 4)
+        result = av.load_symbols(["AAPL", "MSFT", "JNJ", "PG"])
+        self.assertEqual(mock_request.call_count, 3)
+        self.assertEqual(len(result), 3)
+
+    def test_throttle_slows_down(self):
+        limiter = RateLimiter(requests_per_minute = 60, requests_per_day = 0, cooldown = 0)
+        self.assertAlmostEqual(limiter.throttle(), 30)
+        self.assertAlmostEqual(limiter.reserve(), 2.0, places = 2)
+        for i in range(10):
+            limiter.throttle()
+        self.assertAlmostEqual(limiter.throttle(), 1)
+        for i in range(30):
+            limiter.recover()
+        self.assertAlmostEqual(limiter.recover(), 60)
+
+    def test_concurrent_throttles_slow_down_once(self):
+        limiter = RateLimiter(requests_per_minute = 60, requests_per_day = 0)
+        self.assertEqual([ limiter.throttle() for i in range(8)], [30] * 8)
+        self.assertEqual(limiter.recover(), 30)
+
+class TestKeyPool(unittest.TestCase):
+    def test_reserve_shards_across_keys(self):
+        pool = KeyPool(["a", "b"], requests_per_minute = 1, requests_per_day = 0)
+        self.assertEqual([pool.reserve() for i in range(2)], [("a", 0), ("b", 0)])
+        key, wait = pool.reserve()
+        self.assertAlmostEqual(wait, 60, places = 1)
+
+    def test_daily_budget_per_key(self):
+        pool = KeyPool(["a", "b"], requests_per_minute = 60, requests_per_day = 1)
+        self.assertEqual(sorted([pool.reserve()[0] for i in range(2)]), ["a", "b"])
+        self.assertEqual(pool.reserve(), (None, None))
+
+    def test_evict(self):
+        pool = KeyPool(["a", "b", "a"], requests_per_minute = 60, requests_per_day = 0)
+        self.assertTrue(pool.evict("a", "invalid api key"))
+        self.assertFalse(pool.evict("a", "invalid api key"))
+        self.assertEqual([pool.next_key() for i in range(2)], ["b", "b"])
+        self.assertEqual(pool.evicted, {"a" : "invalid api key"})
+        pool.evict("b", "invalid api key")
+        self.assertEqual(pool.next_key(), None)
+        self.assertEqual(pool.reserve(), (None, None))
+
+    def test_throttled_keys_evicted_except_last(self):
+        pool = KeyPool(["a", "b"], requests_per_minute = 60, requests_per_day = 0, 
+            max_strikes = 2, cooldown = 0)
+        pool.throttled("a")
+        pool.success("a")
+        pool.throttled("a")
+        self.assertEqual(pool.active, ["a", "b"])
+        self.assertEqual(pool.throttled("a"), (9.375, True))
+        self.assertEqual(pool.active, ["b"])
+        for i in range(3):
+            pool.throttled("b")
+        self.assertEqual(pool.active, ["b"])
+
+    def test_concurrent_throttles_one_strike(self):
+        pool = KeyPool(["a", "b"], requests_per_minute = 60, requests_per_day = 0, 
+            max_strikes = 2)
+        for i in range(8):
+            pool.throttled("a")
+        self.assertEqual(pool.active, ["a", "b"])
+        self.assertEqual(pool.limiters["a"].minute.rate * 60, 30)
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Alpha Vantage API replying with scripted responses.
+
+    """
+    protocol_version = "HTTP/1.1"
+    script = []
+    requests = []
+    csv_body = b"timestamp,open,high,low,close,volume\r\n2018-01-04,1,2,0.5,1.5,100\r\n"\
+        b"2018-01-03,1,2,0.5,1.5,100\r\n"
+    invalid_key_body = b'{\n    "Error Message": "the parameter apikey is invalid or missing."\n}'
+    note_body = b'{\n    "Note": "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute."\n}'
+    premium_body = b'{\n    "Information": "Thank you for using Alpha Vantage! This is a premium endpoint."\n}'
+    information_body = b'{\n    "Information": "Please consider spreading out your free API requests more sparingly (1 request per second)."\n}'
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        status, body = self.script.pop(0) if self.script else (200, self.csv_body)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        ScriptedHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+        base_url = "http://127.0.0.1:{0}/query?".format(self.server.server_port)
+        self.metrics = MetricsRegistry()
+        self.base_url = base_url
+        with patch.object(LoadAlphaVantage, "base_url", base_url):
+            self.av = LoadAlphaVantage(requests_per_minute = 6000, requests_per_day = 0,
+                metrics = self.metrics, retries = 2, backoff = 0.01)
+
+    def tearDown(self):
+        self.av.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_throttle_note_retried(self):
+        ScriptedHandler.script = [(200, ScriptedHandler.note_body)]
+        result = self.av.alpha_vantage("KO")
+        self.assertEqual(result[0][:2], ["timestamp", "symbol"])
+        self.assertEqual(len(ScriptedHandler.requests), 2)
+        self.assertAlmostEqual(self.av.key_pool.limiters[self.av.api_key].minute.rate, 50)
+        self.assertEqual(self.metrics.snapshot()["counters"][
+            ("retries_total", (("reason", "throttled"),))], 1)
+
+    def test_throttle_information_retried(self):
+        ScriptedHandler.script = [(200, ScriptedHandler.information_body)]
+        self.assertEqual(len(self.av.alpha_vantage("KO")), 2)
+        self.assertEqual(len(ScriptedHandler.requests), 2)
+
+    def test_premium_information_not_retried(self):
+        ScriptedHandler.script = [(200, ScriptedHandler.premium_body)]
+        self.assertEqual(self.av.alpha_vantage("KO"), None)
+        self.assertEqual(len(ScriptedHandler.requests), 1)
+        self.assertAlmostEqual(self.av.key_pool.limiters[self.av.api_key].minute.rate, 100)
+
+    def test_server_error_retried(self):
+        ScriptedHandler.script = [(503, b"Unavailable"), (429, b"Too many requests")]
+        result = self.av.alpha_vantage("KO")
+        self.assertEqual(len(result), 2)
+        self.assertEqual(len(ScriptedHandler.requests), 3)
+
+    def test_too_many_requests_throttled(self):
+        ScriptedHandler.script = [(429, b"Too many requests")] * 3
+        with patch.object(LoadAlphaVantage, "base_url", self.base_url):
+            av = LoadAlphaVantage(requests_per_minute = 6000, requests_per_day = 2,
+                metrics = self.metrics, retries = 2, backoff = 0.01)
+        # the first request and one retry spend the daily budget
+        self.assertEqual(av.load_symbols(["KO"]), {})
+        self.assertEqual(len(ScriptedHandler.requests), 2)
+        self.assertAlmostEqual(av.key_pool.limiters[av.api_key].minute.rate, 50)
+        self.assertEqual(self.metrics.snapshot()["counters"][
+            ("retries_total", (("reason", "throttled"),))], 1)
+        av.close()
+
+    def test_retry_budget_exhausted(self):
+        ScriptedHandler.script = [(503, b"Unavailable")] * 3
+        result = self.av.load_symbols(["KO", "MSFT"])
+        self.assertEqual(list(result.keys()), ["MSFT"])
+        self.assertEqual(len(ScriptedHandler.requests), 4)
+
+    def test_client_error_not_retried(self):
+        ScriptedHandler.script = [(404, b"Not found")]
+        self.assertEqual(self.av.alpha_vantage("KO"), None)
+        self.assertEqual(len(ScriptedHandler.requests), 1)
+
+class TestKeyRotation(unittest.TestCase):
+    def setUp(self):
+        ScriptedHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+        base_url = "http://127.0.0.1:{0}/query?".format(self.server.server_port)
+        self.metrics = MetricsRegistry()
+        self.base_url = base_url
+        self.av = self.load_av(base_url, retries = 2)
+
+    def load_av(self, base_url, retries):
+        with patch.object(LoadAlphaVantage, "base_url", base_url), \
+            patch("alpha_vantage_tools.av_funcs.get_env", return_value = None):
+            return LoadAlphaVantage(["bad", "good"], requests_per_minute = 6000, 
+                requests_per_day = 0, metrics = self.metrics, retries = retries, backoff = 0.01)
+
+    def tearDown(self):
+        self.av.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_invalid_key_evicted(self):
+        ScriptedHandler.script = [(200, ScriptedHandler.invalid_key_body)]
+        result = self.av.load_symbols(["KO", "MSFT"])
+        self.assertEqual(list(result.keys()), ["KO", "MSFT"])
+        self.assertEqual(self.av.key_pool.evicted, {"bad" : "invalid api key"})
+        self.assertIn("apikey=bad", ScriptedHandler.requests[0])
+        self.assertTrue(all("apikey=good" in path for path in ScriptedHandler.requests[1:]))
+        self.assertEqual(self.metrics.snapshot()["counters"][
+            ("api_keys_evicted_total", (("reason", "invalid api key"),))], 1)
+
+    def test_invalid_key_evicted_without_retries(self):
+        self.av.close()
+        self.av = self.load_av(self.base_url, retries = 0)
+        ScriptedHandler.script = [(200, ScriptedHandler.invalid_key_body)]
+        self.assertEqual(self.av.alpha_vantage("KO"), None)
+        self.assertEqual(self.av.key_pool.evicted, {"bad" : "invalid api key"})
+        self.av.alpha_vantage("MSFT")
+        self.assertIn("apikey=good", ScriptedHandler.requests[1])
+
+    def test_symbols_sharded_across_keys(self):
+        self.av.load_symbols(["KO", "MSFT", "JNJ", "PG"])
+        keys = [ path.split("apikey=")[1].split("&")[0] for path in ScriptedHandler.requests]
+        self.assertEqual(sorted(keys), ["bad", "bad", "good", "good"])
+
+    def test_last_key_evicted(self):
+        ScriptedHandler.script = [(200, ScriptedHandler.invalid_key_body)] * 2
+        self.assertEqual(self.av.alpha_vantage("KO"), None)
+        self.assertEqual(self.av.key_pool.active, [])
+        self.assertEqual(self.av.alpha_vantage("MSFT"), None)
+        self.assertEqual(len(ScriptedHandler.requests), 2)
+
+if __name__ == "__main__":
+    unittest.main()
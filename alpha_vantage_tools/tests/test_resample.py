@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from alpha_vantage_tools.db_funcs import SQLiteDB
+from alpha_vantage_tools.resample import resample_rows, resample_db, resampled_api
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+header = ["timestamp", "symbol", "timeseries_api", "interval", "open", "high", "low", "close", 
+    "volume"]
+
+def daily_rows(days):
+    return [header] + [ ["2019-07-{0:02d}".format(day), "KO", "TIME_SERIES_DAILY", "daily", 
+        str(day), str(day + 1), str(day - 0.5), str(day + 0.5), "100"] for day in days]
+
+@unittest.skipIf(np == None, "NumPy not installed.")
+class TestResampleRows(unittest.TestCase):
+    def test_daily_to_weekly(self):
+        # 2019-07-01 is a Monday, 2019-07-04 a holiday
+        result = resample_rows(daily_rows([1, 2, 3, 5, 8, 9]), "weekly")
+        self.assertEqual(result[0][:4], header[:4])
+        self.assertEqual(result[1:], [
+            ["2019-07-05", "KO", "TIME_SERIES_WEEKLY", "weekly", 1.0, 6.0, 0.5, 5.5, None, 400, 
+                None, None],
+            ["2019-07-09", "KO", "TIME_SERIES_WEEKLY", "weekly", 8.0, 10.0, 7.5, 9.5, None, 200, 
+                None, None]])
+
+    def test_intraday_labelled_with_bar_end(self):
+        rows = [header] + [ ["2019-07-12 09:{0:02d}:00".format(minute), "KO", 
+            "TIME_SERIES_INTRADAY", "5min", "1", str(minute), "0.5", str(minute), "10"] 
+            for minute in range(35, 60, 5)]
+        result = resample_rows(rows, "15min")
+        self.assertEqual([ row[0] for row in result[1:]], 
+            ["2019-07-12 09:45:00", "2019-07-12 10:00:00"])
+        self.assertEqual([ (row[5], row[7], row[9]) for row in result[1:]], 
+            [(45.0, 45.0, 30), (55.0, 55.0, 20)])
+
+    def test_invalid_interval(self):
+        with self.assertRaises(AssertionError):
+            resample_rows(daily_rows([1, 2]), "15min")
+        with self.assertRaises(AssertionError):
+            resample_rows(daily_rows([1, 2]), "daily")
+
+    def test_resampled_api(self):
+        self.assertEqual(resampled_api("TIME_SERIES_DAILY_ADJUSTED", "monthly"), 
+            "TIME_SERIES_MONTHLY_ADJUSTED")
+        self.assertEqual(resampled_api("TIME_SERIES_INTRADAY", "daily"), "TIME_SERIES_DAILY")
+
+@unittest.skipIf(np == None, "NumPy not installed.")
+class TestResampleDB(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = SQLiteDB(os.path.join(self.tmp.name, "temp.db"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_incremental(self):
+        self.db.insert_many(daily_rows([1, 2, 3, 5, 8]), verbose = False)
+        result = resample_db(self.db, "weekly", verbose = False)
+        self.assertEqual(result, {"inserted" : 2, "updated" : 0, "skipped" : 0})
+
+        # only the partial last week is rebuilt
+        self.db.insert_many(daily_rows([9]), verbose = False)
+        result = resample_db(self.db, "weekly", verbose = False)
+        self.assertEqual(result, {"inserted" : 1, "updated" : 0, "skipped" : 0})
+        self.db.insert_many(daily_rows([10]), verbose = False)
+        result = resample_db(self.db, "weekly", verbose = False)
+        self.assertEqual(result, {"inserted" : 1, "updated" : 0, "skipped" : 0})
+        self.assertEqual(resample_db(self.db, "monthly", verbose = False)["inserted"], 1)
+        stored = self.db.query(av_fun = "TIME_SERIES_WEEKLY", interval = "weekly")
+        self.assertEqual([ (row[0], row[4], row[7], row[9]) for row in stored], 
+            [("2019-07-05", 1.0, 5.5, 400), ("2019-07-10", 8.0, 10.5, 300)])
+    def test_target_only_symbol_kept(self):
+        weekly = [ [day, "XYZ", "TIME_SERIES_WEEKLY", "weekly", "1", "2", "0.5", "1.5", "100"]
+            for day in ("2019-01-04", "2019-01-11", "2019-01-18")]
+        self.db.insert_many([header] + weekly, verbose = False)
+        self.db.insert_many(daily_rows([1, 2, 3]), verbose = False)
+        for i in range(2):
+            resample_db(self.db, "weekly", verbose = False)
+        stored = self.db.query("XYZ", av_fun = "TIME_SERIES_WEEKLY", interval = "weekly")
+        self.assertEqual([ row[0] for row in stored], ["2019-01-04", "2019-01-11", "2019-01-18"])
+
+if __name__ == "__main__":
+    unittest.main()
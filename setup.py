@@ -15,4 +15,5 @@ setup(name = "alpha-vantage-tools",
       license = "MIT",
       packages = ["alpha_vantage_tools"],
       install_requires = ["python-dotenv"],
+      extras_require = {"numpy" : ["numpy"], "zstd" : ["zstandard"], "parquet" : ["pyarrow"]},
       zip_safe = False)
\ No newline at end of file